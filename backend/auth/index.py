@@ -1,28 +1,218 @@
+from runtime import (  # first: starts the cold-start clock
+    JSON_HEADERS, issue_token, lazy_import, pg_cursor, preflight, read_token, request_token, timed_handler, with_token
+)
+
 import json
 import os
 import re
-import urllib.request
+import threading
+import time
 import urllib.parse
 from datetime import datetime
 
-import psycopg2
+from http_client import HTTPClient
+
+# =============================================================================
+# STEAM PROFILES
+# =============================================================================
+
+STEAM_API_URL = os.environ.get('STEAM_API_URL', 'https://api.steampowered.com').rstrip('/')
+STEAM_TIMEOUT = float(os.environ.get('STEAM_TIMEOUT', '5'))
+STEAM_SUMMARIES_TTL = float(os.environ.get('STEAM_SUMMARIES_TTL', '600'))
+STEAM_SUMMARIES_MAX = 10_000
+STEAM_BATCH_SIZE = 100  # GetPlayerSummaries accepts at most 100 steamids per call
+
+STEAM64_BASE = 76561197960265728
+LEGACY_STEAM_ID = re.compile(r'^STEAM_[0-5]:([01]):(\d+)$')
+
+PROFILE_REFRESH_LIMIT = 1000
+PROFILE_REFRESH_MAX = 10_000
+PROFILE_REFRESH_AGE = os.environ.get('PROFILE_REFRESH_AGE', '7 days')
+PLACEHOLDER_AVATAR_PREFIX = 'https://via.placeholder.com/'
+
+# Kept at module level so warm invocations reuse the TLS connection to the Steam API
+steam_http = HTTPClient(read_timeout=STEAM_TIMEOUT)
+
+_summaries = {}  # steamid64 -> (summary or None, fetched_at)
+_summaries_lock = threading.Lock()
+
+
+def to_steam64(steam_id: str) -> str | None:
+    """SteamID64 for a 64-bit or legacy ``STEAM_X:Y:Z`` id (as AMX stores them), else None."""
+    if steam_id.isdigit():
+        return steam_id
+    match = LEGACY_STEAM_ID.match(steam_id)
+    if not match:
+        return None
+    return str(STEAM64_BASE + int(match.group(2)) * 2 + int(match.group(1)))
+
+
+def fetch_player_summaries(api_key: str, steam_ids: list) -> dict:
+    """GetPlayerSummaries in batches of STEAM_BATCH_SIZE; returns steamid64 -> summary."""
+    summaries = {}
+    for start in range(0, len(steam_ids), STEAM_BATCH_SIZE):
+        query = urllib.parse.urlencode({'key': api_key, 'steamids': ','.join(steam_ids[start:start + STEAM_BATCH_SIZE])})
+        url = f"{STEAM_API_URL}/ISteamUser/GetPlayerSummaries/v2/?{query}"
+        data = steam_http.get(url).json()
+        for player in data.get('response', {}).get('players', []):
+            summaries[player['steamid']] = player
+    return summaries
+
+
+STEAM_OPENID_URL = 'https://steamcommunity.com/openid/login'
+STEAM_CLAIMED_ID = re.compile(r'^https://steamcommunity\.com/openid/id/(\d+)$')
+
+
+def verify_openid(params: dict) -> str | None:
+    """SteamID64 of a Steam OpenID callback once Steam itself confirmed the assertion, else None.
+
+    The callback parameters are client-supplied, so they are sent back to Steam with
+    ``openid.mode=check_authentication``; only an ``is_valid:true`` answer counts.
+    """
+    claimed_id = params.get('openid.claimed_id', '')
+    match = STEAM_CLAIMED_ID.match(claimed_id)
+    if (not match or params.get('openid.mode') != 'id_res'
+            or params.get('openid.identity') != claimed_id
+            or params.get('openid.op_endpoint') != STEAM_OPENID_URL):
+        return None
+
+    fields = {key: str(value) for key, value in params.items() if key.startswith('openid.')}
+    fields['openid.mode'] = 'check_authentication'
+    response = steam_http.post(
+        STEAM_OPENID_URL,
+        body=urllib.parse.urlencode(fields),
+        headers={'Content-Type': 'application/x-www-form-urlencoded'}
+    )
+    if 'is_valid:true' not in response.body.decode(errors='replace').splitlines():
+        return None
+    return match.group(1)
+
+
+def get_player_summaries(api_key: str, steam_ids: list) -> dict:
+    """Steam summaries for ``steam_ids`` (steamid64), served from a TTL cache where possible.
+
+    Only ids missing from the cache are fetched, in as few API calls as the batch limit
+    allows. Ids Steam does not know are cached as absent and left out of the result.
+    """
+    now = time.monotonic()
+    result, missing = {}, []
+    with _summaries_lock:
+        for steam_id in dict.fromkeys(steam_ids):
+            cached = _summaries.get(steam_id)
+            if cached and now - cached[1] < STEAM_SUMMARIES_TTL:
+                if cached[0] is not None:
+                    result[steam_id] = cached[0]
+            else:
+                missing.append(steam_id)
+    
+    if missing:
+        fetched = fetch_player_summaries(api_key, missing)
+        with _summaries_lock:
+            if len(_summaries) + len(missing) > STEAM_SUMMARIES_MAX:
+                _summaries.clear()
+            for steam_id in missing:
+                _summaries[steam_id] = (fetched.get(steam_id), now)
+        result.update(fetched)
+    return result
+
+
+def refresh_profiles(api_key: str, limit: int) -> dict:
+    """Refresh names and avatars of up to ``limit`` users from Steam.
+
+    Users with a placeholder avatar come first, then the least recently updated ones
+    older than PROFILE_REFRESH_AGE, so repeated runs eventually cover every user.
+    Every checked user is touched, including those Steam does not know, so they move
+    to the back of the queue.
+    """
+    with pg_cursor() as cur:
+        cur.execute(
+            """
+            SELECT steam_id FROM users
+            WHERE avatar_url IS NULL OR avatar_url LIKE %s
+               OR updated_at IS NULL OR updated_at < LOCALTIMESTAMP - %s::interval
+            ORDER BY (avatar_url IS NULL OR avatar_url LIKE %s) DESC, updated_at ASC NULLS FIRST
+            LIMIT %s
+            """,
+            (PLACEHOLDER_AVATAR_PREFIX + '%', PROFILE_REFRESH_AGE, PLACEHOLDER_AVATAR_PREFIX + '%', limit)
+        )
+        steam_ids = [row[0] for row in cur.fetchall()]
+    
+    steam64 = {steam_id: to_steam64(steam_id) for steam_id in steam_ids}
+    summaries = get_player_summaries(api_key, [value for value in steam64.values() if value])
+    
+    rows = []
+    for steam_id in steam_ids:
+        summary = summaries.get(steam64[steam_id]) or {}
+        rows.append((steam_id, summary.get('personaname'), summary.get('avatarfull')))
+    
+    if rows:
+        with pg_cursor() as cur:
+            lazy_import('psycopg2.extras').execute_values(
+                cur,
+                """
+                UPDATE users u
+                SET username = COALESCE(v.username, u.username),
+                    avatar_url = COALESCE(v.avatar_url, u.avatar_url),
+                    updated_at = LOCALTIMESTAMP
+                FROM (VALUES %s) AS v(steam_id, username, avatar_url)
+                WHERE u.steam_id = v.steam_id
+                """,
+                rows,
+                page_size=len(rows)
+            )
+    
+    return {'checked': len(steam_ids), 'updated': sum(1 for row in rows if row[2])}
+
+
+# =============================================================================
+# PROFILES
+# =============================================================================
+
+USER_COLUMNS = "id, steam_id, username, avatar_url, balance, privilege, play_time, last_daily_spin"
+PROFILES_MAX = 500
+
+
+def user_from_row(row) -> dict:
+    return {
+        'id': row[0],
+        'steam_id': row[1],
+        'username': row[2],
+        'avatar_url': row[3],
+        'balance': row[4],
+        'privilege': row[5],
+        'play_time': row[6],
+        'last_daily_spin': row[7].isoformat() if row[7] else None
+    }
+
 
+def requested_steam_ids(event: dict, params: dict) -> list:
+    """Steam ids from ?steam_ids=a,b,c or a JSON body {"steam_ids": [...]}, deduplicated in order."""
+    if event.get('body'):
+        raw = json.loads(event['body']).get('steam_ids') or []
+        if not isinstance(raw, list) or not all(isinstance(steam_id, (str, int)) for steam_id in raw):
+            raise ValueError('steam_ids must be a list of ids')
+    else:
+        raw = (params.get('steam_ids') or '').split(',')
+    return list(dict.fromkeys(str(steam_id).strip() for steam_id in raw if str(steam_id).strip()))
+
+
+def load_profiles(steam_ids: list) -> dict:
+    """steam_id -> profile for every known id, in one ``= ANY`` query."""
+    with pg_cursor() as cur:
+        cur.execute(f"SELECT {USER_COLUMNS} FROM users WHERE steam_id = ANY(%s)", (steam_ids,))
+        return {row[1]: user_from_row(row) for row in cur.fetchall()}
+
+
+PREFLIGHT = preflight('GET, POST, OPTIONS', 'Content-Type, X-Steam-Token')
+
+
+@timed_handler
 def handler(event: dict, context) -> dict:
     '''Авторизация через Steam OpenID и управление сессиями'''
     method = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Steam-Token',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+        return PREFLIGHT
     
     params = event.get('queryStringParameters') or {}
     action = params.get('action', 'login')
@@ -31,172 +221,227 @@ def handler(event: dict, context) -> dict:
         return_url = params.get('return_url', 'http://localhost:5173/auth/callback')
         realm = return_url.split('/auth')[0] if '/auth' in return_url else return_url
         
-        steam_openid_url = f"https://steamcommunity.com/openid/login?{urllib.parse.urlencode({
+        openid_params = urllib.parse.urlencode({
             'openid.ns': 'http://specs.openid.net/auth/2.0',
             'openid.mode': 'checkid_setup',
             'openid.return_to': return_url,
             'openid.realm': realm,
             'openid.identity': 'http://specs.openid.net/auth/2.0/identifier_select',
             'openid.claimed_id': 'http://specs.openid.net/auth/2.0/identifier_select'
-        })}"
+        })
+        steam_openid_url = f"https://steamcommunity.com/openid/login?{openid_params}"
         
         return {
             'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
+            'headers': JSON_HEADERS,
             'body': json.dumps({'redirect_url': steam_openid_url}),
             'isBase64Encoded': False
         }
     
     if method == 'POST' and action == 'verify':
         body = json.loads(event.get('body', '{}'))
-        claimed_id = body.get('openid.claimed_id', '')
         
-        steam_id_match = re.search(r'steamcommunity.com/openid/id/(\d+)', claimed_id)
-        if not steam_id_match:
+        try:
+            steam_id = verify_openid(body)
+        except Exception as e:
             return {
-                'statusCode': 400,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Invalid Steam ID'}),
+                'statusCode': 502,
+                'headers': JSON_HEADERS,
+                'body': json.dumps({'error': f'Steam OpenID check failed: {e}'}),
+                'isBase64Encoded': False
+            }
+        
+        if not steam_id:
+            return {
+                'statusCode': 401,
+                'headers': JSON_HEADERS,
+                'body': json.dumps({'error': 'Invalid Steam OpenID assertion'}),
                 'isBase64Encoded': False
             }
         
-        steam_id = steam_id_match.group(1)
         api_key = os.environ.get('STEAM_API_KEY')
         
         if not api_key:
             return {
                 'statusCode': 500,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'headers': JSON_HEADERS,
                 'body': json.dumps({'error': 'Steam API key not configured'}),
                 'isBase64Encoded': False
             }
         
         try:
-            api_url = f"https://api.steampowered.com/ISteamUser/GetPlayerSummaries/v2/?key={api_key}&steamids={steam_id}"
-            with urllib.request.urlopen(api_url) as response:
-                data = json.loads(response.read())
-                
-            if not data.get('response', {}).get('players'):
+            player = get_player_summaries(api_key, [steam_id]).get(steam_id)
+            
+            if not player:
                 return {
                     'statusCode': 404,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'headers': JSON_HEADERS,
                     'body': json.dumps({'error': 'Player not found'}),
                     'isBase64Encoded': False
                 }
             
-            player = data['response']['players'][0]
+            with pg_cursor() as cur:
+                cur.execute(
+                    f"""
+                    INSERT INTO users (steam_id, username, avatar_url, updated_at)
+                    VALUES (%s, %s, %s, %s)
+                    ON CONFLICT (steam_id) 
+                    DO UPDATE SET username = EXCLUDED.username, 
+                                  avatar_url = EXCLUDED.avatar_url,
+                                  updated_at = EXCLUDED.updated_at
+                    RETURNING {USER_COLUMNS}
+                    """,
+                    (steam_id, player['personaname'], player['avatarfull'], datetime.now())
+                )
+                
+                user_data = cur.fetchone()
             
-            conn = psycopg2.connect(os.environ['DATABASE_URL'])
-            cur = conn.cursor()
+            user = user_from_row(user_data)
+            token = issue_token(user['id'], user['steam_id'], user['privilege'])
             
-            cur.execute(
-                """
-                INSERT INTO users (steam_id, username, avatar_url, updated_at)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (steam_id) 
-                DO UPDATE SET username = EXCLUDED.username, 
-                              avatar_url = EXCLUDED.avatar_url,
-                              updated_at = EXCLUDED.updated_at
-                RETURNING id, steam_id, username, avatar_url, balance, privilege, play_time, last_daily_spin
-                """,
-                (steam_id, player['personaname'], player['avatarfull'], datetime.now())
-            )
-            
-            user_data = cur.fetchone()
-            conn.commit()
-            cur.close()
-            conn.close()
+            return with_token({
+                'statusCode': 200,
+                'headers': JSON_HEADERS,
+                'body': json.dumps({'user': user, 'token': token}),
+                'isBase64Encoded': False
+            }, token)
             
-            user = {
-                'id': user_data[0],
-                'steam_id': user_data[1],
-                'username': user_data[2],
-                'avatar_url': user_data[3],
-                'balance': user_data[4],
-                'privilege': user_data[5],
-                'play_time': user_data[6],
-                'last_daily_spin': user_data[7].isoformat() if user_data[7] else None
+        except Exception as e:
+            return {
+                'statusCode': 500,
+                'headers': JSON_HEADERS,
+                'body': json.dumps({'error': str(e)}),
+                'isBase64Encoded': False
             }
-            
+    
+    if method == 'POST' and action == 'refresh_profiles':
+        api_key = os.environ.get('STEAM_API_KEY')
+        
+        if not api_key:
             return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'user': user}),
+                'statusCode': 500,
+                'headers': JSON_HEADERS,
+                'body': json.dumps({'error': 'Steam API key not configured'}),
                 'isBase64Encoded': False
             }
-            
+        
+        try:
+            limit = min(max(int(params.get('limit', PROFILE_REFRESH_LIMIT)), 1), PROFILE_REFRESH_MAX)
+        except ValueError:
+            limit = PROFILE_REFRESH_LIMIT
+        
+        try:
+            result = refresh_profiles(api_key, limit)
         except Exception as e:
             return {
                 'statusCode': 500,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'headers': JSON_HEADERS,
                 'body': json.dumps({'error': str(e)}),
                 'isBase64Encoded': False
             }
+        
+        return {
+            'statusCode': 200,
+            'headers': JSON_HEADERS,
+            'body': json.dumps(result),
+            'isBase64Encoded': False
+        }
+    
+    if method in ('GET', 'POST') and action == 'profiles':
+        try:
+            steam_ids = requested_steam_ids(event, params)
+        except (ValueError, AttributeError):
+            steam_ids = None
+        
+        if not steam_ids or len(steam_ids) > PROFILES_MAX:
+            return {
+                'statusCode': 400,
+                'headers': JSON_HEADERS,
+                'body': json.dumps({'error': f'Between 1 and {PROFILES_MAX} steam_ids required'}),
+                'isBase64Encoded': False
+            }
+        
+        try:
+            profiles = load_profiles(steam_ids)
+        except Exception as e:
+            return {
+                'statusCode': 500,
+                'headers': JSON_HEADERS,
+                'body': json.dumps({'error': str(e)}),
+                'isBase64Encoded': False
+            }
+        
+        return {
+            'statusCode': 200,
+            'headers': JSON_HEADERS,
+            'body': json.dumps({
+                'profiles': profiles,
+                'missing': [steam_id for steam_id in steam_ids if steam_id not in profiles]
+            }),
+            'isBase64Encoded': False
+        }
     
     if method == 'GET' and action == 'profile':
         steam_id = params.get('steam_id')
         
-        if not steam_id:
+        # The profile row is read anyway, so a stale token needs no separate check:
+        # it is re-issued from the row below.
+        session = read_token(request_token(event))
+        
+        if session and steam_id in (None, session['sid']):
+            lookup = ("id = %s", session['uid'])
+        else:
+            lookup = ("steam_id = %s", steam_id)
+        
+        if not lookup[1]:
             return {
                 'statusCode': 400,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'headers': JSON_HEADERS,
                 'body': json.dumps({'error': 'Steam ID required'}),
                 'isBase64Encoded': False
             }
         
         try:
-            conn = psycopg2.connect(os.environ['DATABASE_URL'])
-            cur = conn.cursor()
-            
-            cur.execute(
-                "SELECT id, steam_id, username, avatar_url, balance, privilege, play_time, last_daily_spin FROM users WHERE steam_id = %s",
-                (steam_id,)
-            )
-            
-            user_data = cur.fetchone()
-            cur.close()
-            conn.close()
+            with pg_cursor() as cur:
+                cur.execute(
+                    f"SELECT {USER_COLUMNS} FROM users WHERE {lookup[0]}",
+                    (lookup[1],)
+                )
+                
+                user_data = cur.fetchone()
             
             if not user_data:
                 return {
                     'statusCode': 404,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'headers': JSON_HEADERS,
                     'body': json.dumps({'error': 'User not found'}),
                     'isBase64Encoded': False
                 }
             
-            user = {
-                'id': user_data[0],
-                'steam_id': user_data[1],
-                'username': user_data[2],
-                'avatar_url': user_data[3],
-                'balance': user_data[4],
-                'privilege': user_data[5],
-                'play_time': user_data[6],
-                'last_daily_spin': user_data[7].isoformat() if user_data[7] else None
-            }
+            user = user_from_row(user_data)
+            token = None
+            # Only ever re-issue the caller's own token, never one for the profile looked up
+            if session and session['stale'] and user['id'] == session['uid']:
+                token = issue_token(user['id'], user['steam_id'], user['privilege'])
             
-            return {
+            return with_token({
                 'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'headers': JSON_HEADERS,
                 'body': json.dumps({'user': user}),
                 'isBase64Encoded': False
-            }
+            }, token)
             
         except Exception as e:
             return {
                 'statusCode': 500,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'headers': JSON_HEADERS,
                 'body': json.dumps({'error': str(e)}),
                 'isBase64Encoded': False
             }
     
     return {
         'statusCode': 404,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'headers': JSON_HEADERS,
         'body': json.dumps({'error': 'Not found'}),
         'isBase64Encoded': False
     }
\ No newline at end of file
@@ -0,0 +1,80 @@
+"""Local HTTPS stub server for the HTTP client tests.
+
+Keeps connections alive (HTTP/1.1) and counts them, so tests can check reuse.
+``statuses`` queues the status codes of the next responses and ``delay``
+holds every response back, to exercise retries, timeouts and the breaker.
+``respond(path)`` stands in for an upstream API: its return value is sent as
+the JSON body.
+"""
+import json
+import ssl
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_certificate(directory) -> tuple:
+    """Self-signed certificate for localhost; returns (cert path, key path)."""
+    cert, key = directory / 'stub.crt', directory / 'stub.key'
+    subprocess.run([
+        'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+        '-keyout', str(key), '-out', str(cert), '-subj', '/CN=localhost',
+        '-addext', 'subjectAltName=DNS:localhost'
+    ], check=True, capture_output=True)
+    return str(cert), str(key)
+
+
+class StubHTTPSServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, cert: str, key: str):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        self.socket = context.wrap_socket(self.socket, server_side=True)
+        self.url = f'https://localhost:{self.server_address[1]}'
+        self.connections = 0
+        self.requests = []
+        self.statuses = []
+        self.delay = 0.0
+        self.respond = None
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+    def handle_error(self, request, client_address):
+        pass  # clients that time out close the connection mid-response
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        self.server.connections += 1
+        super().setup()
+
+    def _reply(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        self.server.requests.append((self.command, self.path, dict(self.headers), body))
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        payload = self.server.respond(self.path) if self.server.respond else {'path': self.path, 'status': status}
+        payload = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = _reply
+
+    def log_message(self, *args):
+        pass
@@ -0,0 +1,110 @@
+import shutil
+import ssl
+import time
+
+import pytest
+
+from http_client import CircuitOpenError, HTTPClient, HTTPError
+from stub_https import StubHTTPSServer, make_certificate
+
+pytestmark = pytest.mark.skipif(shutil.which('openssl') is None, reason='needs openssl to make a test certificate')
+
+
+@pytest.fixture(scope='module')
+def certificate(tmp_path_factory):
+    return make_certificate(tmp_path_factory.mktemp('tls'))
+
+
+@pytest.fixture
+def server(certificate):
+    with StubHTTPSServer(*certificate) as stub:
+        yield stub
+
+
+@pytest.fixture
+def client(certificate):
+    return HTTPClient(read_timeout=1.0, retries=2, backoff=0.01, breaker_failures=3, breaker_reset=0.3,
+                      ssl_context=ssl.create_default_context(cafile=certificate[0]))
+
+
+def test_keep_alive_reuses_one_connection(server, client):
+    for i in range(20):
+        assert client.get(f'{server.url}/stats?i={i}').json()['status'] == 200
+
+    assert server.connections == 1
+    assert len(server.requests) == 20
+
+
+def test_retries_503_then_succeeds(server, client):
+    server.statuses = [503, 503]
+
+    assert client.get(f'{server.url}/retry').status == 200
+    assert len(server.requests) == 3
+
+
+def test_post_without_idempotency_key_is_not_retried(server, client):
+    server.statuses = [503]
+
+    with pytest.raises(HTTPError) as error:
+        client.post(f'{server.url}/payments', body={'amount': 1})
+
+    assert error.value.status == 503
+    assert len(server.requests) == 1
+
+
+def test_post_with_idempotency_key_is_retried(server, client):
+    server.statuses = [503]
+
+    response = client.post(f'{server.url}/payments', body={'amount': 1}, headers={'Idempotence-Key': 'k1'})
+
+    assert response.status == 200
+    assert [request[2]['Idempotence-Key'] for request in server.requests] == ['k1', 'k1']
+
+
+def test_client_errors_are_not_retried(server, client):
+    server.statuses = [404]
+
+    with pytest.raises(HTTPError):
+        client.get(f'{server.url}/missing')
+
+    assert len(server.requests) == 1
+
+
+def test_read_timeout(server, client):
+    server.delay = 0.5
+    started = time.monotonic()
+
+    with pytest.raises(TimeoutError):
+        client.get(f'{server.url}/slow', read_timeout=0.1)
+
+    assert time.monotonic() - started < 1.0  # three attempts of 0.1 s, not the 0.5 s responses
+
+
+def test_breaker_opens_then_half_open_trial_closes_it(server, client):
+    server.statuses = [503, 503, 503]
+    with pytest.raises(HTTPError):
+        client.get(f'{server.url}/down')
+    assert len(server.requests) == 3
+
+    with pytest.raises(CircuitOpenError):
+        client.get(f'{server.url}/down')
+    assert len(server.requests) == 3  # failed fast, nothing sent
+
+    time.sleep(0.35)
+    assert client.get(f'{server.url}/up').status == 200  # half-open trial
+    assert client.get(f'{server.url}/up').status == 200
+    assert len(server.requests) == 5
+
+
+def test_failed_half_open_trial_reopens_breaker(server, client):
+    server.statuses = [503, 503, 503, 503]
+    with pytest.raises(HTTPError):
+        client.get(f'{server.url}/down')
+
+    time.sleep(0.35)
+    with pytest.raises(CircuitOpenError):
+        client.get(f'{server.url}/down')  # the trial fails and re-opens, so its retry is refused
+    assert len(server.requests) == 4
+    with pytest.raises(CircuitOpenError):
+        client.get(f'{server.url}/down')
+    assert len(server.requests) == 4
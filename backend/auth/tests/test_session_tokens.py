@@ -0,0 +1,145 @@
+from contextlib import contextmanager
+
+import pytest
+
+import auth_index as index
+import runtime
+
+USERS = {
+    1: (1, '76561198000000001', 'player', None, 10, 'user', 0, None),
+    2: (2, '76561198000000002', 'victim', None, 0, 'admin', 0, None),
+}
+
+
+class FakeCursor:
+    """Answers the single-row users lookups the handlers make."""
+
+    def __init__(self):
+        self.row = None
+
+    def execute(self, sql, params):
+        value = params[0]
+        if 'steam_id = %s' in sql:
+            self.row = next((row for row in USERS.values() if row[1] == value), None)
+        else:
+            self.row = USERS.get(value)
+        if self.row is not None and 'SELECT id, steam_id, privilege' in sql:
+            self.row = (self.row[0], self.row[1], self.row[5])
+
+    def fetchone(self):
+        return self.row
+
+
+@pytest.fixture(autouse=True)
+def session_settings(monkeypatch):
+    @contextmanager
+    def pg_cursor():
+        yield FakeCursor()
+
+    monkeypatch.setattr(runtime, 'SESSION_SECRET', 'test-secret')
+    monkeypatch.setattr(index, 'pg_cursor', pg_cursor)
+    monkeypatch.setattr(runtime, 'pg_cursor', pg_cursor)
+
+
+def stale_token(uid: int) -> str:
+    row = USERS[uid]
+    token = runtime.issue_token(row[0], row[1], row[5])
+    payload = runtime.read_token(token)
+    payload['iat'] -= runtime.SESSION_FRESH + 1
+    payload.pop('stale')
+    encoded = runtime._b64(runtime.json.dumps(payload, separators=(',', ':')).encode())
+    return f'{encoded}.{runtime._sign(encoded)}'
+
+
+def profile(token: str, steam_id: str = None) -> dict:
+    params = {'action': 'profile'}
+    if steam_id:
+        params['steam_id'] = steam_id
+    return index.handler({'httpMethod': 'GET', 'queryStringParameters': params,
+                          'headers': {'X-Steam-Token': token}}, None)
+
+
+def test_stale_token_is_reissued_for_its_own_user():
+    response = profile(stale_token(1))
+
+    assert response['statusCode'] == 200
+    claims = runtime.read_token(response['headers'][runtime.TOKEN_HEADER])
+    assert claims['uid'] == 1 and not claims['stale']
+
+
+def test_stale_token_never_becomes_another_users_token():
+    response = profile(stale_token(1), steam_id=USERS[2][1])
+
+    assert response['statusCode'] == 200
+    assert runtime.TOKEN_HEADER not in response['headers']
+
+
+def test_authenticate_reissues_only_the_same_user():
+    claims, token = runtime.authenticate({'headers': {'X-Steam-Token': stale_token(1)}})
+
+    assert claims['uid'] == 1 and claims['prv'] == 'user'
+    assert runtime.read_token(token)['uid'] == 1
+
+
+CALLBACK = {
+    'openid.ns': 'http://specs.openid.net/auth/2.0',
+    'openid.mode': 'id_res',
+    'openid.op_endpoint': 'https://steamcommunity.com/openid/login',
+    'openid.claimed_id': 'https://steamcommunity.com/openid/id/76561198000000002',
+    'openid.identity': 'https://steamcommunity.com/openid/id/76561198000000002',
+    'openid.return_to': 'https://example.com/auth/callback',
+    'openid.response_nonce': '2026-10-18T00:00:00Zabc',
+    'openid.assoc_handle': '1234567890',
+    'openid.signed': 'signed,op_endpoint,claimed_id,identity,return_to,response_nonce,assoc_handle',
+    'openid.sig': 'forged'
+}
+
+
+def verify(monkeypatch, steam_answer: bytes) -> tuple:
+    sent = []
+
+    class SteamResponse:
+        body = steam_answer
+
+    def post(url, body=None, headers=None):
+        sent.append(index.urllib.parse.parse_qs(body))
+        return SteamResponse()
+
+    monkeypatch.setattr(index.steam_http, 'post', post)
+    monkeypatch.setenv('STEAM_API_KEY', 'key')
+    monkeypatch.setattr(index, 'get_player_summaries', lambda api_key, steam_ids: {
+        steam_ids[0]: {'personaname': 'victim', 'avatarfull': 'https://avatars/victim.jpg'}
+    })
+    response = index.handler({'httpMethod': 'POST', 'queryStringParameters': {'action': 'verify'},
+                              'body': index.json.dumps(CALLBACK)}, None)
+    return response, sent
+
+
+def test_verify_rejects_assertion_steam_does_not_confirm(monkeypatch):
+    response, sent = verify(monkeypatch, b'ns:http://specs.openid.net/auth/2.0\nis_valid:false\n')
+
+    assert response['statusCode'] == 401
+    assert runtime.TOKEN_HEADER not in response['headers']
+    assert sent[0]['openid.mode'] == ['check_authentication']
+
+
+def test_verify_rejects_claimed_id_outside_steam(monkeypatch):
+    monkeypatch.setitem(CALLBACK, 'openid.claimed_id', 'https://evil.example/steamcommunity.com/openid/id/7')
+    response, sent = verify(monkeypatch, b'is_valid:true\n')
+
+    assert response['statusCode'] == 401
+    assert sent == []
+
+
+def test_non_ascii_token_is_rejected_without_crashing():
+    response = profile('пейлоад.подпись', steam_id=USERS[1][1])
+
+    assert response['statusCode'] == 200
+    assert runtime.read_token('пейлоад.подпись') is None
+
+
+def test_profiles_body_must_list_steam_ids():
+    response = index.handler({'httpMethod': 'POST', 'queryStringParameters': {'action': 'profiles'},
+                              'body': index.json.dumps({'steam_ids': 'a,b'})}, None)
+
+    assert response['statusCode'] == 400
@@ -0,0 +1,101 @@
+import os
+import shutil
+import ssl
+import urllib.parse
+import uuid
+
+import pytest
+
+import auth_index as index
+from http_client import HTTPClient
+from stub_https import StubHTTPSServer, make_certificate
+
+pytestmark = pytest.mark.skipif(shutil.which('openssl') is None, reason='needs openssl to make a test certificate')
+
+KNOWN = {str(76561198000000000 + n) for n in range(0, 250, 2)}  # Steam knows every other id
+
+
+def steam_ids(path: str) -> list:
+    return urllib.parse.parse_qs(urllib.parse.urlsplit(path).query)['steamids'][0].split(',')
+
+
+def player_summaries(path: str) -> dict:
+    return {'response': {'players': [
+        {'steamid': steam_id, 'personaname': f'name-{steam_id[-4:]}', 'avatarfull': f'https://avatars/{steam_id}.jpg'}
+        for steam_id in steam_ids(path) if steam_id in KNOWN
+    ]}}
+
+
+@pytest.fixture(scope='module')
+def certificate(tmp_path_factory):
+    return make_certificate(tmp_path_factory.mktemp('tls'))
+
+
+@pytest.fixture
+def steam(certificate, monkeypatch):
+    """The Steam Web API, stubbed by a local HTTPS server."""
+    with StubHTTPSServer(*certificate) as stub:
+        stub.respond = player_summaries
+        monkeypatch.setattr(index, 'STEAM_API_URL', stub.url)
+        monkeypatch.setattr(index, 'steam_http', HTTPClient(ssl_context=ssl.create_default_context(cafile=certificate[0])))
+        monkeypatch.setattr(index, '_summaries', {})
+        yield stub
+
+
+def test_summaries_are_fetched_in_batches_of_100(steam):
+    ids = [str(76561198000000000 + n) for n in range(250)]
+
+    summaries = index.get_player_summaries('key', ids)
+
+    assert [len(steam_ids(request[1])) for request in steam.requests] == [100, 100, 50]
+    assert set(summaries) == KNOWN
+    assert summaries['76561198000000002']['personaname'] == 'name-0002'
+
+
+def test_repeat_lookups_are_served_from_the_cache(steam):
+    ids = [str(76561198000000000 + n) for n in range(10)]
+    index.get_player_summaries('key', ids)
+
+    again = index.get_player_summaries('key', ids + ['76561198000000010'])
+
+    assert len(again) == 6
+    assert [steam_ids(request[1]) for request in steam.requests[1:]] == [['76561198000000010']]
+
+
+def test_expired_entries_are_fetched_again(steam, monkeypatch):
+    index.get_player_summaries('key', ['76561198000000000'])
+    monkeypatch.setattr(index, 'STEAM_SUMMARIES_TTL', 0.0)
+
+    index.get_player_summaries('key', ['76561198000000000'])
+
+    assert len(steam.requests) == 2
+
+
+@pytest.mark.skipif(not os.environ.get('DATABASE_URL'), reason='needs DATABASE_URL with the migrations applied')
+def test_refresh_profiles_writes_names_and_avatars(steam):
+    psycopg2 = pytest.importorskip('psycopg2')
+    # A 64-bit id Steam knows, a legacy AMX id of another known account, and an id Steam does not know
+    users = {'76561198000000200': 'old-a', 'STEAM_0:0:19867237': 'old-b', '76561198000000201': 'old-c'}
+    tag = uuid.uuid4().hex[:8]
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn.autocommit = True
+    cur = conn.cursor()
+    for steam_id, name in users.items():
+        cur.execute("""
+            INSERT INTO users (steam_id, username, avatar_url, updated_at)
+            VALUES (%s, %s, 'https://via.placeholder.com/128', NULL)
+        """, (steam_id, f'{name}-{tag}'))
+    try:
+        result = index.refresh_profiles('key', index.PROFILE_REFRESH_MAX)
+
+        cur.execute("SELECT steam_id, username, avatar_url, updated_at IS NOT NULL FROM users WHERE steam_id = ANY(%s)",
+                    (list(users),))
+        rows = {row[0]: row[1:] for row in cur.fetchall()}
+    finally:
+        cur.execute("DELETE FROM users WHERE steam_id = ANY(%s)", (list(users),))
+        conn.close()
+
+    assert result['checked'] >= 3
+    assert rows['76561198000000200'] == ('name-0200', 'https://avatars/76561198000000200.jpg', True)
+    assert rows['STEAM_0:0:19867237'] == ('name-0202', 'https://avatars/76561198000000202.jpg', True)
+    assert rows['76561198000000201'] == (f'old-c-{tag}', 'https://via.placeholder.com/128', True)
@@ -0,0 +1,117 @@
+"""Archive old case_history partitions to gzipped NDJSON files.
+
+    python archive.py --out /backups/case_history --keep-months 6
+    python archive.py --out /backups/case_history --keep-months 6 --dry-run
+
+Every monthly partition older than the retention window is streamed to
+``<out>/case_history_YYYY_MM.ndjson.gz``. Once the file is complete and its
+row count matches the partition, the partition is detached and dropped.
+Per-item totals for archived months stay in case_drop_stats.
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+from datetime import date
+
+from psycopg2 import sql
+
+from runtime import pg_pool, release_connection
+
+PARTITION_NAME = re.compile(r'^case_history_(\d{4})_(\d{2})$')
+FETCH_SIZE = 10_000
+
+
+def list_partitions(cur) -> list:
+    """Monthly partitions of case_history as (name, first day of month), oldest first."""
+    cur.execute(
+        """
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'case_history'::regclass
+        """
+    )
+    partitions = []
+    for (name,) in cur.fetchall():
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def cutoff_month(keep_months: int, today: date = None) -> date:
+    """First month that is kept; everything before it is archived."""
+    today = today or date.today()
+    months = today.year * 12 + today.month - 1 - keep_months
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def archive_partition(conn, name: str, out_dir: str) -> int:
+    """Write one partition to NDJSON.gz, verify it and drop the partition. Returns rows archived."""
+    path = os.path.join(out_dir, f'{name}.ndjson.gz')
+    partial = path + '.partial'
+    table = sql.Identifier(name)
+
+    rows = 0
+    with conn.cursor(name=f'archive_{name}') as cur:
+        cur.itersize = FETCH_SIZE
+        cur.execute(sql.SQL("SELECT id, user_id, case_item_id, won_at FROM {} ORDER BY won_at, id").format(table))
+        with gzip.open(partial, 'wt', encoding='utf-8') as f:
+            for row in cur:
+                f.write(json.dumps({
+                    'id': row[0],
+                    'user_id': row[1],
+                    'case_item_id': row[2],
+                    'won_at': row[3].isoformat()
+                }) + '\n')
+                rows += 1
+    conn.commit()
+
+    with gzip.open(partial, 'rt', encoding='utf-8') as f:
+        written = sum(1 for _ in f)
+    with conn.cursor() as cur:
+        cur.execute(sql.SQL("SELECT COUNT(*) FROM {}").format(table))
+        expected = cur.fetchone()[0]
+        if written != rows or written != expected:
+            raise RuntimeError(f'{name}: wrote {written} rows, partition has {expected}')
+        os.replace(partial, path)
+        cur.execute(sql.SQL("ALTER TABLE case_history DETACH PARTITION {}").format(table))
+        cur.execute(sql.SQL("DROP TABLE {}").format(table))
+    conn.commit()
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Archive old case_history partitions.')
+    parser.add_argument('--out', required=True, help='Directory for the .ndjson.gz files')
+    parser.add_argument('--keep-months', type=int, default=6, help='Months kept in the database, current one included')
+    parser.add_argument('--dry-run', action='store_true', help='Only list the partitions that would be archived')
+    args = parser.parse_args(argv)
+
+    if args.keep_months < 1:
+        parser.error('--keep-months must be at least 1')
+    os.makedirs(args.out, exist_ok=True)
+
+    conn = pg_pool.acquire()
+    try:
+        cur = conn.cursor()
+        cutoff = cutoff_month(args.keep_months - 1)
+        old = [name for name, month in list_partitions(cur) if month < cutoff]
+        cur.close()
+        conn.commit()
+
+        for name in old:
+            if args.dry_run:
+                print(name)
+                continue
+            print(f'{name}: {archive_partition(conn, name, args.out)} rows archived')
+    finally:
+        release_connection(conn)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,94 +1,527 @@
+from runtime import (  # first: starts the cold-start clock
+    JSON_HEADERS, LazyConnection, authenticate, preflight, request_token, timed_handler, with_token
+)
+
+import base64
 import json
+import math
 import os
 import random
+import time
 from datetime import datetime, timedelta
 
+import simulate
+
+# =============================================================================
+# CATALOG CACHE
+# =============================================================================
+
+CATALOG_VERSION_TTL = float(os.environ.get('CATALOG_VERSION_TTL', '5'))
+
+_catalogs = {}  # name -> {'version', 'items', 'body', 'checked_at', 'sampler'}
+
+
+def catalog_etag(name: str, version: int) -> str:
+    return f'"{name}-{version}"'
+
+
+def catalog_headers(name: str, version: int) -> dict:
+    return {
+        **JSON_HEADERS,
+        'Access-Control-Expose-Headers': 'ETag',
+        'Cache-Control': 'public, no-cache',
+        'ETag': catalog_etag(name, version)
+    }
+
+
+def get_header(event: dict, name: str) -> str | None:
+    headers = event.get('headers') or {}
+    lowered = name.lower()
+    for key, value in headers.items():
+        if key.lower() == lowered:
+            return value
+    return None
+
+
+def fresh_catalog(name: str) -> dict | None:
+    """This container's copy of a catalog if its version was confirmed within CATALOG_VERSION_TTL."""
+    entry = _catalogs.get(name)
+    if entry and time.monotonic() - entry['checked_at'] < CATALOG_VERSION_TTL:
+        return entry
+    return None
+
+
+def get_catalog(cur, name: str, load_items) -> dict:
+    """Serialized catalog for the current version; items are only reloaded when the version moved."""
+    entry = fresh_catalog(name)
+    if entry:
+        return entry
+    
+    cur.execute("SELECT version FROM catalog_versions WHERE name = %s", (name,))
+    row = cur.fetchone()
+    version = row[0] if row else 0
+    
+    entry = _catalogs.get(name)
+    if entry and entry['version'] == version:
+        entry['checked_at'] = time.monotonic()
+        return entry
+    
+    items = load_items(cur)
+    entry = {'version': version, 'items': items, 'body': json.dumps({'items': items}), 'checked_at': time.monotonic()}
+    _catalogs[name] = entry
+    return entry
+
+
+def not_modified(event: dict, name: str, catalog: dict) -> dict | None:
+    """304 response if the client's If-None-Match already names this catalog version."""
+    if_none_match = get_header(event, 'If-None-Match') or ''
+    etag = catalog_etag(name, catalog['version'])
+    if etag not in [tag.strip() for tag in if_none_match.split(',')]:
+        return None
+    return {
+        'statusCode': 304,
+        'headers': catalog_headers(name, catalog['version']),
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+
+def catalog_response(event: dict, name: str, catalog: dict) -> dict:
+    """200 with the cached body, or 304 if the client already holds this version."""
+    cached = not_modified(event, name, catalog)
+    if cached:
+        return cached
+    return {
+        'statusCode': 200,
+        'headers': catalog_headers(name, catalog['version']),
+        'body': catalog['body'],
+        'isBase64Encoded': False
+    }
+
+
+def bump_catalog_version(cur, name: str):
+    """Advance the catalog version in the caller's transaction and drop this container's copy."""
+    cur.execute(
+        "UPDATE catalog_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = %s",
+        (name,)
+    )
+    _catalogs.pop(name, None)
+
+
+# =============================================================================
+# PRIZE SAMPLING
+# =============================================================================
+
+class AliasSampler:
+    """Walker/Vose alias table: O(n) to build, O(1) per draw for a fixed discrete distribution."""
+
+    def __init__(self, weights: list):
+        n = len(weights)
+        total = float(sum(weights)) or 1.0
+        self._n = n
+        self._prob = [1.0] * n
+        self._alias = list(range(n))
+        
+        scaled = [weight * n / total for weight in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self._prob[less] = scaled[less]
+            self._alias[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1.0
+            (small if scaled[more] < 1.0 else large).append(more)
+        # Whatever is left is 1.0 up to rounding error.
+
+    def draw(self, rng=random) -> int:
+        column = int(rng.random() * self._n)
+        return column if rng.random() < self._prob[column] else self._alias[column]
+
+
+def get_sampler(catalog: dict) -> AliasSampler:
+    """Alias table for a catalog entry, built once per catalog version and kept in the warm container."""
+    sampler = catalog.get('sampler')
+    if sampler is None:
+        sampler = AliasSampler([item['chance'] for item in catalog['items']])
+        catalog['sampler'] = sampler
+    return sampler
+
+
+# =============================================================================
+# HISTORY PARTITIONS
+# =============================================================================
+
+_partition_month = None  # month this container last ensured case_history partitions for
+
+
+def ensure_history_partitions(cur):
+    """Create this and next month's case_history partitions once per container per month.
+    
+    Keeps spins out of case_history_default; the database function is idempotent,
+    so containers racing at a month boundary are harmless.
+    """
+    global _partition_month
+    month = time.strftime('%Y-%m')
+    if _partition_month == month:
+        return
+    cur.execute(
+        "SELECT ensure_case_history_partition(CURRENT_DATE), "
+        "ensure_case_history_partition((CURRENT_DATE + INTERVAL '1 month')::date)"
+    )
+    _partition_month = month
+
+
+# =============================================================================
+# DAILY SPIN
+# =============================================================================
+
+# Privilege levels from lowest to highest
+PRIVILEGE_TIERS = ['user', 'vip', 'premium', 'moderator', 'admin']
+
+# Claims the daily spin and applies the prize in one statement. The FOR UPDATE row lock
+# serializes parallel spins of one user: the second one waits, then re-reads the
+# last_daily_spin the first one wrote and fails the cooldown check.
+# A privilege prize does not replace a purchased privilege that is still running
+# unless it is a higher tier; privilege_expires_at is left as it is either way.
+# Balance prizes also go to web_balance, which the player sync keeps on top of MySQL's.
+SPIN_CLAIM_SQL = """
+    WITH prev AS (
+        SELECT id, last_daily_spin FROM users WHERE id = %(user_id)s FOR UPDATE
+    ), claim AS (
+        UPDATE users u
+        SET last_daily_spin = LOCALTIMESTAMP,
+            balance = u.balance + %(balance)s,
+            web_balance = u.web_balance + %(balance)s,
+            privilege = CASE
+                WHEN %(privilege)s::varchar IS NULL THEN u.privilege
+                WHEN u.privilege_expires_at > LOCALTIMESTAMP
+                     AND COALESCE(array_position(%(tiers)s::varchar[], u.privilege), 0)
+                         >= COALESCE(array_position(%(tiers)s::varchar[], %(privilege)s::varchar), 0)
+                    THEN u.privilege
+                ELSE %(privilege)s
+            END
+        FROM prev
+        WHERE u.id = prev.id
+          AND (prev.last_daily_spin IS NULL OR prev.last_daily_spin <= LOCALTIMESTAMP - INTERVAL '24 hours')
+        RETURNING u.id
+    ), won AS (
+        INSERT INTO case_history (user_id, case_item_id)
+        SELECT id, %(item_id)s FROM claim
+    ), counted AS (
+        INSERT INTO case_drop_stats (day, source, case_item_id, drops, value_total)
+        SELECT CURRENT_DATE, 'spin', %(item_id)s, 1, %(item_value)s FROM claim
+        ON CONFLICT (day, source, case_item_id) DO UPDATE
+        SET drops = case_drop_stats.drops + EXCLUDED.drops,
+            value_total = case_drop_stats.value_total + EXCLUDED.value_total
+    )
+    SELECT EXISTS (SELECT 1 FROM prev), EXISTS (SELECT 1 FROM claim), (SELECT last_daily_spin FROM prev), LOCALTIMESTAMP
+"""
+
+
+def prize_effects(item: dict) -> tuple:
+    """(balance delta, new privilege or None) a prize applies to the winner."""
+    if item['type'] == 'balance':
+        return item['value'], None
+    if item['type'] == 'privilege':
+        return 0, item['name'].lower().split()[0]
+    return 0, None
+
+
+def spin_params(user_id, item: dict) -> dict:
+    balance, privilege = prize_effects(item)
+    return {
+        'user_id': user_id,
+        'item_id': item['id'],
+        'item_value': item['value'],
+        'balance': balance,
+        'privilege': privilege,
+        'tiers': PRIVILEGE_TIERS
+    }
+
+
+def execute_autocommit(conn, cur, sql: str, params) -> tuple:
+    """Run one self-contained statement outside an explicit transaction: a single round trip."""
+    conn.commit()
+    conn.autocommit = True
+    try:
+        cur.execute(sql, params)
+        return cur.fetchone()
+    finally:
+        conn.autocommit = False
+
+
+# =============================================================================
+# BATCH OPENING
+# =============================================================================
+
+CASE_MIN_PRICE = int(os.environ.get('CASE_MIN_PRICE', '0'))
+CASE_MARGIN = float(os.environ.get('CASE_MARGIN', '1.2'))
+CASE_BATCH_MAX = int(os.environ.get('CASE_BATCH_MAX', '10'))
+
+
+def in_paid_case(item_type: str) -> bool:
+    """Whether an item type can drop from a bought case."""
+    return item_type != 'privilege'
+
+
+def paid_case(catalog: dict) -> dict | None:
+    """Prize pool, sampler and price of a bought case, cached with the catalog version.
+
+    Bought cases never contain privilege prizes; those only come from the daily spin.
+    The price is the pool's expected balance payout times CASE_MARGIN (rounded up),
+    so opening cases cannot mint balance. CASE_MIN_PRICE can only raise it.
+    """
+    case = catalog.get('paid_case')
+    if case is None:
+        items = [item for item in catalog['items'] if in_paid_case(item['type'])]
+        if not items:
+            return None
+        weights = [item['chance'] for item in items]
+        total = sum(weights)
+        payouts = [item['value'] if item['type'] == 'balance' else 0 for item in items]
+        if total > 0:
+            expected = sum(weight * payout for weight, payout in zip(weights, payouts)) / total
+        else:
+            expected = sum(payouts) / len(items)
+        case = {
+            'items': items,
+            'sampler': AliasSampler(weights),
+            'price': max(CASE_MIN_PRICE, math.ceil(expected * CASE_MARGIN), 1)
+        }
+        catalog['paid_case'] = case
+    return case
+
+
+# Charges the whole batch, applies the summed prizes and writes every case_history
+# row (one multi-row insert via unnest) in a single statement.
+OPEN_BATCH_SQL = """
+    WITH prev AS (
+        SELECT id, balance FROM users WHERE id = %(user_id)s FOR UPDATE
+    ), claim AS (
+        UPDATE users u
+        SET balance = u.balance - %(cost)s + %(balance)s,
+            web_balance = u.web_balance - %(cost)s + %(balance)s
+        FROM prev
+        WHERE u.id = prev.id AND COALESCE(prev.balance, 0) >= %(cost)s
+        RETURNING u.id, u.balance
+    ), won AS (
+        INSERT INTO case_history (user_id, case_item_id)
+        SELECT claim.id, drawn.item_id
+        FROM claim CROSS JOIN unnest(%(item_ids)s::int[]) WITH ORDINALITY AS drawn(item_id, n)
+        ORDER BY drawn.n
+    ), counted AS (
+        INSERT INTO case_drop_stats (day, source, case_item_id, drops, value_total)
+        SELECT CURRENT_DATE, 'paid', drawn.item_id, COUNT(*), SUM(drawn.item_value)
+        FROM claim CROSS JOIN unnest(%(item_ids)s::int[], %(item_values)s::int[]) AS drawn(item_id, item_value)
+        GROUP BY drawn.item_id
+        ON CONFLICT (day, source, case_item_id) DO UPDATE
+        SET drops = case_drop_stats.drops + EXCLUDED.drops,
+            value_total = case_drop_stats.value_total + EXCLUDED.value_total
+    )
+    SELECT EXISTS (SELECT 1 FROM prev), EXISTS (SELECT 1 FROM claim), (SELECT balance FROM claim)
+"""
+
+
+def open_batch_params(user_id, won_items: list, price: int) -> dict:
+    """Folds the balance prizes of all drawn items into one users update."""
+    return {
+        'user_id': user_id,
+        'cost': price * len(won_items),
+        'balance': sum(prize_effects(item)[0] for item in won_items),
+        'item_ids': [item['id'] for item in won_items],
+        'item_values': [item['value'] for item in won_items]
+    }
+
+
+# =============================================================================
+# DROP STATS
+# =============================================================================
+
+DROP_STATS_DAYS = 30
+DROP_STATS_MAX_DAYS = 3650
+
+# Draw sources with their own prize pool: the daily spin draws from every active item,
+# a bought case only from items in_paid_case() allows
+DROP_SOURCES = ('spin', 'paid')
+
+# Reads only the per-day counters, so the cost depends on days x items, not on history size.
+DROP_STATS_SQL = """
+    SELECT ci.id, ci.name, ci.rarity, ci.item_type, ci.chance, ci.is_active, src.source,
+           COALESCE(SUM(s.drops), 0)::bigint, COALESCE(SUM(s.value_total), 0)::bigint
+    FROM case_items ci
+    CROSS JOIN unnest(%s::varchar[]) AS src(source)
+    LEFT JOIN case_drop_stats s
+        ON s.case_item_id = ci.id AND s.source = src.source AND s.day > CURRENT_DATE - %s
+    GROUP BY ci.id, src.source
+    ORDER BY ci.chance ASC
+"""
+
+
+def drop_source_stats(rows: list, source: str) -> dict:
+    """Observed vs configured rates of one source, against the weights of its own pool."""
+    pool = {row[0]: float(row[4]) for row in rows if row[5] and (source == 'spin' or in_paid_case(row[3]))}
+    total_chance = sum(pool.values()) or 1.0
+    total_drops = sum(row[7] for row in rows)
+    
+    items = []
+    for row in rows:
+        pooled = row[0] in pool
+        if not pooled and not row[7]:
+            continue
+        items.append({
+            'id': row[0],
+            'name': row[1],
+            'rarity': row[2],
+            'is_active': row[5],
+            'configured_rate': round(pool[row[0]] / total_chance, 6) if pooled else 0.0,
+            'observed_rate': round(row[7] / total_drops, 6) if total_drops else 0.0,
+            'drops': row[7],
+            'value_total': row[8]
+        })
+    
+    return {
+        'total_drops': total_drops,
+        'value_total': sum(item['value_total'] for item in items),
+        'items': items
+    }
+
+
+def load_drop_stats(cur, days: int) -> dict:
+    cur.execute(DROP_STATS_SQL, (list(DROP_SOURCES), days))
+    rows = cur.fetchall()
+    sources = {source: drop_source_stats([row for row in rows if row[6] == source], source) for source in DROP_SOURCES}
+    
+    return {
+        'days': days,
+        'total_drops': sum(stats['total_drops'] for stats in sources.values()),
+        'value_total': sum(stats['value_total'] for stats in sources.values()),
+        'sources': sources
+    }
+
+
+# =============================================================================
+# HISTORY PAGINATION
+# =============================================================================
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_PAGE_MAX = 100
+
+
+def encode_cursor(won_at: datetime, history_id: int) -> str:
+    """Opaque cursor pointing just past the last (won_at, id) of a page."""
+    raw = f'{won_at.isoformat()}|{history_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Inverse of encode_cursor; raises ValueError on anything malformed."""
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    won_at, history_id = raw.split('|')
+    return datetime.fromisoformat(won_at), int(history_id)
+
+
+def load_case_items(cur) -> list:
+    cur.execute(
+        "SELECT id, name, description, rarity, item_type, value, chance, icon, is_active FROM case_items WHERE is_active = true ORDER BY chance ASC"
+    )
+    items = []
+    for row in cur.fetchall():
+        items.append({
+            'id': row[0],
+            'name': row[1],
+            'description': row[2],
+            'rarity': row[3],
+            'type': row[4],
+            'value': row[5],
+            'chance': float(row[6]),
+            'icon': row[7],
+            'is_active': row[8]
+        })
+    return items
+
+
+PREFLIGHT = preflight('GET, POST, PUT, DELETE, OPTIONS', 'Content-Type, If-None-Match, X-Steam-Token')
+
+# A request that sends a session token must be authenticated by it; only requests
+# without a token may still name the user in the body or query (legacy clients).
+UNAUTHORIZED = {
+    'statusCode': 401,
+    'headers': JSON_HEADERS,
+    'body': json.dumps({'error': 'Invalid or expired session'}),
+    'isBase64Encoded': False
+}
+
+
+@timed_handler
 def handler(event: dict, context) -> dict:
     '''API для управления кейсами и ежедневной рулетки'''
     method = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+        return PREFLIGHT
     
     params = event.get('queryStringParameters') or {}
     action = params.get('action', 'items')
     
-    import psycopg2
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    if method == 'GET' and action == 'items':
+        catalog = fresh_catalog('case_items')
+        if catalog is not None:
+            return catalog_response(event, 'case_items', catalog)
+    
+    conn = LazyConnection()
     cur = conn.cursor()
     
     try:
         if method == 'GET' and action == 'items':
-            cur.execute(
-                "SELECT id, name, description, rarity, item_type, value, chance, icon, is_active FROM case_items WHERE is_active = true ORDER BY chance ASC"
-            )
-            items = []
-            for row in cur.fetchall():
-                items.append({
-                    'id': row[0],
-                    'name': row[1],
-                    'description': row[2],
-                    'rarity': row[3],
-                    'type': row[4],
-                    'value': row[5],
-                    'chance': float(row[6]),
-                    'icon': row[7],
-                    'is_active': row[8]
-                })
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'items': items}),
-                'isBase64Encoded': False
-            }
+            catalog = get_catalog(cur, 'case_items', load_case_items)
+            return catalog_response(event, 'case_items', catalog)
         
         if method == 'POST' and action == 'spin':
             body = json.loads(event.get('body', '{}'))
-            user_id = body.get('user_id')
+            session, token = authenticate(event)
+            if session is None and request_token(event):
+                return UNAUTHORIZED
+            user_id = session['uid'] if session else body.get('user_id')
             
             if not user_id:
                 return {
                     'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'headers': JSON_HEADERS,
                     'body': json.dumps({'error': 'User ID required'}),
                     'isBase64Encoded': False
                 }
             
-            cur.execute("SELECT last_daily_spin FROM users WHERE id = %s", (user_id,))
-            result = cur.fetchone()
+            catalog = get_catalog(cur, 'case_items', load_case_items)
+            items = catalog['items']
             
-            if not result:
-                cur.close()
-                conn.close()
+            if not items:
+                return {
+                    'statusCode': 500,
+                    'headers': JSON_HEADERS,
+                    'body': json.dumps({'error': 'No active items'}),
+                    'isBase64Encoded': False
+                }
+            
+            won_item = items[get_sampler(catalog).draw()]
+            ensure_history_partitions(cur)
+            user_found, claimed, last_spin, now = execute_autocommit(conn, cur, SPIN_CLAIM_SQL, spin_params(user_id, won_item))
+            
+            if not user_found:
                 return {
                     'statusCode': 404,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'headers': JSON_HEADERS,
                     'body': json.dumps({'error': 'User not found'}),
                     'isBase64Encoded': False
                 }
             
-            last_spin = result[0]
-            now = datetime.now()
-            
-            if last_spin and (now - last_spin) < timedelta(hours=24):
+            if not claimed:
                 time_left = timedelta(hours=24) - (now - last_spin)
                 hours = int(time_left.total_seconds() // 3600)
                 minutes = int((time_left.total_seconds() % 3600) // 60)
                 
                 return {
                     'statusCode': 429,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'headers': JSON_HEADERS,
                     'body': json.dumps({
                         'error': 'Daily limit reached',
                         'time_left': f'{hours}ч {minutes}м'
@@ -96,113 +529,197 @@ def handler(event: dict, context) -> dict:
                     'isBase64Encoded': False
                 }
             
-            cur.execute(
-                "SELECT id, name, description, rarity, item_type, value, chance, icon FROM case_items WHERE is_active = true"
-            )
-            items = cur.fetchall()
+            result = {key: value for key, value in won_item.items() if key != 'is_active'}
             
-            if not items:
+            return with_token({
+                'statusCode': 200,
+                'headers': JSON_HEADERS,
+                'body': json.dumps({'item': result}),
+                'isBase64Encoded': False
+            }, token)
+        
+        if method == 'POST' and action == 'open_batch':
+            body = json.loads(event.get('body') or '{}')
+            session, token = authenticate(event)
+            if session is None and request_token(event):
+                return UNAUTHORIZED
+            user_id = session['uid'] if session else body.get('user_id')
+            
+            try:
+                count = int(params.get('count', 1))
+            except ValueError:
+                count = 0
+            
+            if not user_id:
+                return {
+                    'statusCode': 400,
+                    'headers': JSON_HEADERS,
+                    'body': json.dumps({'error': 'User ID required'}),
+                    'isBase64Encoded': False
+                }
+            
+            if not 1 <= count <= CASE_BATCH_MAX:
+                return {
+                    'statusCode': 400,
+                    'headers': JSON_HEADERS,
+                    'body': json.dumps({'error': f'count must be between 1 and {CASE_BATCH_MAX}'}),
+                    'isBase64Encoded': False
+                }
+            
+            case = paid_case(get_catalog(cur, 'case_items', load_case_items))
+            
+            if case is None:
                 return {
                     'statusCode': 500,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'headers': JSON_HEADERS,
                     'body': json.dumps({'error': 'No active items'}),
                     'isBase64Encoded': False
                 }
             
-            total_chance = sum(float(item[6]) for item in items)
-            rand = random.uniform(0, total_chance)
+            won_items = [case['items'][case['sampler'].draw()] for _ in range(count)]
+            ensure_history_partitions(cur)
+            user_found, claimed, balance = execute_autocommit(
+                conn, cur, OPEN_BATCH_SQL, open_batch_params(user_id, won_items, case['price'])
+            )
             
-            cumulative = 0
-            won_item = None
-            for item in items:
-                cumulative += float(item[6])
-                if rand <= cumulative:
-                    won_item = item
-                    break
+            if not user_found:
+                return {
+                    'statusCode': 404,
+                    'headers': JSON_HEADERS,
+                    'body': json.dumps({'error': 'User not found'}),
+                    'isBase64Encoded': False
+                }
             
-            if not won_item:
-                won_item = items[-1]
+            if not claimed:
+                return {
+                    'statusCode': 402,
+                    'headers': JSON_HEADERS,
+                    'body': json.dumps({'error': 'Insufficient balance', 'cost': case['price'] * count}),
+                    'isBase64Encoded': False
+                }
             
-            cur.execute(
-                "INSERT INTO case_history (user_id, case_item_id) VALUES (%s, %s)",
-                (user_id, won_item[0])
-            )
+            return with_token({
+                'statusCode': 200,
+                'headers': JSON_HEADERS,
+                'body': json.dumps({
+                    'items': [{key: value for key, value in item.items() if key != 'is_active'} for item in won_items],
+                    'price': case['price'],
+                    'balance': balance
+                }),
+                'isBase64Encoded': False
+            }, token)
+        
+        if method == 'GET' and action == 'simulate':
+            try:
+                spins = int(params.get('spins', simulate.DEFAULT_SPINS))
+                players = int(params.get('players', simulate.DEFAULT_PLAYERS))
+            except ValueError:
+                spins = players = 0
             
-            if won_item[4] == 'balance':
-                cur.execute(
-                    "UPDATE users SET balance = balance + %s, last_daily_spin = %s WHERE id = %s",
-                    (won_item[5], now, user_id)
-                )
-            elif won_item[4] == 'privilege':
-                cur.execute(
-                    "UPDATE users SET privilege = %s, last_daily_spin = %s WHERE id = %s",
-                    (won_item[1].lower().split()[0], now, user_id)
-                )
-            else:
-                cur.execute(
-                    "UPDATE users SET last_daily_spin = %s WHERE id = %s",
-                    (now, user_id)
-                )
+            if not 1 <= spins <= simulate.MAX_SPINS or players < 1:
+                return {
+                    'statusCode': 400,
+                    'headers': JSON_HEADERS,
+                    'body': json.dumps({'error': f'spins must be between 1 and {simulate.MAX_SPINS}, players positive'}),
+                    'isBase64Encoded': False
+                }
             
-            conn.commit()
+            catalog = get_catalog(cur, 'case_items', load_case_items)
+            if not catalog['items']:
+                return {
+                    'statusCode': 500,
+                    'headers': JSON_HEADERS,
+                    'body': json.dumps({'error': 'No active items'}),
+                    'isBase64Encoded': False
+                }
             
-            result = {
-                'id': won_item[0],
-                'name': won_item[1],
-                'description': won_item[2],
-                'rarity': won_item[3],
-                'type': won_item[4],
-                'value': won_item[5],
-                'chance': float(won_item[6]),
-                'icon': won_item[7]
+            return {
+                'statusCode': 200,
+                'headers': JSON_HEADERS,
+                'body': json.dumps(simulate.simulate(catalog['items'], spins, players), ensure_ascii=False),
+                'isBase64Encoded': False
             }
+        
+        if method == 'GET' and action == 'drop_stats':
+            try:
+                days = int(params.get('days', DROP_STATS_DAYS))
+            except ValueError:
+                days = 0
+            
+            if not 1 <= days <= DROP_STATS_MAX_DAYS:
+                return {
+                    'statusCode': 400,
+                    'headers': JSON_HEADERS,
+                    'body': json.dumps({'error': f'days must be between 1 and {DROP_STATS_MAX_DAYS}'}),
+                    'isBase64Encoded': False
+                }
             
             return {
                 'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'item': result}),
+                'headers': JSON_HEADERS,
+                'body': json.dumps(load_drop_stats(cur, days), ensure_ascii=False),
                 'isBase64Encoded': False
             }
         
         if method == 'GET' and action == 'history':
-            user_id = params.get('user_id')
+            session, token = authenticate(event)
+            if session is None and request_token(event):
+                return UNAUTHORIZED
+            user_id = session['uid'] if session else params.get('user_id')
             
             if not user_id:
                 return {
                     'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'headers': JSON_HEADERS,
                     'body': json.dumps({'error': 'User ID required'}),
                     'isBase64Encoded': False
                 }
             
+            try:
+                limit = min(max(int(params.get('limit', HISTORY_PAGE_SIZE)), 1), HISTORY_PAGE_MAX)
+                after = decode_cursor(params['cursor']) if params.get('cursor') else None
+            except ValueError:
+                return {
+                    'statusCode': 400,
+                    'headers': JSON_HEADERS,
+                    'body': json.dumps({'error': 'Invalid limit or cursor'}),
+                    'isBase64Encoded': False
+                }
+            
+            # Keyset page: idx_case_history_user_won_at serves the filter, the order and
+            # case_item_id, so deep pages cost the same as the first one.
+            keyset = "AND (ch.won_at, ch.id) < (%s, %s)" if after else ""
             cur.execute(
-                """
-                SELECT ch.won_at, ci.name, ci.rarity, ci.value 
+                f"""
+                SELECT ch.id, ch.won_at, ci.name, ci.rarity, ci.value 
                 FROM case_history ch
                 JOIN case_items ci ON ch.case_item_id = ci.id
-                WHERE ch.user_id = %s
-                ORDER BY ch.won_at DESC
-                LIMIT 50
+                WHERE ch.user_id = %s {keyset}
+                ORDER BY ch.won_at DESC, ch.id DESC
+                LIMIT %s
                 """,
-                (user_id,)
+                (user_id, *(after or ()), limit + 1)
             )
+            rows = cur.fetchall()
             
             history = []
-            for row in cur.fetchall():
+            for row in rows[:limit]:
                 history.append({
-                    'id': len(history) + 1,
-                    'item_name': row[1],
-                    'rarity': row[2],
-                    'value': row[3],
-                    'opened_at': row[0].isoformat()
+                    'id': row[0],
+                    'item_name': row[2],
+                    'rarity': row[3],
+                    'value': row[4],
+                    'opened_at': row[1].isoformat()
                 })
             
-            return {
+            next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+            
+            return with_token({
                 'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'history': history}),
+                'headers': JSON_HEADERS,
+                'body': json.dumps({'history': history, 'next_cursor': next_cursor}),
                 'isBase64Encoded': False
-            }
+            }, token)
         
         if method == 'POST' and action == 'create':
             body = json.loads(event.get('body', '{}'))
@@ -215,10 +732,11 @@ def handler(event: dict, context) -> dict:
                 (body['name'], body['description'], body['rarity'], body['type'], body['value'], body['chance'], body['icon'])
             )
             new_id = cur.fetchone()[0]
+            bump_catalog_version(cur, 'case_items')
             conn.commit()
             return {
                 'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'headers': JSON_HEADERS,
                 'body': json.dumps({'id': new_id, 'message': 'Item created'}),
                 'isBase64Encoded': False
             }
@@ -233,10 +751,11 @@ def handler(event: dict, context) -> dict:
                 """,
                 (body['name'], body['description'], body['rarity'], body['type'], body['value'], body['chance'], body['icon'], body['id'])
             )
+            bump_catalog_version(cur, 'case_items')
             conn.commit()
             return {
                 'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'headers': JSON_HEADERS,
                 'body': json.dumps({'message': 'Item updated'}),
                 'isBase64Encoded': False
             }
@@ -244,17 +763,18 @@ def handler(event: dict, context) -> dict:
         if method == 'POST' and action == 'delete':
             body = json.loads(event.get('body', '{}'))
             cur.execute("UPDATE case_items SET is_active = false WHERE id = %s", (body['id'],))
+            bump_catalog_version(cur, 'case_items')
             conn.commit()
             return {
                 'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'headers': JSON_HEADERS,
                 'body': json.dumps({'message': 'Item deleted'}),
                 'isBase64Encoded': False
             }
         
         return {
             'statusCode': 404,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'headers': JSON_HEADERS,
             'body': json.dumps({'error': 'Not found'}),
             'isBase64Encoded': False
         }
@@ -263,10 +783,10 @@ def handler(event: dict, context) -> dict:
         conn.rollback()
         return {
             'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'headers': JSON_HEADERS,
             'body': json.dumps({'error': str(e)}),
             'isBase64Encoded': False
         }
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+        conn.release()
\ No newline at end of file
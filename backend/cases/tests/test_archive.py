@@ -0,0 +1,68 @@
+"""archive.py against a real Postgres with the migrations applied.
+
+Skipped without DATABASE_URL.
+"""
+import gzip
+import json
+import os
+import uuid
+from datetime import date
+
+import pytest
+
+if not os.environ.get('DATABASE_URL'):
+    pytest.skip('needs DATABASE_URL with the migrations applied', allow_module_level=True)
+
+psycopg2 = pytest.importorskip('psycopg2')
+
+import archive
+
+PARTITION = 'case_history_2001_01'  # a month no real history is in
+
+
+def test_cutoff_month():
+    assert archive.cutoff_month(0, date(2026, 10, 18)) == date(2026, 10, 1)
+    assert archive.cutoff_month(5, date(2026, 3, 1)) == date(2025, 10, 1)
+
+
+@pytest.fixture
+def conn():
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    with conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO users (steam_id, username) VALUES (%s, 'archive-test') RETURNING id",
+            ('test-' + uuid.uuid4().hex[:12],)
+        )
+        user_id = cur.fetchone()[0]
+        cur.execute("SELECT ensure_case_history_partition(DATE '2001-01-01')")
+        cur.execute("""
+            INSERT INTO case_history (user_id, case_item_id, won_at)
+            SELECT %s, (SELECT MIN(id) FROM case_items), TIMESTAMP '2001-01-01' + n * INTERVAL '1 day'
+            FROM generate_series(0, 4) AS n
+        """, (user_id,))
+    conn.commit()
+    yield conn
+    conn.rollback()
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {PARTITION}")
+        cur.execute("DELETE FROM case_history WHERE user_id = %s", (user_id,))
+        cur.execute("DELETE FROM users WHERE id = %s", (user_id,))
+    conn.commit()
+    conn.close()
+
+
+def test_archives_and_drops_a_partition(conn, tmp_path):
+    with conn.cursor() as cur:
+        assert (PARTITION, date(2001, 1, 1)) in archive.list_partitions(cur)
+    conn.commit()
+
+    assert archive.archive_partition(conn, PARTITION, str(tmp_path)) == 5
+
+    with gzip.open(tmp_path / f'{PARTITION}.ndjson.gz', 'rt', encoding='utf-8') as f:
+        rows = [json.loads(line) for line in f]
+    assert [row['won_at'][:10] for row in rows] == ['2001-01-01', '2001-01-02', '2001-01-03', '2001-01-04', '2001-01-05']
+    assert not (tmp_path / f'{PARTITION}.ndjson.gz.partial').exists()
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s)", (PARTITION,))
+        assert cur.fetchone()[0] is None
+        assert PARTITION not in [name for name, _ in archive.list_partitions(cur)]
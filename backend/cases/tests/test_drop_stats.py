@@ -0,0 +1,31 @@
+import cases_index as index
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, sql, params=None):
+        self.params = params
+
+    def fetchall(self):
+        return self.rows
+
+
+def rates(stats: dict) -> dict:
+    return {item['name']: (item['configured_rate'], item['observed_rate']) for item in stats['items']}
+
+
+def test_each_source_is_compared_with_its_own_pool():
+    # (id, name, rarity, item_type, chance, is_active, source, drops, value_total)
+    items = [(1, 'VIP', 'epic', 'privilege', 10.0, True), (2, '100 rub', 'common', 'balance', 30.0, True),
+             (3, 'AK-47', 'rare', 'weapon', 60.0, True)]
+    drops = {('spin', 1): 10, ('spin', 2): 30, ('spin', 3): 60, ('paid', 2): 40, ('paid', 3): 80}
+    rows = [item + (source, drops.get((source, item[0]), 0), 0) for source in index.DROP_SOURCES for item in items]
+
+    stats = index.load_drop_stats(FakeCursor(rows), 30)
+
+    assert stats['total_drops'] == 220
+    assert rates(stats['sources']['spin']) == {'VIP': (0.1, 0.1), '100 rub': (0.3, 0.3), 'AK-47': (0.6, 0.6)}
+    # Bought cases never drop privileges, so their rates are against balance + weapon only
+    assert rates(stats['sources']['paid']) == {'100 rub': (0.333333, 0.333333), 'AK-47': (0.666667, 0.666667)}
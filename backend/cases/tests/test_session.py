@@ -0,0 +1,14 @@
+import json
+
+import cases_index as index
+
+
+def test_invalid_token_is_rejected_instead_of_falling_back_to_user_id():
+    response = index.handler({
+        'httpMethod': 'POST',
+        'queryStringParameters': {'action': 'spin'},
+        'headers': {'X-Steam-Token': 'not.a-valid-token'},
+        'body': json.dumps({'user_id': 1})
+    }, None)
+
+    assert response['statusCode'] == 401
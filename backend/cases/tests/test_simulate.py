@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip('numpy')
+
+import simulate
+
+ITEMS = [
+    {'id': 1, 'name': 'AWP Dragon Lore', 'rarity': 'legendary', 'type': 'weapon', 'value': 0, 'chance': 1.0},
+    {'id': 2, 'name': '1000 рублей', 'rarity': 'epic', 'type': 'balance', 'value': 1000, 'chance': 9.0},
+    {'id': 3, 'name': '100 рублей', 'rarity': 'common', 'type': 'balance', 'value': 100, 'chance': 30.0},
+    {'id': 4, 'name': 'AK-47', 'rarity': 'common', 'type': 'weapon', 'value': 0, 'chance': 60.0},
+]
+CHI2_CRITICAL_3DF = 16.27  # p = 0.001
+
+
+def test_counts_follow_the_configured_weights():
+    spins = 1_000_000
+    report = simulate.simulate(ITEMS, spins=spins, players=100, days=1000, seed=7)
+
+    counts = [item['count'] for item in report['items']]
+    rates = [item['configured_rate'] for item in report['items']]
+    assert sum(counts) == spins
+    assert rates == [0.01, 0.09, 0.3, 0.6]
+    chi2 = sum((count - spins * rate) ** 2 / (spins * rate) for count, rate in zip(counts, rates))
+    assert chi2 < CHI2_CRITICAL_3DF
+
+    assert report['payout']['expected'] == 120.0
+    assert abs(report['payout']['observed'] - 120.0) < 4 * report['payout']['std_error']
+    assert report['legendary']['rate_per_spin'] == 0.01
+
+
+def test_same_seed_same_report():
+    assert simulate.simulate(ITEMS, spins=10_000, seed=1) == simulate.simulate(ITEMS, spins=10_000, seed=1)
+
+
+def test_empty_catalog_is_rejected():
+    with pytest.raises(ValueError):
+        simulate.simulate([], spins=10)
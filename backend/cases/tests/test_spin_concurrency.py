@@ -0,0 +1,74 @@
+"""Parallel daily spins for one user against a real Postgres with the migrations applied.
+
+    DATABASE_URL=postgresql://... python -m pytest backend/cases/tests
+
+Skipped without DATABASE_URL.
+"""
+import json
+import os
+import threading
+import uuid
+
+import pytest
+
+if not os.environ.get('DATABASE_URL'):
+    pytest.skip('needs DATABASE_URL with the migrations applied', allow_module_level=True)
+
+psycopg2 = pytest.importorskip('psycopg2')
+
+import cases_index as index
+
+SPINS = 8
+
+
+@pytest.fixture
+def user_id():
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute(
+        "INSERT INTO users (steam_id, username) VALUES (%s, 'spin-test') RETURNING id",
+        ('test-' + uuid.uuid4().hex[:12],)
+    )
+    uid = cur.fetchone()[0]
+    yield uid
+    cur.execute("DELETE FROM case_history WHERE user_id = %s", (uid,))
+    cur.execute("DELETE FROM users WHERE id = %s", (uid,))
+    conn.close()
+
+
+def spin(uid: int) -> dict:
+    return index.handler({
+        'httpMethod': 'POST',
+        'queryStringParameters': {'action': 'spin'},
+        'headers': {},
+        'body': json.dumps({'user_id': uid})
+    }, None)
+
+
+def test_parallel_spins_claim_once(user_id):
+    barrier = threading.Barrier(SPINS)
+    responses = []
+
+    def worker():
+        barrier.wait()
+        responses.append(spin(user_id))
+
+    threads = [threading.Thread(target=worker) for _ in range(SPINS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    statuses = sorted(response['statusCode'] for response in responses)
+    assert statuses == [200] + [429] * (SPINS - 1)
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM case_history WHERE user_id = %s", (user_id,))
+            assert cur.fetchone()[0] == 1
+            cur.execute("SELECT last_daily_spin IS NOT NULL FROM users WHERE id = %s", (user_id,))
+            assert cur.fetchone()[0]
+    finally:
+        conn.close()
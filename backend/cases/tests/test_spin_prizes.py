@@ -0,0 +1,96 @@
+"""Daily spin prizes against a purchased privilege, on a real Postgres with the migrations applied.
+
+Skipped without DATABASE_URL.
+"""
+import json
+import os
+import uuid
+
+import pytest
+
+if not os.environ.get('DATABASE_URL'):
+    pytest.skip('needs DATABASE_URL with the migrations applied', allow_module_level=True)
+
+psycopg2 = pytest.importorskip('psycopg2')
+
+import cases_index as index
+
+
+class FixedDraw:
+    def __init__(self, position: int):
+        self.position = position
+
+    def draw(self) -> int:
+        return self.position
+
+
+@pytest.fixture
+def db():
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn.autocommit = True
+    cur = conn.cursor()
+    created = []
+
+    def make_user(privilege: str = 'user', expires_in_days: int = None) -> int:
+        cur.execute("""
+            INSERT INTO users (steam_id, username, balance, privilege, privilege_expires_at)
+            VALUES (%s, 'prize-test', 0, %s, LOCALTIMESTAMP + %s * INTERVAL '1 day')
+            RETURNING id
+        """, ('test-' + uuid.uuid4().hex[:12], privilege, expires_in_days))
+        created.append(cur.fetchone()[0])
+        return created[-1]
+
+    def user(uid: int) -> tuple:
+        cur.execute("SELECT privilege, privilege_expires_at, balance, web_balance FROM users WHERE id = %s", (uid,))
+        return cur.fetchone()
+
+    yield make_user, user
+    for uid in created:
+        cur.execute("DELETE FROM case_history WHERE user_id = %s", (uid,))
+        cur.execute("DELETE FROM users WHERE id = %s", (uid,))
+    conn.close()
+
+
+def spin(monkeypatch, uid: int, prize: str) -> dict:
+    monkeypatch.setattr(index, 'get_sampler', lambda catalog: FixedDraw(
+        next(position for position, item in enumerate(catalog['items']) if item['name'] == prize)
+    ))
+    return index.handler({
+        'httpMethod': 'POST',
+        'queryStringParameters': {'action': 'spin'},
+        'headers': {},
+        'body': json.dumps({'user_id': uid})
+    }, None)
+
+
+def test_lower_tier_prize_keeps_purchased_privilege(db, monkeypatch):
+    make_user, user = db
+    uid = make_user('premium', 30)
+    before = user(uid)
+
+    assert spin(monkeypatch, uid, 'VIP на месяц')['statusCode'] == 200
+    assert user(uid)[:2] == ('premium', before[1])
+
+
+def test_higher_tier_prize_replaces_purchased_privilege(db, monkeypatch):
+    make_user, user = db
+    uid = make_user('vip', 30)
+
+    assert spin(monkeypatch, uid, 'Admin на день')['statusCode'] == 200
+    assert user(uid)[0] == 'admin'
+
+
+def test_prize_without_purchase(db, monkeypatch):
+    make_user, user = db
+    uid = make_user()
+
+    assert spin(monkeypatch, uid, 'VIP на месяц')['statusCode'] == 200
+    assert user(uid)[0] == 'vip'
+
+
+def test_balance_prize_counts_as_web_balance(db, monkeypatch):
+    make_user, user = db
+    uid = make_user()
+
+    assert spin(monkeypatch, uid, '100 рублей')['statusCode'] == 200
+    assert user(uid)[2:] == (100, 100)
@@ -0,0 +1,172 @@
+"""Grant what paid orders bought, from the order_fulfillments queue.
+
+    python fulfill.py                         # drain the queue once
+    python fulfill.py --loop --interval 5     # keep running as a worker
+
+The webhook only enqueues paid orders. Any number of workers can run side by
+side: each batch is claimed with FOR UPDATE SKIP LOCKED, so workers never
+wait on or double-claim each other's rows. A batch is applied by one
+statement that claims the rows, updates every affected user once and marks
+the rows done or failed. The claim and the grants commit together, so an
+order is granted exactly once even if a worker dies mid-batch.
+
+Products (orders.product_type / product_id):
+- ``privilege``: privileges_shop row; sets users.privilege and extends
+  privilege_expires_at by duration_days (from now if the user had a
+  different or expired privilege)
+- ``balance``: adds the paid amount in rubles to users.balance
+
+Orders without a user, with an unknown product type or a missing shop row
+are marked failed with the reason in ``error``.
+
+Every pass also resets privileges whose privilege_expires_at has passed to
+``user``; the player sync then brings back any privilege the game server has.
+"""
+import argparse
+import sys
+import time
+
+from runtime import pg_pool, release_connection
+
+from index import get_schema
+
+DEFAULT_BATCH = 100
+
+# A user can have several orders in one batch, and one UPDATE may change a row only
+# once, so grants are aggregated per user first. With several privilege orders the
+# most recent order's level wins and the durations of that level add up.
+FULFILL_BATCH_SQL = """
+    WITH claimed AS (
+        SELECT order_id FROM {S}order_fulfillments
+        WHERE status = 'pending'
+        ORDER BY created_at
+        LIMIT %(batch)s
+        FOR UPDATE SKIP LOCKED
+    ), items AS (
+        SELECT c.order_id, o.user_id, o.product_type, FLOOR(o.amount)::integer AS amount,
+               p.privilege_level, p.duration_days,
+               CASE
+                   WHEN o.user_id IS NULL THEN 'order has no user'
+                   WHEN o.product_type = 'balance' THEN NULL
+                   WHEN o.product_type <> 'privilege' THEN 'unknown product type ' || o.product_type
+                   WHEN p.id IS NULL THEN 'privilege not found'
+               END AS error
+        FROM claimed c
+        JOIN {S}orders o ON o.id = c.order_id
+        LEFT JOIN {S}privileges_shop p ON o.product_type = 'privilege' AND p.id = o.product_id
+    ), ranked AS (
+        SELECT *, first_value(privilege_level) OVER (
+            PARTITION BY user_id ORDER BY privilege_level IS NOT NULL DESC, order_id DESC
+        ) AS final_level
+        FROM items
+        WHERE error IS NULL
+    ), grants AS (
+        SELECT user_id,
+               COALESCE(SUM(amount) FILTER (WHERE product_type = 'balance'), 0) AS balance,
+               MAX(final_level) AS privilege,
+               SUM(duration_days) FILTER (WHERE privilege_level = final_level) AS days
+        FROM ranked
+        GROUP BY user_id
+    ), granted AS (
+        UPDATE {S}users u
+        SET balance = COALESCE(u.balance, 0) + g.balance,
+            web_balance = u.web_balance + g.balance,
+            privilege = COALESCE(g.privilege, u.privilege),
+            privilege_expires_at = CASE
+                WHEN g.privilege IS NULL THEN u.privilege_expires_at
+                WHEN u.privilege = g.privilege AND u.privilege_expires_at > LOCALTIMESTAMP
+                    THEN u.privilege_expires_at + g.days * INTERVAL '1 day'
+                ELSE LOCALTIMESTAMP + g.days * INTERVAL '1 day'
+            END,
+            updated_at = LOCALTIMESTAMP
+        FROM grants g
+        WHERE u.id = g.user_id
+        RETURNING u.id
+    ), finished AS (
+        UPDATE {S}order_fulfillments f
+        SET status = CASE WHEN i.error IS NULL THEN 'done' ELSE 'failed' END,
+            error = i.error,
+            fulfilled_at = LOCALTIMESTAMP
+        FROM items i
+        WHERE f.order_id = i.order_id
+        RETURNING f.status
+    )
+    SELECT COUNT(*) FILTER (WHERE status = 'done'),
+           COUNT(*) FILTER (WHERE status = 'failed'),
+           (SELECT COUNT(*) FROM granted)
+    FROM finished
+"""
+
+
+EXPIRE_PRIVILEGES_SQL = """
+    UPDATE {S}users
+    SET privilege = 'user', privilege_expires_at = NULL, updated_at = LOCALTIMESTAMP
+    WHERE privilege_expires_at <= LOCALTIMESTAMP
+"""
+
+
+def expire_privileges(conn) -> int:
+    """Reset purchased privileges that ran out; returns how many users lost one."""
+    try:
+        with conn.cursor() as cur:
+            cur.execute(EXPIRE_PRIVILEGES_SQL.format(S=get_schema()))
+            expired = cur.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return expired
+
+
+def fulfill_batch(conn, batch: int = DEFAULT_BATCH) -> tuple:
+    """Claim and apply one batch in its own transaction; returns (done, failed, users granted)."""
+    try:
+        with conn.cursor() as cur:
+            cur.execute(FULFILL_BATCH_SQL.format(S=get_schema()), {'batch': batch})
+            result = cur.fetchone()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return tuple(result)
+
+
+def drain(conn, batch: int = DEFAULT_BATCH) -> tuple:
+    """Run batches until the queue has no unclaimed pending rows; returns (done, failed)."""
+    done = failed = 0
+    while True:
+        batch_done, batch_failed, _ = fulfill_batch(conn, batch)
+        done += batch_done
+        failed += batch_failed
+        if batch_done + batch_failed < batch:
+            return done, failed
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Grant products of paid orders.')
+    parser.add_argument('--batch', type=int, default=DEFAULT_BATCH, help='Orders claimed per transaction')
+    parser.add_argument('--loop', action='store_true', help='Keep polling the queue')
+    parser.add_argument('--interval', type=float, default=5.0, help='Seconds between polls with --loop')
+    args = parser.parse_args(argv)
+
+    if args.batch < 1:
+        parser.error('--batch must be at least 1')
+
+    while True:
+        conn = pg_pool.acquire()
+        try:
+            done, failed = drain(conn, args.batch)
+            expired = expire_privileges(conn)
+        finally:
+            release_connection(conn)
+        if done or failed:
+            print(f'{done} orders fulfilled, {failed} failed')
+        if expired:
+            print(f'{expired} privileges expired')
+        if not args.loop:
+            return 0
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
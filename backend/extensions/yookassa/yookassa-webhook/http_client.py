@@ -0,0 +1,223 @@
+"""Outbound HTTP client for calls to Steam and YooKassa.
+
+Keeps persistent (keep-alive) connections per host, applies separate connect
+and read timeouts, retries idempotent requests with jittered backoff and trips
+a per-host circuit breaker so a slow or failing upstream fails fast instead of
+tying up function instances.
+
+Like runtime.py, every function that calls out ships an identical copy.
+"""
+import json
+import random
+import threading
+import time
+import urllib.parse
+
+from runtime import lazy_import
+
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'}
+IDEMPOTENCY_HEADERS = {'idempotence-key', 'idempotency-key'}
+RETRY_STATUSES = {429, 502, 503, 504}
+MAX_IDLE_PER_HOST = 4
+
+
+class HTTPError(Exception):
+    """The upstream answered with a 4xx/5xx status."""
+
+    def __init__(self, status: int, body: bytes):
+        super().__init__(f'HTTP {status}: {body[:200].decode(errors="replace")}')
+        self.status = status
+        self.body = body
+
+
+class CircuitOpenError(Exception):
+    """The host failed too often recently; the call was not attempted."""
+
+
+class Response:
+    def __init__(self, status: int, headers: dict, body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+
+# =============================================================================
+# CIRCUIT BREAKER
+# =============================================================================
+
+class CircuitBreaker:
+    """Opens after ``failures`` consecutive failures; after ``reset_after`` seconds one
+    trial call is let through (half-open) and its outcome closes or re-opens the circuit."""
+
+    def __init__(self, failures: int = 5, reset_after: float = 30.0):
+        self.failures = failures
+        self.reset_after = reset_after
+        self._count = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if not self._trial and time.monotonic() - self._opened_at >= self.reset_after:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._count = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._count += 1
+            if self._trial or self._count >= self.failures:
+                self._opened_at = time.monotonic()
+                self._trial = False
+
+
+# =============================================================================
+# CLIENT
+# =============================================================================
+
+class HTTPClient:
+    """Thread-safe client; keep one per function module so warm invocations reuse connections."""
+
+    def __init__(self, connect_timeout: float = 3.0, read_timeout: float = 10.0, retries: int = 2,
+                 backoff: float = 0.2, breaker_failures: int = 5, breaker_reset: float = 30.0,
+                 ssl_context=None):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker_failures = breaker_failures
+        self.breaker_reset = breaker_reset
+        self.ssl_context = ssl_context
+        self._idle = {}      # (scheme, host, port) -> [connection]
+        self._breakers = {}  # (scheme, host, port) -> CircuitBreaker
+        self._lock = threading.Lock()
+
+    def get(self, url: str, headers: dict = None, **kwargs) -> Response:
+        return self.request('GET', url, headers=headers, **kwargs)
+
+    def post(self, url: str, body=None, headers: dict = None, **kwargs) -> Response:
+        return self.request('POST', url, body=body, headers=headers, **kwargs)
+
+    def request(self, method: str, url: str, body=None, headers: dict = None,
+                idempotent: bool = None, read_timeout: float = None) -> Response:
+        """Send a request and read the whole response; raises HTTPError for 4xx/5xx.
+
+        ``idempotent`` defaults to true for safe methods and for requests carrying an
+        Idempotence-Key header; only those are retried, with full-jitter backoff.
+        """
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        headers = dict(headers or {})
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+            headers.setdefault('Content-Type', 'application/json')
+        elif isinstance(body, str):
+            body = body.encode()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS or any(h.lower() in IDEMPOTENCY_HEADERS for h in headers)
+
+        breaker = self._breaker(key)
+        attempts = self.retries + 1 if idempotent else 1
+        for attempt in range(attempts):
+            if not breaker.allow():
+                raise CircuitOpenError(f'Circuit open for {key[1]}')
+            try:
+                response = self._send(key, method, path, body, headers, read_timeout or self.read_timeout)
+            except (OSError, lazy_import('http.client').HTTPException) as e:
+                breaker.record_failure()
+                if attempt + 1 >= attempts:
+                    raise
+                error = e
+            else:
+                if response.status >= 500 or response.status == 429:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if response.status in RETRY_STATUSES and attempt + 1 < attempts:
+                    error = HTTPError(response.status, response.body)
+                elif response.status >= 400:
+                    raise HTTPError(response.status, response.body)
+                else:
+                    return response
+            time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+        raise error
+
+    # -------------------------------------------------------------------------
+    # Connections
+    # -------------------------------------------------------------------------
+
+    def _breaker(self, key) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = self._breakers[key] = CircuitBreaker(self.breaker_failures, self.breaker_reset)
+            return breaker
+
+    def _send(self, key, method, path, body, headers, read_timeout) -> Response:
+        conn, reused = self._checkout(key)
+        try:
+            try:
+                response = self._exchange(conn, method, path, body, headers, read_timeout)
+            except (ConnectionError, lazy_import('http.client').RemoteDisconnected):
+                if not reused:
+                    raise
+                # A reused keep-alive connection the server had already closed: the
+                # usual cause is an idle timeout, so resend once on a fresh connection.
+                conn.close()
+                conn, reused = self._connect(key), False
+                response = self._exchange(conn, method, path, body, headers, read_timeout)
+        except BaseException:
+            conn.close()
+            raise
+        if response.will_close:
+            conn.close()
+        else:
+            self._checkin(key, conn)
+        return Response(response.status, dict(response.getheaders()), response.body)
+
+    def _exchange(self, conn, method, path, body, headers, read_timeout):
+        if conn.sock is None:
+            conn.connect()
+        conn.sock.settimeout(read_timeout)
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        response.body = response.read()
+        return response
+
+    def _checkout(self, key) -> tuple:
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._connect(key), False
+
+    def _checkin(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < MAX_IDLE_PER_HOST:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def _connect(self, key):
+        http_client = lazy_import('http.client')
+        scheme, host, port = key
+        if scheme == 'https':
+            context = self.ssl_context or lazy_import('ssl').create_default_context()
+            return http_client.HTTPSConnection(host, port, timeout=self.connect_timeout, context=context)
+        return http_client.HTTPConnection(host, port, timeout=self.connect_timeout)
@@ -1,12 +1,12 @@
 """YooKassa webhook handler for payment notifications."""
+from runtime import pg_pool, release_connection, timed_handler  # first: starts the cold-start clock
+
 import json
 import os
 import base64
 from datetime import datetime
-from urllib.request import Request, urlopen
-from urllib.error import HTTPError
 
-import psycopg2
+from http_client import HTTPClient
 
 # =============================================================================
 # CONSTANTS
@@ -17,6 +17,10 @@ HEADERS = {
 }
 
 YOOKASSA_API_URL = "https://api.yookassa.ru/v3/payments"
+YOOKASSA_TIMEOUT = float(os.environ.get('YOOKASSA_TIMEOUT', '10'))
+
+# Kept at module level so warm invocations reuse the TLS connection to YooKassa
+yookassa_http = HTTPClient(read_timeout=YOOKASSA_TIMEOUT)
 
 
 # =============================================================================
@@ -32,19 +36,12 @@ def verify_payment_via_api(payment_id: str, shop_id: str, secret_key: str) -> di
     auth_string = f"{shop_id}:{secret_key}"
     auth_bytes = base64.b64encode(auth_string.encode()).decode()
 
-    request = Request(
-        f"{YOOKASSA_API_URL}/{payment_id}",
-        headers={
-            'Authorization': f'Basic {auth_bytes}',
-            'Content-Type': 'application/json'
-        },
-        method='GET'
-    )
-
     try:
-        with urlopen(request, timeout=10) as response:
-            return json.loads(response.read().decode())
-    except (HTTPError, Exception):
+        return yookassa_http.get(
+            f"{YOOKASSA_API_URL}/{payment_id}",
+            headers={'Authorization': f'Basic {auth_bytes}'}
+        ).json()
+    except Exception:
         return None
 
 
@@ -53,8 +50,8 @@ def verify_payment_via_api(payment_id: str, shop_id: str, secret_key: str) -> di
 # =============================================================================
 
 def get_connection():
-    """Get database connection."""
-    return psycopg2.connect(os.environ['DATABASE_URL'])
+    """Get a pooled database connection (reused across warm invocations)."""
+    return pg_pool.acquire()
 
 
 def get_schema() -> str:
@@ -63,10 +60,97 @@ def get_schema() -> str:
     return f"{schema}." if schema else ""
 
 
+# =============================================================================
+# PAYMENT EVENTS
+# =============================================================================
+
+# Order status each notification moves an order to; other events change nothing
+EVENT_ORDER_STATUS = {
+    'payment.succeeded': 'paid',
+    'payment.canceled': 'canceled'
+}
+PAYMENT_ORDER_STATUS = {
+    'succeeded': 'paid',
+    'canceled': 'canceled'
+}
+
+
+def find_order(cur, S: str, payment_id: str, event_type: str, metadata: dict) -> tuple | None:
+    """(order id, status, already processed) for a notification, in one indexed lookup.
+
+    Falls back to metadata.order_id for orders whose payment id was never stored.
+    """
+    processed = f"""
+        EXISTS (SELECT 1 FROM {S}payment_events WHERE payment_id = %s AND event_type = %s)
+    """
+    cur.execute(f"""
+        SELECT id, status, {processed} FROM {S}orders
+        WHERE yookassa_payment_id = %s
+    """, (payment_id, event_type, payment_id))
+    row = cur.fetchone()
+
+    order_id_meta = metadata.get('order_id')
+    if not row and str(order_id_meta or '').isdigit():
+        cur.execute(f"""
+            SELECT id, status, {processed} FROM {S}orders WHERE id = %s
+        """, (payment_id, event_type, int(order_id_meta)))
+        row = cur.fetchone()
+    return row
+
+
+def needs_transition(current_status: str, event_type: str, processed: bool) -> bool:
+    """Whether a notification can still change the order; otherwise it is acknowledged as is."""
+    target = EVENT_ORDER_STATUS.get(event_type)
+    return not processed and target is not None and current_status not in ('paid', target)
+
+
+def apply_payment_status(cur, S: str, order_id: int, payment_id: str, event_type: str,
+                         payment_status: str) -> bool:
+    """Move the order to the verified status and record the event as processed.
+
+    The status guards make concurrent deliveries of the same event update the order
+    once. An order for a product is queued in order_fulfillments when it becomes paid.
+    Returns whether the event was recorded, i.e. the payment reached the announced state.
+    """
+    now = datetime.utcnow().isoformat()
+    order_status = PAYMENT_ORDER_STATUS.get(payment_status)
+    if order_status == 'paid':
+        # Orders for a product are queued for fulfill.py in the same statement
+        cur.execute(f"""
+            WITH paid AS (
+                UPDATE {S}orders
+                SET status = 'paid', paid_at = %s, updated_at = %s
+                WHERE id = %s AND status <> 'paid'
+                RETURNING id, product_type
+            )
+            INSERT INTO {S}order_fulfillments (order_id)
+            SELECT id FROM paid WHERE product_type IS NOT NULL
+            ON CONFLICT (order_id) DO NOTHING
+        """, (now, now, order_id))
+    elif order_status == 'canceled':
+        cur.execute(f"""
+            UPDATE {S}orders
+            SET status = 'canceled', updated_at = %s
+            WHERE id = %s AND status NOT IN ('paid', 'canceled')
+        """, (now, order_id))
+
+    # Only record the event once the payment really reached the state it announced;
+    # otherwise the handler answers non-2xx so YooKassa redelivers it and it is verified again
+    if order_status is None or order_status != EVENT_ORDER_STATUS.get(event_type):
+        return False
+    cur.execute(f"""
+        INSERT INTO {S}payment_events (payment_id, event_type, order_id, processed_at)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (payment_id, event_type) DO NOTHING
+    """, (payment_id, event_type, order_id, now))
+    return True
+
+
 # =============================================================================
 # HANDLER
 # =============================================================================
 
+@timed_handler
 def handler(event, context):
     """Handle YooKassa webhook notification."""
     if event.get('httpMethod') != 'POST':
@@ -103,7 +187,42 @@ def handler(event, context):
             'body': json.dumps({'error': 'Missing payment id'})
         }
 
-    # Security: Verify payment via API (most reliable)
+    S = get_schema()
+
+    # Fast path: duplicates and notifications for orders already in a final state
+    # are acknowledged from local state, without calling the YooKassa API
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        row = find_order(cur, S, payment_id, event_type, metadata)
+        cur.close()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        return {
+            'statusCode': 500,
+            'headers': HEADERS,
+            'body': json.dumps({'error': 'Internal error'})
+        }
+    finally:
+        release_connection(conn)
+
+    if not row:
+        return {
+            'statusCode': 404,
+            'headers': HEADERS,
+            'body': json.dumps({'error': 'Order not found'})
+        }
+
+    order_id, current_status, processed = row
+    if not needs_transition(current_status, event_type, processed):
+        return {
+            'statusCode': 200,
+            'headers': HEADERS,
+            'body': json.dumps({'status': 'ok'})
+        }
+
+    # Security: Verify payment via API (most reliable), with no connection held
     shop_id = os.environ.get('YOOKASSA_SHOP_ID', '')
     secret_key = os.environ.get('YOOKASSA_SECRET_KEY', '')
 
@@ -121,58 +240,21 @@ def handler(event, context):
         # Fallback to webhook data (less secure, only if credentials missing)
         payment_status = payment_object.get('status', '')
 
-    S = get_schema()
     conn = get_connection()
-
     try:
         cur = conn.cursor()
-        now = datetime.utcnow().isoformat()
-
-        # Find order by payment_id
-        cur.execute(f"""
-            SELECT id, status FROM {S}orders
-            WHERE yookassa_payment_id = %s
-        """, (payment_id,))
+        recorded = apply_payment_status(cur, S, order_id, payment_id, event_type, payment_status)
+        cur.close()
+        conn.commit()
 
-        row = cur.fetchone()
-
-        if not row:
-            # Try to find by order_id from metadata
-            order_id_meta = metadata.get('order_id')
-            if order_id_meta:
-                cur.execute(f"""
-                    SELECT id, status FROM {S}orders WHERE id = %s
-                """, (int(order_id_meta),))
-                row = cur.fetchone()
-
-        if not row:
+        if not recorded:
+            # YooKassa keeps redelivering a notification until it gets a 200
             return {
-                'statusCode': 404,
+                'statusCode': 409,
                 'headers': HEADERS,
-                'body': json.dumps({'error': 'Order not found'})
+                'body': json.dumps({'error': 'Payment not confirmed yet'})
             }
 
-        order_id, current_status = row
-
-        # Update based on verified payment status
-        if payment_status == 'succeeded':
-            if current_status != 'paid':
-                cur.execute(f"""
-                    UPDATE {S}orders
-                    SET status = 'paid', paid_at = %s, updated_at = %s
-                    WHERE id = %s
-                """, (now, now, order_id))
-                conn.commit()
-
-        elif payment_status == 'canceled':
-            if current_status not in ('paid', 'canceled'):
-                cur.execute(f"""
-                    UPDATE {S}orders
-                    SET status = 'canceled', updated_at = %s
-                    WHERE id = %s
-                """, (now, order_id))
-                conn.commit()
-
         return {
             'statusCode': 200,
             'headers': HEADERS,
@@ -187,4 +269,4 @@ def handler(event, context):
             'body': json.dumps({'error': 'Internal error'})
         }
     finally:
-        conn.close()
+        release_connection(conn)
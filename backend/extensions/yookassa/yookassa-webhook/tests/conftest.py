@@ -0,0 +1,16 @@
+import importlib.util
+import os
+import sys
+
+# Functions deploy their directory as-is, so their modules import siblings by plain
+# name (runtime, a2s, ...). Every function also has an ``index`` module, so this
+# one is loaded under a name of its own, e.g. ``cases_index`` for backend/cases.
+FUNCTION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INDEX_NAME = os.path.basename(FUNCTION_DIR).replace('-', '_') + '_index'
+
+if INDEX_NAME not in sys.modules:
+    sys.path.insert(0, FUNCTION_DIR)
+    spec = importlib.util.spec_from_file_location(INDEX_NAME, os.path.join(FUNCTION_DIR, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[INDEX_NAME] = module
+    spec.loader.exec_module(module)
@@ -0,0 +1,170 @@
+"""fulfill.py and the player sync against a real Postgres with the migrations applied.
+
+    DATABASE_URL=postgresql://... python -m pytest backend/extensions/yookassa/yookassa-webhook/tests
+
+Skipped without DATABASE_URL.
+"""
+import importlib.util
+import os
+import sys
+import uuid
+
+import pytest
+
+if not os.environ.get('DATABASE_URL'):
+    pytest.skip('needs DATABASE_URL with the migrations applied', allow_module_level=True)
+
+psycopg2 = pytest.importorskip('psycopg2')
+
+import yookassa_webhook_index
+
+# fulfill.py imports its function's index by plain name, and other functions' tests
+# put directories with an index.py of their own on sys.path, so bind the name first
+sys.modules.setdefault('index', yookassa_webhook_index)
+
+import fulfill
+
+VIP_30_DAYS = "SELECT id FROM privileges_shop WHERE privilege_level = 'vip' AND duration_days = 30"
+
+
+def server_stats():
+    """backend/server-stats/index.py, loaded the way its own tests load it, for the player sync."""
+    name = 'server_stats_index'
+    if name not in sys.modules:
+        function_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), *[os.pardir] * 4, 'server-stats')
+        sys.path.append(os.path.normpath(function_dir))
+        spec = importlib.util.spec_from_file_location(name, os.path.join(function_dir, 'index.py'))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[name]
+
+
+@pytest.fixture
+def conn():
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    yield conn
+    conn.rollback()
+    conn.close()
+
+
+@pytest.fixture
+def player(conn):
+    """A synced player (MySQL balance 100) and a helper that queues paid orders for them."""
+    steam_id = 'test-' + uuid.uuid4().hex[:12]
+    sync(conn, steam_id, balance=100, checksum='a')
+    with conn.cursor() as cur:
+        cur.execute("SELECT id FROM users WHERE steam_id = %s", (steam_id,))
+        user_id = cur.fetchone()[0]
+    orders = []
+
+    def paid_order(product_type: str, amount: int, product_id: int = None) -> int:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO orders (order_number, user_id, user_email, amount, product_type, product_id, status)
+                VALUES (%s, %s, 'test@steam.local', %s, %s, %s, 'paid')
+                RETURNING id
+            """, ('TEST-' + uuid.uuid4().hex[:12], user_id, amount, product_type, product_id))
+            order_id = cur.fetchone()[0]
+            cur.execute("INSERT INTO order_fulfillments (order_id) VALUES (%s)", (order_id,))
+        conn.commit()
+        orders.append(order_id)
+        return order_id
+
+    yield steam_id, user_id, paid_order
+    conn.rollback()
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM order_fulfillments WHERE order_id = ANY(%s)", (orders,))
+        cur.execute("DELETE FROM orders WHERE id = ANY(%s)", (orders,))
+        cur.execute("DELETE FROM users WHERE id = %s", (user_id,))
+    conn.commit()
+
+
+def sync(conn, steam_id: str, balance: int, checksum: str, privilege: str = 'user'):
+    with conn.cursor() as cur:
+        server_stats().upsert_players(cur, [{
+            'steam_id': steam_id, 'username': 'fulfill-test', 'balance': balance,
+            'privilege': privilege, 'play_time': 0, 'checksum': checksum
+        }])
+    conn.commit()
+
+
+def user_state(conn, user_id: int) -> tuple:
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT balance, web_balance, privilege, privilege_expires_at > LOCALTIMESTAMP + INTERVAL '29 days'
+            FROM users WHERE id = %s
+        """, (user_id,))
+        state = cur.fetchone()
+    conn.commit()
+    return state
+
+
+def statuses(conn, order_ids: list) -> list:
+    with conn.cursor() as cur:
+        cur.execute("SELECT status FROM order_fulfillments WHERE order_id = ANY(%s) ORDER BY order_id", (order_ids,))
+        result = [row[0] for row in cur.fetchall()]
+    conn.commit()
+    return result
+
+
+def test_grants_once_and_survive_the_player_sync(conn, player):
+    steam_id, user_id, paid_order = player
+    with conn.cursor() as cur:
+        cur.execute(VIP_30_DAYS)
+        vip = cur.fetchone()[0]
+    orders = [paid_order('privilege', 500, vip), paid_order('balance', 250)]
+
+    fulfill.drain(conn)
+    assert statuses(conn, orders) == ['done', 'done']
+    assert user_state(conn, user_id) == (350, 250, 'vip', True)
+
+    fulfill.drain(conn)  # already granted: a re-run changes nothing
+    assert user_state(conn, user_id) == (350, 250, 'vip', True)
+
+    sync(conn, steam_id, balance=180, checksum='b')  # the game server changed the balance
+    assert user_state(conn, user_id) == (430, 250, 'vip', True)
+
+    sync(conn, steam_id, balance=180, checksum='b')  # a full run recomputes the same balance
+    assert user_state(conn, user_id) == (430, 250, 'vip', True)
+
+
+def test_workers_skip_orders_claimed_by_another(conn, player):
+    _, user_id, paid_order = player
+    locked, free = paid_order('balance', 10), paid_order('balance', 20)
+
+    other = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        with other.cursor() as cur:
+            cur.execute("SELECT 1 FROM order_fulfillments WHERE order_id = %s FOR UPDATE", (locked,))
+        fulfill.drain(conn)
+        assert statuses(conn, [locked, free]) == ['pending', 'done']
+    finally:
+        other.rollback()
+        other.close()
+
+    fulfill.drain(conn)
+    assert statuses(conn, [locked, free]) == ['done', 'done']
+    assert user_state(conn, user_id)[:2] == (130, 30)
+
+
+def test_expired_privilege_is_reset_and_sync_takes_over(conn, player):
+    steam_id, user_id, _ = player
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE users SET privilege = 'premium', privilege_expires_at = LOCALTIMESTAMP + INTERVAL '1 day'
+            WHERE id = %s
+        """, (user_id,))
+    conn.commit()
+
+    sync(conn, steam_id, balance=100, checksum='b', privilege='vip')
+    assert user_state(conn, user_id)[2] == 'premium'  # still running
+
+    with conn.cursor() as cur:
+        cur.execute("UPDATE users SET privilege_expires_at = LOCALTIMESTAMP - INTERVAL '1 minute' WHERE id = %s", (user_id,))
+    conn.commit()
+    assert fulfill.expire_privileges(conn) >= 1
+    assert user_state(conn, user_id)[2:] == ('user', None)
+
+    sync(conn, steam_id, balance=100, checksum='c', privilege='vip')
+    assert user_state(conn, user_id)[2:] == ('vip', None)
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+import yookassa_webhook_index as index
+
+
+class FakeCursor:
+    def __init__(self, log):
+        self.log = log
+
+    def execute(self, sql, params=None):
+        self.log.append(' '.join(sql.split()))
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.log = []
+        self.committed = False
+
+    def cursor(self):
+        return FakeCursor(self.log)
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = FakeConnection()
+    monkeypatch.setenv('YOOKASSA_SHOP_ID', 'shop')
+    monkeypatch.setenv('YOOKASSA_SECRET_KEY', 'secret')
+    monkeypatch.setattr(index, 'get_connection', lambda: conn)
+    monkeypatch.setattr(index, 'release_connection', lambda c: None)
+    monkeypatch.setattr(index, 'find_order', lambda *args: (7, 'pending', False))
+    return conn
+
+
+def notify(event_type='payment.succeeded'):
+    body = {'event': event_type, 'object': {'id': 'pay-1', 'status': 'succeeded'}}
+    return index.handler({'httpMethod': 'POST', 'body': json.dumps(body)}, None)
+
+
+def test_unconfirmed_payment_is_left_for_redelivery(conn, monkeypatch):
+    monkeypatch.setattr(index, 'verify_payment_via_api', lambda *args: {'status': 'pending'})
+
+    response = notify()
+
+    assert response['statusCode'] == 409
+    assert not any('payment_events' in sql for sql in conn.log)
+
+
+def test_confirmed_payment_is_recorded(conn, monkeypatch):
+    monkeypatch.setattr(index, 'verify_payment_via_api', lambda *args: {'status': 'succeeded'})
+
+    response = notify()
+
+    assert response['statusCode'] == 200
+    assert any(sql.startswith('INSERT INTO public.payment_events') for sql in conn.log)
+    assert conn.committed
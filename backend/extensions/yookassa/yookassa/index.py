@@ -1,15 +1,14 @@
 """YooKassa payment creation handler."""
+from runtime import lazy_import, pg_pool, release_connection, timed_handler  # first: starts the cold-start clock
+
 import json
 import os
 import re
 import uuid
 import base64
 from datetime import datetime
-from urllib.request import Request, urlopen
-from urllib.error import HTTPError
-
-import psycopg2
 
+from http_client import HTTPClient, HTTPError
 
 # =============================================================================
 # VALIDATION
@@ -18,6 +17,7 @@ import psycopg2
 EMAIL_REGEX = re.compile(r'^[^\s@]+@[^\s@]+\.[^\s@]+$')
 MIN_AMOUNT = 1.00  # Minimum 1 RUB
 MAX_AMOUNT = 1_000_000.00  # Maximum 1M RUB
+PRODUCT_TYPES = ('privilege', 'balance')  # What fulfill.py can grant for a paid order
 
 
 def is_valid_email(email: str) -> bool:
@@ -29,11 +29,25 @@ def is_valid_url(url: str) -> bool:
     """Validate URL (must be https)."""
     return url.startswith('https://')
 
+
+def is_valid_id(value) -> bool:
+    """Validate a database id (a positive integer, not a bool)."""
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
 # =============================================================================
 # CONSTANTS
 # =============================================================================
 
 YOOKASSA_API_URL = "https://api.yookassa.ru/v3/payments"
+YOOKASSA_TIMEOUT = float(os.environ.get('YOOKASSA_TIMEOUT', '5'))
+YOOKASSA_RETRIES = int(os.environ.get('YOOKASSA_RETRIES', '1'))
+
+# Kept at module level so warm invocations reuse the TLS connection to YooKassa.
+# Payment creation carries an Idempotence-Key, so it is safe to retry, but the whole
+# budget (two attempts of a few seconds) has to fit in one function invocation. Past
+# it the order is canceled and the buyer gets an error to try again, instead of a
+# platform timeout.
+yookassa_http = HTTPClient(read_timeout=YOOKASSA_TIMEOUT, retries=YOOKASSA_RETRIES)
 
 HEADERS = {
     'Access-Control-Allow-Origin': '*',
@@ -48,8 +62,8 @@ HEADERS = {
 # =============================================================================
 
 def get_connection():
-    """Get database connection."""
-    return psycopg2.connect(os.environ['DATABASE_URL'])
+    """Get a pooled database connection (reused across warm invocations)."""
+    return pg_pool.acquire()
 
 
 def get_schema() -> str:
@@ -58,6 +72,71 @@ def get_schema() -> str:
     return f"{schema}." if schema else ""
 
 
+# =============================================================================
+# ORDERS
+# =============================================================================
+
+def load_privilege(cur, S: str, product_id: int) -> dict | None:
+    """The active privileges_shop row an order is for, as a cart item; None if there is none."""
+    cur.execute(f"""
+        SELECT id, name, price FROM {S}privileges_shop WHERE id = %s AND is_active = true
+    """, (product_id,))
+    row = cur.fetchone()
+    if not row:
+        return None
+    return {'id': str(row[0]), 'name': row[1], 'price': float(row[2]), 'quantity': 1}
+
+
+def create_order(cur, S: str, order_number: str, user_name: str, user_email: str, user_phone: str,
+                 amount: float, cart_items: list, now: str, user_id: int = None,
+                 product_type: str = None, product_id: int = None) -> int:
+    """Insert the order and all its cart items (one multi-row insert); returns the order id.
+
+    ``user_id``, ``product_type`` and ``product_id`` tell fulfill.py what to grant once
+    the order is paid; orders without a product are only recorded.
+    """
+    cur.execute(f"""
+        INSERT INTO {S}orders
+        (order_number, user_id, user_name, user_email, user_phone, amount, product_type, product_id,
+         status, created_at, updated_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 'pending', %s, %s)
+        RETURNING id
+    """, (order_number, user_id, user_name, user_email, user_phone, amount, product_type, product_id, now, now))
+    order_id = cur.fetchone()[0]
+
+    lazy_import('psycopg2.extras').execute_values(cur, f"""
+        INSERT INTO {S}order_items
+        (order_id, product_id, product_name, product_price, quantity, created_at)
+        VALUES %s
+    """, [
+        (order_id, str(item.get('id', '')), item.get('name', ''), item.get('price', 0), item.get('quantity', 1), now)
+        for item in cart_items
+    ])
+    return order_id
+
+
+def update_order(S: str, order_id: int, payment_id: str | None, payment_url: str | None, status: str = None):
+    """Store the YooKassa payment on a pending order in its own short transaction.
+
+    ``status`` is only applied while the order is still pending, so a webhook that
+    got there first is never overwritten.
+    """
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                UPDATE {S}orders
+                SET yookassa_payment_id = COALESCE(%s, yookassa_payment_id),
+                    payment_url = COALESCE(%s, payment_url),
+                    status = CASE WHEN status = 'pending' THEN COALESCE(%s, status) ELSE status END,
+                    updated_at = %s
+                WHERE id = %s
+            """, (payment_id, payment_url, status, datetime.utcnow().isoformat(), order_id))
+        conn.commit()
+    finally:
+        release_connection(conn)
+
+
 # =============================================================================
 # YOOKASSA API
 # =============================================================================
@@ -117,25 +196,22 @@ def create_yookassa_payment(
     if metadata:
         payload["metadata"] = metadata
 
-    request = Request(
+    response = yookassa_http.post(
         YOOKASSA_API_URL,
-        data=json.dumps(payload).encode('utf-8'),
+        body=payload,
         headers={
             'Authorization': f'Basic {auth_bytes}',
-            'Idempotence-Key': idempotence_key,
-            'Content-Type': 'application/json'
-        },
-        method='POST'
+            'Idempotence-Key': idempotence_key
+        }
     )
-
-    with urlopen(request, timeout=30) as response:
-        return json.loads(response.read().decode())
+    return response.json()
 
 
 # =============================================================================
 # HANDLER
 # =============================================================================
 
+@timed_handler
 def handler(event, context):
     """Handle payment creation request."""
     # CORS preflight
@@ -171,6 +247,38 @@ def handler(event, context):
     return_url = data.get('return_url', '').strip()
     description = data.get('description', 'Оплата заказа')
     cart_items = data.get('cart_items', [])
+    user_id = data.get('user_id')
+    product_type = data.get('product_type')
+    product_id = data.get('product_id')
+
+    if user_id is not None and not is_valid_id(user_id):
+        return {
+            'statusCode': 400,
+            'headers': HEADERS,
+            'body': json.dumps({'error': 'user_id must be a positive integer'})
+        }
+
+    if product_type is not None:
+        if product_type not in PRODUCT_TYPES:
+            return {
+                'statusCode': 400,
+                'headers': HEADERS,
+                'body': json.dumps({'error': f'product_type must be one of: {", ".join(PRODUCT_TYPES)}'})
+            }
+        if user_id is None:
+            return {
+                'statusCode': 400,
+                'headers': HEADERS,
+                'body': json.dumps({'error': 'user_id is required to buy a product'})
+            }
+        if product_type == 'privilege' and not is_valid_id(product_id):
+            return {
+                'statusCode': 400,
+                'headers': HEADERS,
+                'body': json.dumps({'error': 'product_id must be a privileges_shop id'})
+            }
+        if product_type == 'balance':
+            product_id = None
 
     if amount < MIN_AMOUNT or amount > MAX_AMOUNT:
         return {
@@ -214,46 +322,46 @@ def handler(event, context):
         }
 
     S = get_schema()
-    conn = get_connection()
+    now = datetime.utcnow().isoformat()
 
+    # Generate order number
+    order_number = f"YK-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:8].upper()}"
+
+    # Phase 1: order and cart in one short transaction, committed before calling out
+    conn = get_connection()
     try:
         cur = conn.cursor()
-        now = datetime.utcnow().isoformat()
-
-        # Generate order number
-        order_number = f"YK-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:8].upper()}"
-
-        # Create order in DB
-        cur.execute(f"""
-            INSERT INTO {S}orders
-            (order_number, user_name, user_email, user_phone, amount, status, created_at, updated_at)
-            VALUES (%s, %s, %s, %s, %s, 'pending', %s, %s)
-            RETURNING id
-        """, (order_number, user_name, user_email, user_phone, amount, now, now))
-
-        order_id = cur.fetchone()[0]
-
-        # Insert cart items
-        for item in cart_items:
-            cur.execute(f"""
-                INSERT INTO {S}order_items
-                (order_id, product_id, product_name, product_price, quantity, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (
-                order_id,
-                str(item.get('id', '')),
-                item.get('name', ''),
-                item.get('price', 0),
-                item.get('quantity', 1),
-                now
-            ))
-
-        # Create YooKassa payment
-        metadata = {
-            "order_id": str(order_id),
-            "order_number": order_number
+        if product_type == 'privilege':
+            # A privilege costs what the shop says, whatever amount the client sent
+            item = load_privilege(cur, S, product_id)
+            if item is None:
+                return {
+                    'statusCode': 404,
+                    'headers': HEADERS,
+                    'body': json.dumps({'error': 'Privilege not found'})
+                }
+            amount, cart_items = item['price'], [item]
+        order_id = create_order(cur, S, order_number, user_name, user_email, user_phone, amount, cart_items, now,
+                                user_id, product_type, product_id)
+        cur.close()
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        return {
+            'statusCode': 500,
+            'headers': HEADERS,
+            'body': json.dumps({'error': str(e)})
         }
+    finally:
+        release_connection(conn)
+
+    # Phase 2: YooKassa call with no connection or transaction held
+    metadata = {
+        "order_id": str(order_id),
+        "order_number": order_number
+    }
 
+    try:
         payment_response = create_yookassa_payment(
             shop_id=shop_id,
             secret_key=secret_key,
@@ -264,44 +372,38 @@ def handler(event, context):
             cart_items=cart_items,
             metadata=metadata
         )
-
-        payment_id = payment_response.get('id')
-        confirmation_url = payment_response.get('confirmation', {}).get('confirmation_url', '')
-
-        # Update order with payment info
-        cur.execute(f"""
-            UPDATE {S}orders
-            SET yookassa_payment_id = %s, payment_url = %s, updated_at = %s
-            WHERE id = %s
-        """, (payment_id, confirmation_url, now, order_id))
-
-        conn.commit()
-
-        return {
-            'statusCode': 200,
-            'headers': HEADERS,
-            'body': json.dumps({
-                'payment_url': confirmation_url,
-                'payment_id': payment_id,
-                'order_id': order_id,
-                'order_number': order_number
-            })
-        }
-
-    except HTTPError as e:
-        conn.rollback()
-        error_body = e.read().decode() if e.fp else str(e)
-        return {
-            'statusCode': 500,
-            'headers': HEADERS,
-            'body': json.dumps({'error': f'YooKassa API error: {error_body}'})
-        }
     except Exception as e:
-        conn.rollback()
+        if isinstance(e, HTTPError):
+            error = f'YooKassa API error: {e.body.decode(errors="replace")}'
+        else:
+            error = str(e)
+        try:
+            update_order(S, order_id, None, None, 'canceled')
+        except Exception as update_error:
+            print(json.dumps({'error': 'order_cancel_failed', 'order_id': order_id, 'detail': str(update_error)}))
         return {
             'statusCode': 500,
             'headers': HEADERS,
-            'body': json.dumps({'error': str(e)})
+            'body': json.dumps({'error': error})
         }
-    finally:
-        conn.close()
+
+    payment_id = payment_response.get('id')
+    confirmation_url = payment_response.get('confirmation', {}).get('confirmation_url', '')
+
+    # Phase 3: short update with the payment info. The payment already exists, so a
+    # failure here must not hide it: the webhook also finds the order by metadata.order_id.
+    try:
+        update_order(S, order_id, payment_id, confirmation_url)
+    except Exception as e:
+        print(json.dumps({'error': 'order_update_failed', 'order_id': order_id, 'detail': str(e)}))
+
+    return {
+        'statusCode': 200,
+        'headers': HEADERS,
+        'body': json.dumps({
+            'payment_url': confirmation_url,
+            'payment_id': payment_id,
+            'order_id': order_id,
+            'order_number': order_number
+        })
+    }
@@ -0,0 +1,346 @@
+"""Shared backend runtime: lazy imports, on-demand pooled connections,
+precomputed response headers, cold-start timing and signed session tokens.
+
+Each cloud function deploys only its own directory, so every function ships
+an identical copy of this module. Change all copies together.
+"""
+import base64
+import functools
+import hashlib
+import hmac
+import importlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+_started = time.perf_counter()
+
+# =============================================================================
+# RESPONSE HEADERS
+# =============================================================================
+
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+
+
+def preflight(methods: str, headers: str = 'Content-Type') -> dict:
+    """CORS preflight response, built once at import and returned for every OPTIONS request."""
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': methods,
+            'Access-Control-Allow-Headers': headers,
+            'Access-Control-Max-Age': '86400'
+        },
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+
+# =============================================================================
+# COLD START TIMING
+# =============================================================================
+
+_timings = {}  # phase -> milliseconds, reported once with the first response
+_cold = True
+
+
+def _record(phase: str, since: float):
+    _timings.setdefault(phase, round((time.perf_counter() - since) * 1000, 2))
+
+
+def timed_handler(handler):
+    """Decorator for a function's handler that reports its cold start.
+
+    ``import`` covers loading the module up to the handler definition, and ``init``
+    covers the whole first invocation. Lazy imports and first connections made
+    along the way are reported as separate phases. The first response gets a
+    Server-Timing header, and the same numbers are logged once.
+    """
+    _record('import', _started)
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        global _cold
+        if not _cold:
+            return handler(event, context)
+        _cold = False
+        started = time.perf_counter()
+        response = handler(event, context)
+        _record('init', started)
+        print(json.dumps({'cold_start': _timings}))
+        if isinstance(response, dict):
+            # A copy: handlers return shared constants such as the preflight response
+            response = {**response, 'headers': {
+                **(response.get('headers') or {}),
+                'Server-Timing': ', '.join(f'{phase};dur={ms}' for phase, ms in _timings.items()),
+                'Timing-Allow-Origin': '*'
+            }}
+        return response
+
+    return wrapper
+
+
+# =============================================================================
+# LAZY IMPORTS
+# =============================================================================
+
+_modules = {}
+
+
+def lazy_import(name: str):
+    """Import a driver or heavy stdlib module on first use, so actions that never need it don't pay for it."""
+    module = _modules.get(name)
+    if module is None:
+        started = time.perf_counter()
+        module = importlib.import_module(name)
+        _modules[name] = module
+        _record('import_' + name.replace('.', '_'), started)
+    return module
+
+
+# =============================================================================
+# DATABASE
+# =============================================================================
+
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '4'))
+POOL_VALIDATE_AFTER = 30.0  # seconds a connection may sit idle before it is pinged
+
+
+class ConnectionPool:
+    """Idle connections kept at module level so warm invocations skip the handshake."""
+
+    def __init__(self, name: str, connect, ping, size: int = POOL_SIZE):
+        self.name = name
+        self._connect = connect
+        self._ping = ping
+        self._size = size
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, released_at = self._idle.pop()
+            if time.monotonic() - released_at < POOL_VALIDATE_AFTER or self._ping(conn):
+                return conn
+            _close_quietly(conn)
+        started = time.perf_counter()
+        conn = self._connect()
+        _record('connect_' + self.name, started)
+        return conn
+
+    def release(self, conn, reusable: bool = True):
+        if reusable:
+            with self._lock:
+                if len(self._idle) < self._size:
+                    self._idle.append((conn, time.monotonic()))
+                    return
+        _close_quietly(conn)
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _pg_connect():
+    return lazy_import('psycopg2').connect(os.environ['DATABASE_URL'], connect_timeout=5)
+
+
+def _pg_ping(conn) -> bool:
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except lazy_import('psycopg2').Error:
+        return False
+
+
+pg_pool = ConnectionPool('pg', _pg_connect, _pg_ping)
+
+
+def release_connection(conn, pool: ConnectionPool = pg_pool):
+    """Return a Postgres connection to the pool, ending any transaction left open."""
+    if not conn.closed:
+        try:
+            conn.rollback()
+        except lazy_import('psycopg2').Error:
+            pass
+    pool.release(conn, reusable=not conn.closed)
+
+
+@contextmanager
+def pg_cursor():
+    """Cursor on a pooled Postgres connection; commits on success, rolls back on error."""
+    conn = pg_pool.acquire()
+    try:
+        with conn.cursor() as cur:
+            yield cur
+        conn.commit()
+    finally:
+        release_connection(conn)
+
+
+class LazyConnection:
+    """Stands in for a pooled Postgres connection and checks one out on first real use.
+
+    Requests that are answered before touching the database (validation errors,
+    404s, cache hits) then never connect. ``cursor()`` returns a LazyCursor, and
+    ``commit()``/``rollback()`` before first use are no-ops.
+    """
+
+    def __init__(self, pool: ConnectionPool = pg_pool):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_conn', None)
+
+    def connection(self):
+        if self._conn is None:
+            object.__setattr__(self, '_conn', self._pool.acquire())
+        return self._conn
+
+    def __getattr__(self, name):
+        return getattr(self.connection(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.connection(), name, value)
+
+    def cursor(self, *args, **kwargs):
+        return LazyCursor(self, args, kwargs)
+
+    def commit(self):
+        if self._conn is not None:
+            self._conn.commit()
+
+    def rollback(self):
+        if self._conn is not None:
+            self._conn.rollback()
+
+    def release(self):
+        if self._conn is not None:
+            release_connection(self._conn, self._pool)
+            object.__setattr__(self, '_conn', None)
+
+
+class LazyCursor:
+    """Cursor of a LazyConnection, opened on first use."""
+
+    def __init__(self, conn: LazyConnection, args: tuple, kwargs: dict):
+        object.__setattr__(self, '_conn', conn)
+        object.__setattr__(self, '_args', args)
+        object.__setattr__(self, '_kwargs', kwargs)
+        object.__setattr__(self, '_cur', None)
+
+    def cursor(self):
+        if self._cur is None:
+            object.__setattr__(self, '_cur', self._conn.connection().cursor(*self._args, **self._kwargs))
+        return self._cur
+
+    def __getattr__(self, name):
+        return getattr(self.cursor(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.cursor(), name, value)
+
+    def __iter__(self):
+        return iter(self.cursor())
+
+    def close(self):
+        if self._cur is not None:
+            self._cur.close()
+
+
+# =============================================================================
+# SESSION TOKENS
+# =============================================================================
+
+SESSION_SECRET = os.environ.get('SESSION_SECRET', '')
+SESSION_FRESH = int(os.environ.get('SESSION_FRESH', '900'))  # seconds the claims are trusted as-is
+SESSION_TTL = int(os.environ.get('SESSION_TTL', str(30 * 86400)))  # hard expiry
+TOKEN_HEADER = 'X-Steam-Token'
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64(hmac.new(SESSION_SECRET.encode(), payload.encode(), hashlib.sha256).digest())
+
+
+def issue_token(user_id: int, steam_id: str, privilege: str) -> str | None:
+    """Compact signed session token: base64url(claims).base64url(HMAC-SHA256). None without SESSION_SECRET."""
+    if not SESSION_SECRET:
+        return None
+    now = int(time.time())
+    claims = {'uid': user_id, 'sid': steam_id, 'prv': privilege, 'iat': now, 'exp': now + SESSION_TTL}
+    payload = _b64(json.dumps(claims, separators=(',', ':')).encode())
+    return f'{payload}.{_sign(payload)}'
+
+
+def read_token(token: str | None) -> dict | None:
+    """Claims of a correctly signed, unexpired token, with ``stale`` set once SESSION_FRESH has passed."""
+    if not token or not SESSION_SECRET or token.count('.') != 1:
+        return None
+    payload, signature = token.split('.')
+    # Bytes: compare_digest rejects str arguments with non-ASCII characters
+    if not hmac.compare_digest(signature.encode(), _sign(payload).encode()):
+        return None
+    try:
+        claims = json.loads(_unb64(payload))
+    except ValueError:
+        return None
+    now = time.time()
+    if claims.get('exp', 0) <= now:
+        return None
+    claims['stale'] = now - claims.get('iat', 0) > SESSION_FRESH
+    return claims
+
+
+def request_token(event: dict) -> str | None:
+    headers = event.get('headers') or {}
+    for key, value in headers.items():
+        if key.lower() == TOKEN_HEADER.lower():
+            return value
+    return None
+
+
+def authenticate(event: dict) -> tuple:
+    """(claims, reissued token) for the request's X-Steam-Token, or (None, None).
+
+    A fresh token is trusted without touching the database. A stale one is checked
+    against users once: the claims are reloaded (privilege may have changed) and a
+    new token is issued for the response.
+    """
+    claims = read_token(request_token(event))
+    if claims is None or not claims['stale']:
+        return claims, None
+    with pg_cursor() as cur:
+        cur.execute("SELECT id, steam_id, privilege FROM users WHERE id = %s", (claims['uid'],))
+        row = cur.fetchone()
+    if row is None or row[0] != claims['uid'] or row[1] != claims['sid']:
+        return None, None
+    token = issue_token(*row)
+    return read_token(token), token
+
+
+def with_token(response: dict, token: str | None) -> dict:
+    """Attach a (re)issued session token to a response."""
+    if token:
+        response['headers'] = {
+            **(response.get('headers') or {}),
+            TOKEN_HEADER: token,
+            'Access-Control-Expose-Headers': TOKEN_HEADER
+        }
+    return response
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+import yookassa_index as index
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, sql, params=None):
+        self.row = self.rows.get(params[0]) if 'privileges_shop' in sql else None
+
+    def fetchone(self):
+        return self.row
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self):
+        return FakeCursor(self.rows)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def orders(monkeypatch):
+    created = []
+
+    def create_order(cur, S, order_number, user_name, user_email, user_phone, amount, cart_items, now,
+                     user_id=None, product_type=None, product_id=None):
+        created.append({'amount': amount, 'cart_items': cart_items, 'user_id': user_id,
+                        'product_type': product_type, 'product_id': product_id})
+        return len(created)
+
+    shop = {1: (1, 'VIP на 30 дней', 500)}
+    monkeypatch.setenv('YOOKASSA_SHOP_ID', 'shop')
+    monkeypatch.setenv('YOOKASSA_SECRET_KEY', 'secret')
+    monkeypatch.setattr(index, 'get_connection', lambda: FakeConnection(shop))
+    monkeypatch.setattr(index, 'release_connection', lambda conn: None)
+    monkeypatch.setattr(index, 'create_order', create_order)
+    monkeypatch.setattr(index, 'update_order', lambda *args: None)
+    monkeypatch.setattr(index, 'create_yookassa_payment',
+                        lambda **kwargs: {'id': 'pay-1', 'confirmation': {'confirmation_url': 'https://pay'}})
+    return created
+
+
+def pay(**fields):
+    body = {'amount': 1, 'user_email': 'player@steam.local', 'return_url': 'https://site/profile', **fields}
+    return index.handler({'httpMethod': 'POST', 'body': json.dumps(body)}, None)
+
+
+def test_privilege_order_is_priced_from_the_shop_and_keeps_the_product(orders):
+    response = pay(user_id=10, product_type='privilege', product_id=1)
+
+    assert response['statusCode'] == 200
+    assert orders == [{
+        'amount': 500.0,
+        'cart_items': [{'id': '1', 'name': 'VIP на 30 дней', 'price': 500.0, 'quantity': 1}],
+        'user_id': 10, 'product_type': 'privilege', 'product_id': 1
+    }]
+
+
+def test_unknown_privilege_is_not_found(orders):
+    assert pay(user_id=10, product_type='privilege', product_id=2)['statusCode'] == 404
+    assert orders == []
+
+
+@pytest.mark.parametrize('fields', [
+    {'user_id': 10, 'product_type': 'gold'},
+    {'user_id': 10, 'product_type': 'privilege'},
+    {'user_id': '10', 'product_type': 'balance'},
+    {'product_type': 'balance'},
+])
+def test_invalid_product_is_rejected(orders, fields):
+    assert pay(**fields)['statusCode'] == 400
+    assert orders == []
@@ -0,0 +1,269 @@
+"""Minimal A2S client (Source/GoldSrc server query protocol over UDP).
+
+Implements A2S_INFO, A2S_PLAYER and A2S_RULES including the challenge
+handshake and split (multi-packet) responses, which is all the dashboard
+needs to read live stats straight from a CS 1.6 server.
+"""
+import socket
+import struct
+
+# =============================================================================
+# PROTOCOL CONSTANTS
+# =============================================================================
+
+SIMPLE_HEADER = b'\xff\xff\xff\xff'
+SPLIT_HEADER = b'\xfe\xff\xff\xff'
+NO_CHALLENGE = b'\xff\xff\xff\xff'
+
+A2S_INFO = b'TSource Engine Query\x00'
+A2S_PLAYER = b'U'
+A2S_RULES = b'V'
+
+S2C_CHALLENGE = 0x41      # 'A'
+S2A_INFO_SOURCE = 0x49    # 'I'
+S2A_INFO_GOLDSRC = 0x6D   # 'm', obsolete GoldSrc reply still sent by some HLDS builds
+S2A_PLAYER = 0x44         # 'D'
+S2A_RULES = 0x45          # 'E'
+
+DEFAULT_PORT = 27015
+MAX_PACKET_SIZE = 1400
+MAX_CHALLENGES = 3
+
+
+class A2SError(Exception):
+    """The server did not answer or answered with something we cannot parse."""
+
+
+# =============================================================================
+# PACKET READER
+# =============================================================================
+
+class _Reader:
+    def __init__(self, data: bytes, pos: int = 0):
+        self.data = data
+        self.pos = pos
+
+    def _unpack(self, fmt: str):
+        size = struct.calcsize(fmt)
+        if self.pos + size > len(self.data):
+            raise A2SError('Truncated A2S packet')
+        value = struct.unpack_from(fmt, self.data, self.pos)[0]
+        self.pos += size
+        return value
+
+    def byte(self) -> int:
+        return self._unpack('<B')
+
+    def short(self) -> int:
+        return self._unpack('<h')
+
+    def long(self) -> int:
+        return self._unpack('<l')
+
+    def float(self) -> float:
+        return self._unpack('<f')
+
+    def char(self) -> str:
+        return chr(self.byte())
+
+    def string(self) -> str:
+        end = self.data.find(b'\x00', self.pos)
+        if end == -1:
+            raise A2SError('Unterminated string in A2S packet')
+        value = self.data[self.pos:end].decode('utf-8', errors='replace')
+        self.pos = end + 1
+        return value
+
+    def remaining(self) -> int:
+        return len(self.data) - self.pos
+
+
+# =============================================================================
+# CLIENT
+# =============================================================================
+
+class A2SClient:
+    """Queries one game server; use as a context manager to share a socket between queries.
+
+    ``goldsrc`` selects the split-packet layout: GoldSrc (CS 1.6) servers use a
+    one-byte packet index, Source servers a longer header.
+    """
+
+    def __init__(self, host: str, port: int = DEFAULT_PORT, timeout: float = 1.0,
+                 retries: int = 2, goldsrc: bool = True):
+        self.address = (host, port)
+        self.timeout = timeout
+        self.retries = retries
+        self.goldsrc = goldsrc
+        self._sock = None
+
+    def __enter__(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.settimeout(self.timeout)
+        self._sock.connect(self.address)
+        return self
+
+    def __exit__(self, *exc):
+        self._sock.close()
+        self._sock = None
+
+    # -------------------------------------------------------------------------
+    # Queries
+    # -------------------------------------------------------------------------
+
+    def info(self) -> dict:
+        """A2S_INFO: server name, map, player counts."""
+        data = self._query(
+            lambda challenge: A2S_INFO + (challenge if challenge != NO_CHALLENGE else b''),
+            (S2A_INFO_SOURCE, S2A_INFO_GOLDSRC)
+        )
+        if data[0] == S2A_INFO_GOLDSRC:
+            return _parse_info_goldsrc(_Reader(data, 1))
+        return _parse_info_source(_Reader(data, 1))
+
+    def players(self) -> list:
+        """A2S_PLAYER: connected players with score and connection time in seconds."""
+        reader = _Reader(self._query(lambda challenge: A2S_PLAYER + challenge, (S2A_PLAYER,)), 1)
+        count = reader.byte()
+        players = []
+        for _ in range(count):
+            if reader.remaining() < 1:
+                break
+            reader.byte()  # index, always 0 on most servers
+            players.append({
+                'name': reader.string(),
+                'score': reader.long(),
+                'duration': round(reader.float(), 1)
+            })
+        return players
+
+    def rules(self) -> dict:
+        """A2S_RULES: public server cvars as a name -> value mapping."""
+        reader = _Reader(self._query(lambda challenge: A2S_RULES + challenge, (S2A_RULES,)), 1)
+        count = reader.short()
+        rules = {}
+        for _ in range(count):
+            if reader.remaining() < 2:
+                break
+            name = reader.string()
+            rules[name] = reader.string()
+        return rules
+
+    # -------------------------------------------------------------------------
+    # Transport
+    # -------------------------------------------------------------------------
+
+    def _query(self, build, expected: tuple) -> bytes:
+        if self._sock is None:
+            with self:
+                return self._query(build, expected)
+
+        for _ in range(self.retries + 1):
+            challenge = NO_CHALLENGE
+            try:
+                for _ in range(MAX_CHALLENGES):
+                    self._sock.send(SIMPLE_HEADER + build(challenge))
+                    data = self._receive()
+                    if data and data[0] == S2C_CHALLENGE and len(data) >= 5:
+                        challenge = data[1:5]
+                        continue
+                    if not data or data[0] not in expected:
+                        raise A2SError(f'Unexpected A2S response type {data[:1]!r}')
+                    return data
+                raise A2SError('Server kept answering with challenges')
+            except socket.timeout:
+                continue
+        raise A2SError(f'No A2S response from {self.address[0]}:{self.address[1]}')
+
+    def _receive(self) -> bytes:
+        packet = self._sock.recv(MAX_PACKET_SIZE)
+        if packet.startswith(SIMPLE_HEADER):
+            return packet[4:]
+        if not packet.startswith(SPLIT_HEADER):
+            raise A2SError('Malformed A2S packet header')
+
+        parts = {}
+        total = None
+        request_id = None
+        while True:
+            reader = _Reader(packet, 4)
+            packet_id = reader.long()
+            if packet_id & 0x80000000:
+                raise A2SError('Compressed split responses are not supported')
+            if self.goldsrc:
+                number_byte = reader.byte()
+                total, number = number_byte & 0x0F, number_byte >> 4
+            else:
+                total, number = reader.byte(), reader.byte()
+                reader.short()  # max packet size
+            if request_id is None:
+                request_id = packet_id
+            if packet_id == request_id:
+                parts[number] = packet[reader.pos:]
+            if len(parts) >= total:
+                break
+            packet = self._sock.recv(MAX_PACKET_SIZE)
+            if not packet.startswith(SPLIT_HEADER):
+                raise A2SError('Expected a split A2S packet')
+
+        payload = b''.join(parts[i] for i in range(total) if i in parts)
+        if len(parts) < total or not payload.startswith(SIMPLE_HEADER):
+            raise A2SError('Incomplete split A2S response')
+        return payload[4:]
+
+
+# =============================================================================
+# PARSERS
+# =============================================================================
+
+def _parse_info_source(reader: _Reader) -> dict:
+    info = {'protocol': reader.byte()}
+    info['name'] = reader.string()
+    info['map'] = reader.string()
+    info['folder'] = reader.string()
+    info['game'] = reader.string()
+    info['app_id'] = reader.short() & 0xFFFF
+    info['players'] = reader.byte()
+    info['max_players'] = reader.byte()
+    info['bots'] = reader.byte()
+    info['server_type'] = reader.char()
+    info['environment'] = reader.char()
+    info['password'] = bool(reader.byte())
+    info['vac'] = bool(reader.byte())
+    info['version'] = reader.string() if reader.remaining() else ''
+    return info
+
+
+def _parse_info_goldsrc(reader: _Reader) -> dict:
+    info = {'address': reader.string()}
+    info['name'] = reader.string()
+    info['map'] = reader.string()
+    info['folder'] = reader.string()
+    info['game'] = reader.string()
+    info['players'] = reader.byte()
+    info['max_players'] = reader.byte()
+    info['protocol'] = reader.byte()
+    info['server_type'] = reader.char()
+    info['environment'] = reader.char()
+    info['password'] = bool(reader.byte())
+    if reader.byte():  # mod info block
+        reader.string()  # link
+        reader.string()  # download link
+        reader.byte()
+        reader.long()  # version
+        reader.long()  # size
+        reader.byte()  # type
+        reader.byte()  # dll
+    info['vac'] = bool(reader.byte())
+    info['bots'] = reader.byte()
+    info['app_id'] = 10
+    info['version'] = ''
+    return info
+
+
+def parse_address(address: str) -> tuple:
+    """Split ``host[:port]`` into (host, port)."""
+    host, _, port = address.strip().rpartition(':')
+    if not host:
+        return address.strip(), DEFAULT_PORT
+    return host, int(port)
@@ -1,256 +1,1231 @@
+from runtime import (  # first: starts the cold-start clock
+    JSON_HEADERS, ConnectionPool, lazy_import, pg_cursor, preflight, timed_handler
+)
+
+import hashlib
 import json
 import os
-import pymysql
-import psycopg2
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from a2s import A2SClient, A2SError, parse_address
+
+# =============================================================================
+# DATABASE
+# =============================================================================
+
+def _mysql_connect():
+    return lazy_import('pymysql').connect(
+        host=os.environ.get('MYSQL_HOST', ''),
+        user=os.environ.get('MYSQL_USER', ''),
+        password=os.environ.get('MYSQL_PASSWORD', ''),
+        database=os.environ.get('MYSQL_DATABASE', ''),
+        charset='utf8mb4',
+        connect_timeout=3,
+        autocommit=True
+    )
+
+
+def _mysql_ping(conn) -> bool:
+    try:
+        conn.ping(reconnect=False)
+        return True
+    except lazy_import('pymysql').Error:
+        return False
+
+
+mysql_pool = ConnectionPool('mysql', _mysql_connect, _mysql_ping)
+
+
+@contextmanager
+def mysql_cursor():
+    """DictCursor on a pooled game-server MySQL connection (autocommit, read-only use)."""
+    conn = mysql_pool.acquire()
+    try:
+        with conn.cursor(lazy_import('pymysql.cursors').DictCursor) as cur:
+            yield cur
+    finally:
+        mysql_pool.release(conn, reusable=conn.open)
+
+
+# =============================================================================
+# STATS SNAPSHOT
+# =============================================================================
+
+STATS_CACHE_TTL = float(os.environ.get('STATS_CACHE_TTL', '5'))
+SCHEMA_CACHE_TTL = float(os.environ.get('SCHEMA_CACHE_TTL', '300'))
+
+_schema_cache = {'tables': None, 'expires_at': 0.0}
+_mysql_stats_cache = {'key': None, 'value': None, 'expires_at': 0.0}
+
+
+def get_tables(mysql_cur, refresh: bool = False) -> list:
+    """Table names of the game database; the SHOW TABLES probe is cached for SCHEMA_CACHE_TTL."""
+    now = time.monotonic()
+    if refresh or _schema_cache['tables'] is None or now >= _schema_cache['expires_at']:
+        mysql_cur.execute("SHOW TABLES")
+        _schema_cache['tables'] = [list(t.values())[0] for t in mysql_cur.fetchall()]
+        _schema_cache['expires_at'] = now + SCHEMA_CACHE_TTL
+    return _schema_cache['tables']
+
+
+class SnapshotCache:
+    """Stale-while-revalidate cache: one caller refreshes an expired value, the rest get the old one.
+
+    ``version`` is a short hash of ``fingerprint(value)`` (by default the value as sorted
+    JSON), so it is the same in every warm container that sees the same state and a
+    client can carry it between requests that land on different instances. A refresh
+    that changes it wakes callers blocked in wait_for_change(); the last few versions
+    are kept so a client can be sent only what changed since the version it already has.
+    """
+
+    def __init__(self, loader, ttl: float, fingerprint=None, history: int = 32):
+        self._loader = loader
+        self._ttl = ttl
+        self._fingerprint = fingerprint or (lambda value: json.dumps(value, sort_keys=True, default=str))
+        self._value = None
+        self._loaded_at = 0.0
+        self._version = ''
+        self._history = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._refresh_lock = threading.Lock()
+
+    def _fresh(self, max_age: float) -> bool:
+        return self._value is not None and time.monotonic() - self._loaded_at < max_age
+
+    def snapshot(self, max_age: float | None = None) -> tuple:
+        """(version, value), refreshing first if the value is older than ``max_age`` (default: the TTL)."""
+        max_age = self._ttl if max_age is None else max_age
+        with self._lock:
+            current, fresh = (self._version, self._value), self._fresh(max_age)
+        if fresh:
+            return current
+        # Only the very first load makes callers wait; afterwards a refresh in flight means "serve stale".
+        if not self._refresh_lock.acquire(blocking=current[1] is None):
+            return current
+        try:
+            with self._lock:
+                if self._fresh(max_age):
+                    return self._version, self._value
+            value = self._loader()
+            with self._lock:
+                version = hashlib.sha1(self._fingerprint(value).encode()).hexdigest()[:12]
+                if version != self._version:
+                    self._version = version
+                    self._history.append((version, value))
+                    self._changed.notify_all()
+                self._value = value
+                self._loaded_at = time.monotonic()
+                return self._version, value
+        finally:
+            self._refresh_lock.release()
+
+    def get(self):
+        return self.snapshot()[1]
+
+    def wait_for_change(self, since: str, timeout: float) -> bool:
+        """Block until the version differs from ``since``; False on timeout."""
+        with self._changed:
+            return self._changed.wait_for(lambda: self._version != since, timeout)
+
+    def value_at(self, version: str):
+        """Value as of ``version`` if it is still in the history window, else None."""
+        with self._lock:
+            for known_version, value in self._history:
+                if known_version == version:
+                    return value
+        return None
+
+
+A2S_TIMEOUT = float(os.environ.get('A2S_TIMEOUT', '1.0'))
+A2S_RETRIES = int(os.environ.get('A2S_RETRIES', '2'))
+
+
+def query_game_server(address: str) -> dict | None:
+    """Live map, slots and player list straight from the game server via A2S; None if it does not answer."""
+    try:
+        host, port = parse_address(address)
+        with A2SClient(host, port, timeout=A2S_TIMEOUT, retries=A2S_RETRIES) as client:
+            info = client.info()
+            players = client.players()
+            try:
+                rules = client.rules()
+            except A2SError:
+                rules = {}
+    except (A2SError, OSError, ValueError):
+        return None
+    
+    return {
+        'server_name': info['name'],
+        'current_map': info['map'],
+        'players_online': info['players'],
+        'max_players': info['max_players'],
+        'bots': info['bots'],
+        'players': players,
+        'next_map': rules.get('amx_nextmap'),
+        'time_left': rules.get('amx_timeleft')
+    }
+
+
+def read_mysql_stats(live: dict | None) -> dict:
+    """Stats the game's MySQL plugin tables provide; only the team score when A2S already answered."""
+    try:
+        with mysql_cursor() as mysql_cur:
+            tables = get_tables(mysql_cur)
+            
+            players_online = 0
+            current_map = 'de_dust2'
+            ct_score = 0
+            t_score = 0
+            
+            if live is None and 'players' in tables:
+                try:
+                    mysql_cur.execute("SELECT COUNT(*) as total FROM players WHERE online = 1")
+                    result = mysql_cur.fetchone()
+                    players_online = result['total'] if result else 0
+                except:
+                    pass
+            
+            if 'server_info' in tables:
+                try:
+                    mysql_cur.execute("SELECT map_name, ct_score, t_score FROM server_info ORDER BY id DESC LIMIT 1")
+                    result = mysql_cur.fetchone()
+                    if result:
+                        current_map = result.get('map_name', current_map)
+                        ct_score = result.get('ct_score', ct_score)
+                        t_score = result.get('t_score', t_score)
+                except:
+                    pass
+        
+        return {
+            'players_online': players_online,
+            'current_map': current_map,
+            'ct_score': ct_score,
+            't_score': t_score,
+            'mysql_connected': True,
+            'available_tables': tables
+        }
+    
+    except Exception as mysql_err:
+        _schema_cache['tables'] = None
+        return {
+            'players_online': 0,
+            'current_map': 'de_dust2',
+            'ct_score': 0,
+            't_score': 0,
+            'mysql_connected': False,
+            'error': str(mysql_err)
+        }
+
+
+def cached_mysql_stats(live: dict | None) -> dict:
+    """read_mysql_stats, reused for STATS_CACHE_TTL.
+
+    Long-polling requests refresh the snapshot every STATS_WAIT_POLL seconds. Those fast
+    refreshes re-read A2S only; MySQL is read at most once per TTL, as it was before.
+    """
+    key = live is None
+    now = time.monotonic()
+    if _mysql_stats_cache['key'] != key or now >= _mysql_stats_cache['expires_at']:
+        _mysql_stats_cache.update(key=key, value=read_mysql_stats(live), expires_at=now + STATS_CACHE_TTL)
+    return _mysql_stats_cache['value']
+
+
+def load_stats_snapshot() -> dict:
+    """Build a stats snapshot: A2S for live server state, MySQL for team score and as a fallback."""
+    server_ip = os.environ.get('GAME_SERVER_IP', '')
+    live = query_game_server(server_ip) if server_ip else None
+    
+    snapshot = {'max_players': 32, 'server_ip': server_ip or 'N/A'}
+    if os.environ.get('MYSQL_HOST') or live is None:
+        snapshot.update(cached_mysql_stats(live))
+    else:
+        snapshot.update({'ct_score': 0, 't_score': 0, 'mysql_connected': False})
+    
+    if live is not None:
+        snapshot.update(live)
+    snapshot['source'] = 'a2s' if live is not None else 'mysql'
+    return snapshot
+
+
+# =============================================================================
+# STATS HISTORY
+# =============================================================================
+
+RAW_RETENTION = '24 hours'
+MINUTE_RETENTION = os.environ.get('STATS_MINUTE_RETENTION', '30 days')
+PRUNE_INTERVAL = 600.0  # seconds between retention sweeps per container
+
+# range -> (resolution, interval); raw snapshots only for short ranges
+HISTORY_RANGES = {
+    '1h': ('raw', '1 hour'),
+    '6h': ('1m', '6 hours'),
+    '24h': ('1m', '24 hours'),
+    '7d': ('1h', '7 days'),
+    '30d': ('1h', '30 days'),
+}
+
+_last_prune = {'at': 0.0}
+_last_record = {'at': 0.0}
+
+RECORD_SNAPSHOT_SQL = """
+    WITH raw AS (
+        INSERT INTO server_stats (current_map, players_online, max_players, ct_score, t_score, updated_at)
+        VALUES (%(map)s, %(players)s, %(max_players)s, %(ct_score)s, %(t_score)s, LOCALTIMESTAMP)
+    ), minute AS (
+        INSERT INTO server_stats_rollups AS r (resolution, bucket, samples, players_sum, players_min, players_max, current_map)
+        VALUES ('1m', date_trunc('minute', LOCALTIMESTAMP), 1, %(players)s, %(players)s, %(players)s, %(map)s)
+        ON CONFLICT (resolution, bucket) DO UPDATE SET
+            samples = r.samples + 1,
+            players_sum = r.players_sum + EXCLUDED.players_sum,
+            players_min = LEAST(r.players_min, EXCLUDED.players_min),
+            players_max = GREATEST(r.players_max, EXCLUDED.players_max),
+            current_map = EXCLUDED.current_map
+        RETURNING (xmax = 0) AS inserted
+    ), hour AS (
+        INSERT INTO server_stats_rollups AS r (resolution, bucket, samples, players_sum, players_min, players_max, current_map)
+        VALUES ('1h', date_trunc('hour', LOCALTIMESTAMP), 1, %(players)s, %(players)s, %(players)s, %(map)s)
+        ON CONFLICT (resolution, bucket) DO UPDATE SET
+            samples = r.samples + 1,
+            players_sum = r.players_sum + EXCLUDED.players_sum,
+            players_min = LEAST(r.players_min, EXCLUDED.players_min),
+            players_max = GREATEST(r.players_max, EXCLUDED.players_max),
+            current_map = EXCLUDED.current_map
+    )
+    INSERT INTO server_map_time AS m (bucket, map_name, minutes)
+    SELECT date_trunc('hour', LOCALTIMESTAMP), %(map)s, 1 FROM minute WHERE inserted
+    ON CONFLICT (bucket, map_name) DO UPDATE SET minutes = m.minutes + 1
+"""
+
+
+def record_snapshot(snapshot: dict):
+    """Append a snapshot to the raw series and fold it into the 1m/1h rollups in one round trip.
+
+    A minute is credited to a map once, by whichever snapshot opens that minute's bucket,
+    so several warm containers recording the same server do not double count map time.
+    """
+    if snapshot.get('source') != 'a2s' and not snapshot.get('mysql_connected'):
+        return
+    
+    with pg_cursor() as pg_cur:
+        pg_cur.execute(RECORD_SNAPSHOT_SQL, {
+            'map': snapshot['current_map'],
+            'players': snapshot['players_online'],
+            'max_players': snapshot['max_players'],
+            'ct_score': snapshot['ct_score'],
+            't_score': snapshot['t_score']
+        })
+        
+        if time.monotonic() - _last_prune['at'] >= PRUNE_INTERVAL:
+            _last_prune['at'] = time.monotonic()
+            pg_cur.execute("DELETE FROM server_stats WHERE updated_at < LOCALTIMESTAMP - %s::interval", (RAW_RETENTION,))
+            pg_cur.execute(
+                "DELETE FROM server_stats_rollups WHERE resolution = '1m' AND bucket < LOCALTIMESTAMP - %s::interval",
+                (MINUTE_RETENTION,)
+            )
+
+
+def refresh_stats() -> dict:
+    """Snapshot loader for the cache: read live stats and record them into the time series.
+
+    Long-poll refreshes run every STATS_WAIT_POLL seconds, but a snapshot is recorded at
+    most once per STATS_CACHE_TTL, so waiting clients do not multiply history writes.
+    """
+    snapshot = load_stats_snapshot()
+    if time.monotonic() - _last_record['at'] >= STATS_CACHE_TTL:
+        _last_record['at'] = time.monotonic()
+        try:
+            record_snapshot(snapshot)
+        except Exception:
+            pass  # history is best effort; never fail live stats because of it
+    return snapshot
+
+
+def read_history(range_key: str) -> dict:
+    """Players-online series and per-map time for a range, read from the matching resolution."""
+    resolution, interval = HISTORY_RANGES[range_key]
+    
+    with pg_cursor() as pg_cur:
+        if resolution == 'raw':
+            pg_cur.execute("""
+                SELECT updated_at, players_online, players_online, players_online, current_map
+                FROM server_stats
+                WHERE updated_at >= LOCALTIMESTAMP - %s::interval
+                ORDER BY updated_at
+            """, (interval,))
+        else:
+            pg_cur.execute("""
+                SELECT bucket, players_sum::float / GREATEST(samples, 1), players_min, players_max, current_map
+                FROM server_stats_rollups
+                WHERE resolution = %s AND bucket >= date_trunc('minute', LOCALTIMESTAMP - %s::interval)
+                ORDER BY bucket
+            """, (resolution, interval))
+        rows = pg_cur.fetchall()
+        
+        pg_cur.execute("""
+            SELECT map_name, SUM(minutes) AS minutes
+            FROM server_map_time
+            WHERE bucket >= date_trunc('hour', LOCALTIMESTAMP - %s::interval)
+            GROUP BY map_name
+            ORDER BY minutes DESC
+        """, (interval,))
+        maps = pg_cur.fetchall()
+    
+    return {
+        'range': range_key,
+        'resolution': resolution,
+        'points': [
+            {
+                'time': row[0].isoformat(),
+                'players_avg': round(float(row[1]), 2),
+                'players_min': row[2],
+                'players_max': row[3],
+                'map': row[4]
+            }
+            for row in rows
+        ],
+        'maps': [{'map': row[0], 'minutes': int(row[1])} for row in maps]
+    }
+
+
+# Snapshot fields whose change is worth waking a long-polling client for
+STATS_VERSION_FIELDS = (
+    'server_name', 'current_map', 'next_map', 'players_online', 'max_players', 'bots',
+    'ct_score', 't_score', 'source'
+)
+
+
+def time_left_minutes(time_left) -> str | None:
+    """amx_timeleft ("MM:SS" or seconds) cut to whole minutes."""
+    text = str(time_left or '')
+    if ':' in text:
+        return text.rsplit(':', 1)[0]
+    return str(int(text) // 60) if text.isdigit() else None
+
+
+def stats_fingerprint(snapshot: dict) -> str:
+    """What counts as a change for long-polling clients: map, players, score.
+
+    Fields that tick on every poll are left out (connection times, the seconds of
+    time_left) or ignored (MySQL diagnostics), so the version stays put between real
+    changes and waiters are not woken every STATS_WAIT_POLL.
+    """
+    state = {field: snapshot.get(field) for field in STATS_VERSION_FIELDS}
+    state['players'] = [(player['name'], player['score']) for player in snapshot.get('players', [])]
+    state['time_left'] = time_left_minutes(snapshot.get('time_left'))
+    return json.dumps(state, sort_keys=True, default=str)
+
+
+stats_cache = SnapshotCache(refresh_stats, STATS_CACHE_TTL, fingerprint=stats_fingerprint)
+
+
+# =============================================================================
+# MULTI-SERVER
+# =============================================================================
+
+STATS_ALL_TIMEOUT = float(os.environ.get('STATS_ALL_TIMEOUT', '3'))
+
+STATS_ALL_WORKERS = int(os.environ.get('STATS_ALL_WORKERS', '8'))
+
+_server_pool = None
+
+
+def server_pool():
+    """Executor for the stats_all fan-out, created on first use so other actions skip the import."""
+    global _server_pool
+    if _server_pool is None:
+        _server_pool = lazy_import('concurrent.futures').ThreadPoolExecutor(max_workers=STATS_ALL_WORKERS)
+    return _server_pool
+
+
+def get_game_servers() -> list:
+    """Configured servers as [{'name', 'address'}].
+
+    GAME_SERVERS is either a JSON list of {"name": ..., "address": "host:port"} objects or
+    a comma-separated list of ``name=host:port`` / ``host:port`` entries. Without it the
+    single GAME_SERVER_IP is used.
+    """
+    raw = os.environ.get('GAME_SERVERS', '').strip()
+    if not raw:
+        address = os.environ.get('GAME_SERVER_IP', '')
+        return [{'name': 'main', 'address': address}] if address else []
+    
+    if raw.startswith('['):
+        return [{'name': server.get('name') or server['address'], 'address': server['address']} for server in json.loads(raw)]
+    
+    servers = []
+    for entry in raw.split(','):
+        name, _, address = entry.strip().rpartition('=')
+        if address:
+            servers.append({'name': name or address, 'address': address})
+    return servers
+
+
+def query_server_entry(server: dict) -> dict:
+    live = query_game_server(server['address'])
+    if live is None:
+        return {'name': server['name'], 'server_ip': server['address'], 'online': False, 'error': 'No A2S response'}
+    return {'name': server['name'], 'server_ip': server['address'], 'online': True, **live}
+
+
+def load_all_stats() -> dict:
+    """Query every configured server concurrently; total latency is that of the slowest one."""
+    servers = get_game_servers()
+    futures = [(server, server_pool().submit(query_server_entry, server)) for server in servers]
+    deadline = time.monotonic() + STATS_ALL_TIMEOUT
+    
+    results = []
+    for server, future in futures:
+        try:
+            results.append(future.result(timeout=max(deadline - time.monotonic(), 0)))
+        except lazy_import('concurrent.futures').TimeoutError:
+            results.append({'name': server['name'], 'server_ip': server['address'], 'online': False, 'error': 'Timed out'})
+        except Exception as e:
+            results.append({'name': server['name'], 'server_ip': server['address'], 'online': False, 'error': str(e)})
+    
+    online = [result for result in results if result['online']]
+    return {
+        'servers': results,
+        'total': {
+            'servers': len(results),
+            'servers_online': len(online),
+            'players_online': sum(result['players_online'] for result in online),
+            'max_players': sum(result['max_players'] for result in online)
+        }
+    }
+
+
+all_stats_cache = SnapshotCache(load_all_stats, STATS_CACHE_TTL)
+
+
+# =============================================================================
+# LONG POLL
+# =============================================================================
+
+STATS_WAIT_TIMEOUT = float(os.environ.get('STATS_WAIT_TIMEOUT', '25'))
+STATS_WAIT_POLL = float(os.environ.get('STATS_WAIT_POLL', '1'))
+
+
+def wait_for_stats(since: str, timeout: float) -> dict:
+    """Hold until the stats snapshot version differs from ``since`` or ``timeout`` elapses.
+
+    Waiting requests re-read the game server every STATS_WAIT_POLL seconds (one of them
+    at a time, the rest sleep on the cache's condition), so a round end shows up within
+    about a second instead of at the next 10-second poll.
+    """
+    deadline = time.monotonic() + timeout
+    version, snapshot = stats_cache.snapshot(max_age=STATS_WAIT_POLL)
+    while version == since:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return {'version': version, 'changed': {}, 'full': False}
+        stats_cache.wait_for_change(since, min(remaining, STATS_WAIT_POLL))
+        version, snapshot = stats_cache.snapshot(max_age=STATS_WAIT_POLL)
+    
+    base = stats_cache.value_at(since) if since else None
+    if base is None:
+        return {'version': version, 'changed': snapshot, 'full': True}
+    changed = {key: value for key, value in snapshot.items() if base.get(key) != value}
+    return {'version': version, 'changed': changed, 'full': False}
+
+
+# =============================================================================
+# PARTITIONED SYNC
+# =============================================================================
+
+SYNC_MAX_PARTITIONS = 64
+SYNC_MAX_WORKERS = 16
+SYNC_TIME_BUDGET = float(os.environ.get('SYNC_TIME_BUDGET', '25'))
+
+
+def plan_sync_run(mysql_cur, pg_cur, source: str, partitions: int, full: bool) -> dict:
+    """Split players into ``partitions`` contiguous steam_id ranges and record them as a new run.
+
+    Boundaries come from the steam_id index (OFFSET probes), so every worker later reads its
+    range with cheap keyset queries instead of scanning the table.
+    """
+    updated_column = detect_updated_column(mysql_cur)
+    mode = 'timestamp' if updated_column else 'checksum'
+    watermark_from = None if full else load_watermark(pg_cur, source, mode)
+    watermark_to = None
+    if updated_column:
+        mysql_cur.execute(f"SELECT MAX(`{updated_column}`) AS latest FROM players")
+        latest = mysql_cur.fetchone()['latest']
+        watermark_to = str(latest) if latest is not None else watermark_from
+    
+    mysql_cur.execute("SELECT COUNT(*) AS total FROM players WHERE steam_id IS NOT NULL AND steam_id != ''")
+    total = mysql_cur.fetchone()['total']
+    
+    boundaries = []
+    for k in range(1, partitions):
+        mysql_cur.execute(
+            "SELECT steam_id FROM players WHERE steam_id IS NOT NULL AND steam_id != '' ORDER BY steam_id LIMIT 1 OFFSET %s",
+            (total * k // partitions,)
+        )
+        row = mysql_cur.fetchone()
+        if row and (not boundaries or row['steam_id'] > boundaries[-1]):
+            boundaries.append(row['steam_id'])
+    ranges = list(zip([None] + boundaries, boundaries + [None]))
+    
+    run = {
+        'run_id': lazy_import('uuid').uuid4().hex,
+        'mode': mode,
+        'updated_column': updated_column,
+        'full': full,
+        'watermark_from': watermark_from,
+        'watermark_to': watermark_to
+    }
+    pg_cur.execute("""
+        INSERT INTO sync_runs (source, run_id, mode, is_full, watermark_from, watermark_to, partitions, started_at, finished_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP, NULL)
+        ON CONFLICT (source) DO UPDATE SET
+            run_id = EXCLUDED.run_id,
+            mode = EXCLUDED.mode,
+            is_full = EXCLUDED.is_full,
+            watermark_from = EXCLUDED.watermark_from,
+            watermark_to = EXCLUDED.watermark_to,
+            partitions = EXCLUDED.partitions,
+            started_at = EXCLUDED.started_at,
+            finished_at = NULL
+    """, (source, run['run_id'], mode, full, watermark_from, watermark_to, len(ranges)))
+    pg_cur.execute("DELETE FROM sync_partitions WHERE source = %s", (source,))
+    lazy_import('psycopg2.extras').execute_values(
+        pg_cur,
+        "INSERT INTO sync_partitions (source, partition_no, run_id, lower_key, upper_key) VALUES %s",
+        [(source, number, run['run_id'], lower, upper) for number, (lower, upper) in enumerate(ranges)]
+    )
+    return run
+
+
+def sync_partition(source: str, run: dict, partition: dict, deadline: float) -> dict:
+    """Copy one steam_id range on its own MySQL and Postgres connections.
+
+    Each chunk is committed together with its checkpoint (last_key), so a worker stopped by
+    the deadline resumes from the last committed key on the next invocation.
+    """
+    updated_column = run['updated_column']
+    cursor_key = partition['last_key']
+    inclusive = False
+    if cursor_key is None:
+        cursor_key = partition['lower_key'] or ''
+        inclusive = partition['lower_key'] is not None
+    
+    scanned_count = 0
+    synced_count = 0
+    done = False
+    with mysql_cursor() as mysql_cur, pg_cursor() as pg_cur:
+        while time.monotonic() < deadline:
+            query = player_select_sql(updated_column) + (" AND steam_id >= %s" if inclusive else " AND steam_id > %s")
+            query_params = [cursor_key]
+            if partition['upper_key'] is not None:
+                query += " AND steam_id < %s"
+                query_params.append(partition['upper_key'])
+            if run['watermark_from'] is not None:
+                query += watermark_filter(updated_column)
+                query_params.append(run['watermark_from'])
+            query += " ORDER BY steam_id LIMIT %s"
+            query_params.append(SYNC_CHUNK_SIZE)
+            
+            mysql_cur.execute(query, query_params)
+            players = mysql_cur.fetchall()
+            
+            synced = sync_chunk(pg_cur, players, run['mode'], run['full']) if players else 0
+            done = len(players) < SYNC_CHUNK_SIZE
+            if players:
+                cursor_key = players[-1]['steam_id']
+                inclusive = False
+            
+            pg_cur.execute("""
+                UPDATE sync_partitions
+                SET last_key = %s, rows_synced = rows_synced + %s, done = %s,
+                    leased_until = CASE WHEN %s THEN NULL ELSE leased_until END,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE source = %s AND partition_no = %s AND run_id = %s
+            """, (None if inclusive else cursor_key, synced, done, done, source, partition['partition_no'], run['run_id']))
+            pg_cur.connection.commit()
+            
+            scanned_count += len(players)
+            synced_count += synced
+            if done:
+                break
+        
+        if not done:
+            pg_cur.execute(
+                "UPDATE sync_partitions SET leased_until = NULL WHERE source = %s AND partition_no = %s AND run_id = %s",
+                (source, partition['partition_no'], run['run_id'])
+            )
+    
+    return {'partition': partition['partition_no'], 'scanned': scanned_count, 'synced': synced_count, 'done': done}
+
 
+def sync_players_partitioned(partitions: int, workers: int, full: bool, time_budget: float) -> dict | None:
+    """Resume the unfinished partitioned run for this source, or plan a new one, and work it in parallel.
+
+    Returns with ``complete: False`` when the time budget ran out; calling again continues
+    from the per-partition checkpoints. The sync watermark only advances once every
+    partition is done.
+    """
+    source = sync_source()
+    started = time.perf_counter()
+    deadline = time.monotonic() + time_budget
+    
+    with mysql_cursor() as mysql_cur, pg_cursor() as pg_cur:
+        if 'players' not in get_tables(mysql_cur, refresh=True):
+            return None
+        
+        # Serializes resume-or-plan per source until this transaction commits: a second
+        # invocation waits here, then resumes the run the first one planned instead of
+        # replacing it.
+        pg_cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", ('sync_runs:' + source,))
+        pg_cur.execute("""
+            SELECT r.run_id, r.mode, r.is_full, r.watermark_from, r.watermark_to
+            FROM sync_runs r
+            WHERE r.source = %s AND r.finished_at IS NULL
+        """, (source,))
+        row = pg_cur.fetchone()
+        if row:
+            run = {
+                'run_id': row[0],
+                'mode': row[1],
+                'updated_column': SYNC_UPDATED_COLUMN if row[1] == 'timestamp' else None,
+                'full': row[2],
+                'watermark_from': row[3],
+                'watermark_to': row[4]
+            }
+            resumed = True
+        else:
+            run = plan_sync_run(mysql_cur, pg_cur, source, partitions, full)
+            resumed = False
+    
+    # Lease pending partitions so a concurrent invocation picks different ones.
+    with pg_cursor() as pg_cur:
+        pg_cur.execute("""
+            UPDATE sync_partitions
+            SET leased_until = LOCALTIMESTAMP + %s * INTERVAL '1 second'
+            WHERE source = %s AND run_id = %s AND NOT done
+              AND (leased_until IS NULL OR leased_until < LOCALTIMESTAMP)
+            RETURNING partition_no, lower_key, upper_key, last_key
+        """, (time_budget + 5, source, run['run_id']))
+        pending = [
+            {'partition_no': row[0], 'lower_key': row[1], 'upper_key': row[2], 'last_key': row[3]}
+            for row in sorted(pg_cur.fetchall())
+        ]
+    
+    results = []
+    if pending:
+        with lazy_import('concurrent.futures').ThreadPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+            results = list(pool.map(lambda partition: sync_partition(source, run, partition, deadline), pending))
+    
+    with pg_cursor() as pg_cur:
+        pg_cur.execute("""
+            SELECT COUNT(*), COUNT(*) FILTER (WHERE done), COALESCE(SUM(rows_synced), 0)
+            FROM sync_partitions
+            WHERE source = %s AND run_id = %s
+        """, (source, run['run_id']))
+        total_partitions, done_partitions, run_rows = pg_cur.fetchone()
+        # No partitions means the run was replaced by a newer one, not that it finished
+        complete = total_partitions > 0 and total_partitions == done_partitions
+        if complete:
+            pg_cur.execute(
+                "UPDATE sync_runs SET finished_at = CURRENT_TIMESTAMP WHERE source = %s AND run_id = %s AND finished_at IS NULL",
+                (source, run['run_id'])
+            )
+            if pg_cur.rowcount:
+                save_sync_state(pg_cur, source, run['mode'], run['watermark_to'], run_rows, run['full'])
+    
+    elapsed = time.perf_counter() - started
+    scanned_count = sum(result['scanned'] for result in results)
+    return {
+        'run_id': run['run_id'],
+        'resumed': resumed,
+        'complete': complete,
+        'partitions': total_partitions,
+        'partitions_done': done_partitions,
+        'synced_players': sum(result['synced'] for result in results),
+        'scanned_players': scanned_count,
+        'run_synced_players': int(run_rows),
+        'mode': run['mode'],
+        'full': run['full'],
+        'elapsed_ms': round(elapsed * 1000, 1),
+        'rows_per_sec': round(scanned_count / elapsed, 1) if elapsed > 0 else None
+    }
+
+
+# =============================================================================
+# CATALOG CACHE
+# =============================================================================
+
+CATALOG_VERSION_TTL = float(os.environ.get('CATALOG_VERSION_TTL', '5'))
+
+_catalogs = {}  # name -> {'version', 'body', 'checked_at'}
+
+
+def catalog_etag(name: str, version: int) -> str:
+    return f'"{name}-{version}"'
+
+
+def catalog_headers(name: str, version: int) -> dict:
+    return {
+        **JSON_HEADERS,
+        'Access-Control-Expose-Headers': 'ETag',
+        'Cache-Control': 'public, no-cache',
+        'ETag': catalog_etag(name, version)
+    }
+
+
+def get_header(event: dict, name: str) -> str | None:
+    headers = event.get('headers') or {}
+    lowered = name.lower()
+    for key, value in headers.items():
+        if key.lower() == lowered:
+            return value
+    return None
+
+
+def fresh_catalog(name: str) -> dict | None:
+    """This container's copy of a catalog if its version was confirmed within CATALOG_VERSION_TTL."""
+    entry = _catalogs.get(name)
+    if entry and time.monotonic() - entry['checked_at'] < CATALOG_VERSION_TTL:
+        return entry
+    return None
+
+
+def get_catalog(cur, name: str, load_items) -> dict:
+    """Serialized catalog for the current version; items are only reloaded when the version moved."""
+    entry = fresh_catalog(name)
+    if entry:
+        return entry
+    
+    cur.execute("SELECT version FROM catalog_versions WHERE name = %s", (name,))
+    row = cur.fetchone()
+    version = row[0] if row else 0
+    
+    entry = _catalogs.get(name)
+    if entry and entry['version'] == version:
+        entry['checked_at'] = time.monotonic()
+        return entry
+    
+    entry = {'version': version, 'body': json.dumps({'items': load_items(cur)}), 'checked_at': time.monotonic()}
+    _catalogs[name] = entry
+    return entry
+
+
+def not_modified(event: dict, name: str, catalog: dict) -> dict | None:
+    """304 response if the client's If-None-Match already names this catalog version."""
+    if_none_match = get_header(event, 'If-None-Match') or ''
+    etag = catalog_etag(name, catalog['version'])
+    if etag not in [tag.strip() for tag in if_none_match.split(',')]:
+        return None
+    return {
+        'statusCode': 304,
+        'headers': catalog_headers(name, catalog['version']),
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+
+def catalog_response(event: dict, name: str, catalog: dict) -> dict:
+    """200 with the cached body, or 304 if the client already holds this version."""
+    cached = not_modified(event, name, catalog)
+    if cached:
+        return cached
+    return {
+        'statusCode': 200,
+        'headers': catalog_headers(name, catalog['version']),
+        'body': catalog['body'],
+        'isBase64Encoded': False
+    }
+
+
+def bump_catalog_version(cur, name: str):
+    """Advance the catalog version in the caller's transaction and drop this container's copy."""
+    cur.execute(
+        "UPDATE catalog_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = %s",
+        (name,)
+    )
+    _catalogs.pop(name, None)
+
+
+def load_shop_items(pg_cur) -> list:
+    pg_cur.execute("SELECT id, name, privilege_level, duration_days, price, description, features, is_active FROM privileges_shop WHERE is_active = true ORDER BY price ASC")
+    items = []
+    for row in pg_cur.fetchall():
+        items.append({
+            'id': row[0],
+            'name': row[1],
+            'privilege_level': row[2],
+            'duration_days': row[3],
+            'price': float(row[4]),
+            'description': row[5],
+            'features': row[6] if row[6] else [],
+            'is_active': row[7]
+        })
+    return items
+
+
+# =============================================================================
+# PLAYER SYNC
+# =============================================================================
+
+SYNC_UPDATED_COLUMN = os.environ.get('SYNC_UPDATED_COLUMN', 'updated_at')
+SYNC_CHUNK_SIZE = int(os.environ.get('SYNC_CHUNK_SIZE', '1000'))
+PLAYER_CHECKSUM_SQL = "MD5(CONCAT_WS('|', steam_id, username, balance, privilege, play_time))"
+
+
+def sync_source() -> str:
+    """Key of the MySQL players table in sync_state."""
+    return f"{os.environ.get('MYSQL_HOST', '')}/{os.environ.get('MYSQL_DATABASE', '')}.players"
+
+
+def get_player_columns(mysql_cur) -> set:
+    mysql_cur.execute("SHOW COLUMNS FROM players")
+    return {row['Field'] for row in mysql_cur.fetchall()}
+
+
+# MySQL is not the only writer of balance and privilege: fulfill.py grants paid
+# orders and cases credits and charges balance. Those web-side changes are summed in
+# users.web_balance, so the balance is recomputed as MySQL's plus that (a full run
+# therefore reconciles every balance), and a purchased privilege is left alone until
+# privilege_expires_at.
+UPSERT_PLAYERS_SQL = """
+    INSERT INTO users (steam_id, username, balance, privilege, play_time, avatar_url, sync_checksum)
+    VALUES %s
+    ON CONFLICT (steam_id) 
+    DO UPDATE SET 
+        username = EXCLUDED.username,
+        balance = EXCLUDED.balance + users.web_balance,
+        privilege = CASE
+            WHEN users.privilege_expires_at > LOCALTIMESTAMP THEN users.privilege
+            ELSE EXCLUDED.privilege
+        END,
+        privilege_expires_at = CASE
+            WHEN users.privilege_expires_at > LOCALTIMESTAMP THEN users.privilege_expires_at
+        END,
+        play_time = EXCLUDED.play_time,
+        sync_checksum = EXCLUDED.sync_checksum
+"""
+
+
+def upsert_players(pg_cur, players: list, known_checksums: dict | None = None) -> int:
+    """Write one chunk of MySQL rows with a single multi-row upsert; returns rows written.
+
+    Rows whose checksum matches ``known_checksums`` are skipped. Duplicate steam ids
+    inside a chunk keep the last row, since one INSERT cannot touch a row twice.
+    """
+    rows = {}
+    for player in players:
+        if known_checksums is not None and known_checksums.get(player['steam_id']) == player['checksum']:
+            continue
+        rows[player['steam_id']] = (
+            player['steam_id'],
+            player['username'],
+            player.get('balance', 0),
+            player.get('privilege', 'user'),
+            player.get('play_time', 0),
+            "https://via.placeholder.com/128",
+            player['checksum']
+        )
+    if rows:
+        lazy_import('psycopg2.extras').execute_values(pg_cur, UPSERT_PLAYERS_SQL, list(rows.values()), page_size=len(rows))
+    return len(rows)
+
+
+def save_sync_state(pg_cur, source: str, mode: str, watermark: str | None, rows_synced: int, full: bool):
+    pg_cur.execute("""
+        INSERT INTO sync_state (source, mode, watermark, rows_synced, last_run_at, last_full_at)
+        VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP, CASE WHEN %s THEN CURRENT_TIMESTAMP END)
+        ON CONFLICT (source)
+        DO UPDATE SET
+            mode = EXCLUDED.mode,
+            watermark = EXCLUDED.watermark,
+            rows_synced = EXCLUDED.rows_synced,
+            last_run_at = EXCLUDED.last_run_at,
+            last_full_at = COALESCE(EXCLUDED.last_full_at, sync_state.last_full_at)
+    """, (source, mode, watermark, rows_synced, full))
+
+
+def detect_updated_column(mysql_cur) -> str | None:
+    return SYNC_UPDATED_COLUMN if SYNC_UPDATED_COLUMN in get_player_columns(mysql_cur) else None
+
+
+def load_watermark(pg_cur, source: str, mode: str) -> str | None:
+    pg_cur.execute("SELECT mode, watermark FROM sync_state WHERE source = %s", (source,))
+    state = pg_cur.fetchone()
+    return state[1] if state and state[0] == mode else None
+
+
+def player_select_sql(updated_column: str | None) -> str:
+    marker_sql = f", `{updated_column}` AS updated_marker" if updated_column else ""
+    return f"""
+        SELECT steam_id, username, balance, privilege, play_time,
+               {PLAYER_CHECKSUM_SQL} AS checksum{marker_sql}
+        FROM players
+        WHERE steam_id IS NOT NULL AND steam_id != ''
+    """
+
+
+def watermark_filter(updated_column: str) -> str:
+    """Rows changed at or after the watermark, plus rows without an updated-at value.
+
+    Those never compare greater than a watermark, so without the IS NULL branch only a
+    full run would pick them up; sync_chunk skips the ones that did not change.
+    """
+    return f" AND (`{updated_column}` >= %s OR `{updated_column}` IS NULL)"
+
+
+def sync_chunk(pg_cur, players: list, mode: str, full: bool) -> int:
+    """Upsert one chunk, first dropping rows Postgres already has unchanged (unless ``full``).
+
+    In timestamp mode this drops rows re-read because they sit on the watermark or
+    have no updated-at value.
+    """
+    known_checksums = None
+    if not full:
+        pg_cur.execute(
+            "SELECT steam_id, sync_checksum FROM users WHERE steam_id = ANY(%s)",
+            ([player['steam_id'] for player in players],)
+        )
+        known_checksums = dict(pg_cur.fetchall())
+    return upsert_players(pg_cur, players, known_checksums)
+
+
+def sync_players(full: bool = False) -> dict | None:
+    """Stream changed MySQL players into Postgres users; None if the players table is missing.
+
+    With an updated-at column (SYNC_UPDATED_COLUMN) only rows at or past the stored
+    watermark (or without an updated-at value) are read, in watermark order. Without one
+    every row is read. Either way only rows whose checksum differs from
+    users.sync_checksum are written. ``full`` ignores both filters. Rows are read from an unbuffered cursor SYNC_CHUNK_SIZE at a time and each
+    chunk is committed together with the advanced watermark, so memory is bounded by the
+    chunk size and an interrupted run keeps its progress.
+    """
+    source = sync_source()
+    started = time.perf_counter()
+    
+    with mysql_cursor() as mysql_cur, pg_cursor() as pg_cur:
+        if 'players' not in get_tables(mysql_cur, refresh=True):
+            return None
+        
+        updated_column = detect_updated_column(mysql_cur)
+        mode = 'timestamp' if updated_column else 'checksum'
+        watermark = None if full else load_watermark(pg_cur, source, mode)
+        
+        query = player_select_sql(updated_column)
+        query_params = ()
+        if watermark is not None:
+            query += watermark_filter(updated_column)
+            query_params = (watermark,)
+        if updated_column:
+            query += f" ORDER BY `{updated_column}`"
+        
+        scanned_count = 0
+        synced_count = 0
+        chunks = 0
+        latest_marker = None
+        stream = mysql_cur.connection.cursor(lazy_import('pymysql.cursors').SSDictCursor)
+        try:
+            stream.execute(query, query_params)
+            while True:
+                players = stream.fetchmany(SYNC_CHUNK_SIZE)
+                if not players:
+                    break
+                
+                synced_count += sync_chunk(pg_cur, players, mode, full)
+                scanned_count += len(players)
+                chunks += 1
+                
+                if updated_column and players[-1]['updated_marker'] is not None:
+                    latest_marker = players[-1]['updated_marker']
+                new_watermark = str(latest_marker) if latest_marker is not None else watermark
+                save_sync_state(pg_cur, source, mode, new_watermark, synced_count, full)
+                pg_cur.connection.commit()
+        finally:
+            stream.close()
+        
+        new_watermark = str(latest_marker) if latest_marker is not None else watermark
+        if not chunks:
+            save_sync_state(pg_cur, source, mode, new_watermark, synced_count, full)
+    
+    elapsed = time.perf_counter() - started
+    return {
+        'synced_players': synced_count,
+        'scanned_players': scanned_count,
+        'chunks': chunks,
+        'mode': mode,
+        'full': full,
+        'watermark': new_watermark,
+        'elapsed_ms': round(elapsed * 1000, 1),
+        'rows_per_sec': round(scanned_count / elapsed, 1) if elapsed > 0 else None
+    }
+
+
+PREFLIGHT = preflight('GET, POST, OPTIONS', 'Content-Type, If-None-Match')
+
+
+@timed_handler
 def handler(event: dict, context) -> dict:
     '''API для получения статистики сервера CS 1.6 и синхронизации с MySQL'''
     method = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+        return PREFLIGHT
     
     params = event.get('queryStringParameters') or {}
     action = params.get('action', 'stats')
     
     try:
         if action == 'stats':
+            version, snapshot = stats_cache.snapshot()
+            return {
+                'statusCode': 200,
+                'headers': JSON_HEADERS,
+                'body': json.dumps({**snapshot, 'version': version}),
+                'isBase64Encoded': False
+            }
+        
+        elif action == 'stats_all':
+            return {
+                'statusCode': 200,
+                'headers': JSON_HEADERS,
+                'body': json.dumps(all_stats_cache.get()),
+                'isBase64Encoded': False
+            }
+        
+        elif action == 'stats_wait':
+            since = params.get('since', '')
             try:
-                mysql_conn = pymysql.connect(
-                    host=os.environ.get('MYSQL_HOST', ''),
-                    user=os.environ.get('MYSQL_USER', ''),
-                    password=os.environ.get('MYSQL_PASSWORD', ''),
-                    database=os.environ.get('MYSQL_DATABASE', ''),
-                    charset='utf8mb4',
-                    connect_timeout=3
-                )
-                mysql_cur = mysql_conn.cursor(pymysql.cursors.DictCursor)
-                
-                mysql_cur.execute("SHOW TABLES")
-                tables = [list(t.values())[0] for t in mysql_cur.fetchall()]
-                
-                players_online = 0
-                current_map = 'de_dust2'
-                ct_score = 0
-                t_score = 0
-                
-                if 'players' in tables:
-                    try:
-                        mysql_cur.execute("SELECT COUNT(*) as total FROM players WHERE online = 1")
-                        result = mysql_cur.fetchone()
-                        players_online = result['total'] if result else 0
-                    except:
-                        pass
-                
-                if 'server_info' in tables:
-                    try:
-                        mysql_cur.execute("SELECT map_name, ct_score, t_score FROM server_info ORDER BY id DESC LIMIT 1")
-                        result = mysql_cur.fetchone()
-                        if result:
-                            current_map = result.get('map_name', current_map)
-                            ct_score = result.get('ct_score', ct_score)
-                            t_score = result.get('t_score', t_score)
-                    except:
-                        pass
-                
-                mysql_cur.close()
-                mysql_conn.close()
-                
+                timeout = min(float(params.get('timeout', STATS_WAIT_TIMEOUT)), STATS_WAIT_TIMEOUT)
+            except ValueError:
                 return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({
-                        'players_online': players_online,
-                        'max_players': 32,
-                        'current_map': current_map,
-                        'ct_score': ct_score,
-                        't_score': t_score,
-                        'server_ip': os.environ.get('GAME_SERVER_IP', 'N/A'),
-                        'mysql_connected': True,
-                        'available_tables': tables
-                    }),
+                    'statusCode': 400,
+                    'headers': JSON_HEADERS,
+                    'body': json.dumps({'error': 'timeout must be a number'}),
                     'isBase64Encoded': False
                 }
-                
-            except Exception as mysql_err:
+            
+            remaining_ms = getattr(context, 'get_remaining_time_in_millis', None)
+            if remaining_ms:
+                timeout = min(timeout, remaining_ms() / 1000 - 2)
+            
+            return {
+                'statusCode': 200,
+                'headers': {**JSON_HEADERS, 'Cache-Control': 'no-store'},
+                'body': json.dumps(wait_for_stats(since, max(timeout, 0))),
+                'isBase64Encoded': False
+            }
+        
+        elif action == 'history':
+            range_key = params.get('range', '24h')
+            
+            if range_key not in HISTORY_RANGES:
                 return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({
-                        'players_online': 0,
-                        'max_players': 32,
-                        'current_map': 'de_dust2',
-                        'ct_score': 0,
-                        't_score': 0,
-                        'server_ip': os.environ.get('GAME_SERVER_IP', 'N/A'),
-                        'mysql_connected': False,
-                        'error': str(mysql_err)
-                    }),
+                    'statusCode': 400,
+                    'headers': JSON_HEADERS,
+                    'body': json.dumps({'error': f"range must be one of: {', '.join(HISTORY_RANGES)}"}),
                     'isBase64Encoded': False
                 }
+            
+            return {
+                'statusCode': 200,
+                'headers': JSON_HEADERS,
+                'body': json.dumps(read_history(range_key)),
+                'isBase64Encoded': False
+            }
         
         elif action == 'sync':
-            mysql_conn = pymysql.connect(
-                host=os.environ['MYSQL_HOST'],
-                user=os.environ['MYSQL_USER'],
-                password=os.environ['MYSQL_PASSWORD'],
-                database=os.environ['MYSQL_DATABASE'],
-                charset='utf8mb4'
-            )
-            mysql_cur = mysql_conn.cursor(pymysql.cursors.DictCursor)
-            
-            mysql_cur.execute("SHOW TABLES")
-            tables = [list(t.values())[0] for t in mysql_cur.fetchall()]
+            full = params.get('full') == '1'
+            if params.get('partitions'):
+                try:
+                    partitions = int(params['partitions'])
+                    workers = int(params.get('workers', '4'))
+                except ValueError:
+                    return {
+                        'statusCode': 400,
+                        'headers': JSON_HEADERS,
+                        'body': json.dumps({'error': 'partitions and workers must be integers'}),
+                        'isBase64Encoded': False
+                    }
+                time_budget = SYNC_TIME_BUDGET
+                remaining_ms = getattr(context, 'get_remaining_time_in_millis', None)
+                if remaining_ms:
+                    time_budget = min(time_budget, remaining_ms() / 1000 - 5)
+                result = sync_players_partitioned(
+                    partitions=max(1, min(partitions, SYNC_MAX_PARTITIONS)),
+                    workers=max(1, min(workers, SYNC_MAX_WORKERS)),
+                    full=full,
+                    time_budget=max(time_budget, 1)
+                )
+            else:
+                result = sync_players(full=full)
             
-            if 'players' not in tables:
-                mysql_cur.close()
-                mysql_conn.close()
+            if result is None:
                 return {
                     'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'headers': JSON_HEADERS,
                     'body': json.dumps({'error': 'Table players not found in MySQL database'}),
                     'isBase64Encoded': False
                 }
             
-            mysql_cur.execute("""
-                SELECT steam_id, username, balance, privilege, play_time 
-                FROM players 
-                WHERE steam_id IS NOT NULL AND steam_id != ''
-            """)
-            players = mysql_cur.fetchall()
-            
-            pg_conn = psycopg2.connect(os.environ['DATABASE_URL'])
-            pg_cur = pg_conn.cursor()
-            
-            synced_count = 0
-            for player in players:
-                pg_cur.execute("""
-                    INSERT INTO users (steam_id, username, balance, privilege, play_time, avatar_url)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (steam_id) 
-                    DO UPDATE SET 
-                        username = EXCLUDED.username,
-                        balance = EXCLUDED.balance,
-                        privilege = EXCLUDED.privilege,
-                        play_time = EXCLUDED.play_time
-                """, (
-                    player['steam_id'],
-                    player['username'],
-                    player.get('balance', 0),
-                    player.get('privilege', 'user'),
-                    player.get('play_time', 0),
-                    f"https://via.placeholder.com/128"
-                ))
-                synced_count += 1
-            
-            pg_conn.commit()
-            pg_cur.close()
-            pg_conn.close()
-            mysql_cur.close()
-            mysql_conn.close()
-            
             return {
                 'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({
-                    'message': 'Sync completed',
-                    'synced_players': synced_count
-                }),
+                'headers': JSON_HEADERS,
+                'body': json.dumps({'message': 'Sync completed', **result}),
                 'isBase64Encoded': False
             }
         
         elif action == 'shop_items':
-            pg_conn = psycopg2.connect(os.environ['DATABASE_URL'])
-            pg_cur = pg_conn.cursor()
-            
-            pg_cur.execute("SELECT id, name, privilege_level, duration_days, price, description, features, is_active FROM privileges_shop WHERE is_active = true ORDER BY price ASC")
-            items = []
-            for row in pg_cur.fetchall():
-                items.append({
-                    'id': row[0],
-                    'name': row[1],
-                    'privilege_level': row[2],
-                    'duration_days': row[3],
-                    'price': float(row[4]),
-                    'description': row[5],
-                    'features': row[6] if row[6] else [],
-                    'is_active': row[7]
-                })
+            catalog = fresh_catalog('privileges_shop')
+            if catalog is None:
+                with pg_cursor() as pg_cur:
+                    catalog = get_catalog(pg_cur, 'privileges_shop', load_shop_items)
             
-            pg_cur.close()
-            pg_conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'items': items}),
-                'isBase64Encoded': False
-            }
+            return catalog_response(event, 'privileges_shop', catalog)
         
         elif action == 'shop_create':
             body = json.loads(event.get('body', '{}'))
-            pg_conn = psycopg2.connect(os.environ['DATABASE_URL'])
-            pg_cur = pg_conn.cursor()
-            
-            pg_cur.execute(
-                "INSERT INTO privileges_shop (name, privilege_level, duration_days, price, description, features) VALUES (%s, %s, %s, %s, %s, %s) RETURNING id",
-                (body['name'], body['privilege_level'], body['duration_days'], body['price'], body['description'], body['features'])
-            )
-            new_id = pg_cur.fetchone()[0]
-            pg_conn.commit()
-            pg_cur.close()
-            pg_conn.close()
+            with pg_cursor() as pg_cur:
+                pg_cur.execute(
+                    "INSERT INTO privileges_shop (name, privilege_level, duration_days, price, description, features) VALUES (%s, %s, %s, %s, %s, %s) RETURNING id",
+                    (body['name'], body['privilege_level'], body['duration_days'], body['price'], body['description'], body['features'])
+                )
+                new_id = pg_cur.fetchone()[0]
+                bump_catalog_version(pg_cur, 'privileges_shop')
             
             return {
                 'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'headers': JSON_HEADERS,
                 'body': json.dumps({'id': new_id}),
                 'isBase64Encoded': False
             }
         
         elif action == 'shop_update':
             body = json.loads(event.get('body', '{}'))
-            pg_conn = psycopg2.connect(os.environ['DATABASE_URL'])
-            pg_cur = pg_conn.cursor()
-            
-            pg_cur.execute(
-                "UPDATE privileges_shop SET name = %s, privilege_level = %s, duration_days = %s, price = %s, description = %s, features = %s WHERE id = %s",
-                (body['name'], body['privilege_level'], body['duration_days'], body['price'], body['description'], body['features'], body['id'])
-            )
-            pg_conn.commit()
-            pg_cur.close()
-            pg_conn.close()
+            with pg_cursor() as pg_cur:
+                pg_cur.execute(
+                    "UPDATE privileges_shop SET name = %s, privilege_level = %s, duration_days = %s, price = %s, description = %s, features = %s WHERE id = %s",
+                    (body['name'], body['privilege_level'], body['duration_days'], body['price'], body['description'], body['features'], body['id'])
+                )
+                bump_catalog_version(pg_cur, 'privileges_shop')
             
             return {
                 'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'headers': JSON_HEADERS,
                 'body': json.dumps({'message': 'Updated'}),
                 'isBase64Encoded': False
             }
         
         elif action == 'shop_delete':
             body = json.loads(event.get('body', '{}'))
-            pg_conn = psycopg2.connect(os.environ['DATABASE_URL'])
-            pg_cur = pg_conn.cursor()
-            
-            pg_cur.execute("UPDATE privileges_shop SET is_active = false WHERE id = %s", (body['id'],))
-            pg_conn.commit()
-            pg_cur.close()
-            pg_conn.close()
+            with pg_cursor() as pg_cur:
+                pg_cur.execute("UPDATE privileges_shop SET is_active = false WHERE id = %s", (body['id'],))
+                bump_catalog_version(pg_cur, 'privileges_shop')
             
             return {
                 'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'headers': JSON_HEADERS,
                 'body': json.dumps({'message': 'Deleted'}),
                 'isBase64Encoded': False
             }
@@ -258,7 +1233,7 @@ def handler(event: dict, context) -> dict:
         else:
             return {
                 'statusCode': 400,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'headers': JSON_HEADERS,
                 'body': json.dumps({'error': 'Unknown action'}),
                 'isBase64Encoded': False
             }
@@ -266,7 +1241,7 @@ def handler(event: dict, context) -> dict:
     except Exception as e:
         return {
             'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'headers': JSON_HEADERS,
             'body': json.dumps({'error': str(e)}),
             'isBase64Encoded': False
         }
\ No newline at end of file
@@ -0,0 +1,90 @@
+"""Local fake GoldSrc/Source query server for the A2S tests.
+
+Answers A2S_INFO, A2S_PLAYER and A2S_RULES on 127.0.0.1 from a background
+thread. Every query first gets a challenge, ``drop`` makes it ignore the next
+N requests (to exercise timeouts and retries) and ``split_rules`` sends the
+rules reply as GoldSrc split packets in reverse order.
+"""
+import socket
+import struct
+import threading
+
+CHALLENGE = b'\x11\x22\x33\x44'
+
+
+def _string(value: str) -> bytes:
+    return value.encode() + b'\x00'
+
+
+class FakeA2SServer:
+    def __init__(self, goldsrc_info: bool = False, split_rules: bool = False, drop: int = 0):
+        self.goldsrc_info = goldsrc_info
+        self.split_rules = split_rules
+        self.drop = drop
+        self.requests = 0
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind(('127.0.0.1', 0))
+        self._sock.settimeout(0.1)
+        self.port = self._sock.getsockname()[1]
+        self.address = f'127.0.0.1:{self.port}'
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stopped.set()
+        self._thread.join()
+        self._sock.close()
+
+    def _serve(self):
+        while not self._stopped.is_set():
+            try:
+                data, addr = self._sock.recvfrom(1400)
+            except socket.timeout:
+                continue
+            self.requests += 1
+            if self.drop:
+                self.drop -= 1
+                continue
+            for packet in self._reply(data[4:]):
+                self._sock.sendto(packet, addr)
+
+    def _reply(self, query: bytes) -> list:
+        if query.startswith(b'TSource Engine Query\x00'):
+            challenge = query[len(b'TSource Engine Query\x00'):]
+            kind = 'info'
+        else:
+            challenge = query[1:5]
+            kind = {b'U': 'players', b'V': 'rules'}.get(query[:1])
+        if kind is None:
+            return []
+        if challenge != CHALLENGE:
+            return [b'\xff\xff\xff\xffA' + CHALLENGE]
+
+        body = b'\xff\xff\xff\xff' + getattr(self, '_' + kind)()
+        if kind == 'rules' and self.split_rules:
+            half = len(body) // 2
+            header = b'\xfe\xff\xff\xff' + struct.pack('<l', 7)
+            return [header + bytes([(1 << 4) | 2]) + body[half:], header + bytes([(0 << 4) | 2]) + body[:half]]
+        return [body]
+
+    def _info(self) -> bytes:
+        if self.goldsrc_info:
+            return (b'm' + _string('127.0.0.1:27015') + _string('Fake GoldSrc') + _string('de_nuke')
+                    + _string('cstrike') + _string('Counter-Strike') + bytes([5, 32, 47]) + b'dl'
+                    + bytes([0, 0, 0, 1]))
+        return (b'I' + bytes([48]) + _string('Fake Source') + _string('de_inferno') + _string('cstrike')
+                + _string('Counter-Strike') + struct.pack('<h', 10) + bytes([3, 32, 1]) + b'dl'
+                + bytes([0, 1]) + _string('1.1.2.7'))
+
+    def _players(self) -> bytes:
+        return (b'D' + bytes([2])
+                + bytes([0]) + _string('alice') + struct.pack('<lf', 10, 123.4)
+                + bytes([0]) + _string('bob') + struct.pack('<lf', 3, 5.0))
+
+    def _rules(self) -> bytes:
+        return (b'E' + struct.pack('<h', 3) + _string('amx_nextmap') + _string('de_dust2')
+                + _string('amx_timeleft') + _string('12:00') + _string('mp_friendlyfire') + _string('0'))
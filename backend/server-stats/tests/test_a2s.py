@@ -0,0 +1,83 @@
+import pytest
+
+import server_stats_index as index
+from a2s import A2SClient, A2SError
+from fake_a2s import FakeA2SServer
+
+
+def test_info_after_challenge_handshake():
+    with FakeA2SServer() as server:
+        info = A2SClient('127.0.0.1', server.port, timeout=0.5).info()
+
+    assert info['name'] == 'Fake Source'
+    assert info['map'] == 'de_inferno'
+    assert (info['players'], info['max_players'], info['bots']) == (3, 32, 1)
+    assert server.requests == 2  # challenge, then the real query
+
+
+def test_goldsrc_info_and_players():
+    with FakeA2SServer(goldsrc_info=True) as server:
+        with A2SClient('127.0.0.1', server.port, timeout=0.5) as client:
+            info = client.info()
+            players = client.players()
+
+    assert info['name'] == 'Fake GoldSrc'
+    assert info['map'] == 'de_nuke'
+    assert [player['name'] for player in players] == ['alice', 'bob']
+    assert players[0]['score'] == 10
+
+
+def test_split_rules_out_of_order():
+    with FakeA2SServer(split_rules=True) as server:
+        rules = A2SClient('127.0.0.1', server.port, timeout=0.5).rules()
+
+    assert rules == {'amx_nextmap': 'de_dust2', 'amx_timeleft': '12:00', 'mp_friendlyfire': '0'}
+
+
+def test_retries_after_timeout():
+    with FakeA2SServer(drop=1) as server:
+        info = A2SClient('127.0.0.1', server.port, timeout=0.2, retries=1).info()
+
+    assert info['map'] == 'de_inferno'
+    assert server.requests == 3  # dropped request, challenge, query
+
+
+def test_gives_up_after_retries():
+    with FakeA2SServer(drop=10) as server:
+        with pytest.raises(A2SError):
+            A2SClient('127.0.0.1', server.port, timeout=0.1, retries=2).info()
+
+    assert server.requests == 3
+
+
+def test_snapshot_prefers_a2s(monkeypatch):
+    monkeypatch.delenv('MYSQL_HOST', raising=False)
+    with FakeA2SServer(goldsrc_info=True) as server:
+        monkeypatch.setenv('GAME_SERVER_IP', server.address)
+        snapshot = index.load_stats_snapshot()
+
+    assert snapshot['source'] == 'a2s'
+    assert snapshot['current_map'] == 'de_nuke'
+    assert snapshot['players_online'] == 5
+    assert snapshot['next_map'] == 'de_dust2'
+
+
+def test_snapshot_falls_back_to_mysql(monkeypatch):
+    calls = []
+
+    def read_mysql_stats(live):
+        calls.append(live)
+        return {'players_online': 7, 'current_map': 'de_aztec', 'ct_score': 2, 't_score': 1, 'mysql_connected': True}
+
+    monkeypatch.setattr(index, 'read_mysql_stats', read_mysql_stats)
+    monkeypatch.setitem(index._mysql_stats_cache, 'expires_at', 0.0)
+    monkeypatch.setattr(index, 'A2S_TIMEOUT', 0.1)
+    monkeypatch.setattr(index, 'A2S_RETRIES', 0)
+    with FakeA2SServer(drop=10) as server:
+        monkeypatch.setenv('GAME_SERVER_IP', server.address)
+        snapshot = index.load_stats_snapshot()
+
+    assert calls == [None]
+    assert snapshot['source'] == 'mysql'
+    assert snapshot['current_map'] == 'de_aztec'
+    assert snapshot['players_online'] == 7
@@ -0,0 +1,36 @@
+import json
+import socket
+
+import server_stats_index as index
+from fake_a2s import FakeA2SServer
+
+
+def closed_port_address() -> str:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return f'127.0.0.1:{port}'
+
+
+def test_stats_all_reports_every_server(monkeypatch):
+    monkeypatch.setattr(index, 'A2S_TIMEOUT', 0.2)
+    monkeypatch.setattr(index, 'A2S_RETRIES', 0)
+    monkeypatch.setattr(index, 'all_stats_cache', index.SnapshotCache(index.load_all_stats, 60.0))
+    dead = closed_port_address()
+    with FakeA2SServer() as source, FakeA2SServer(goldsrc_info=True) as goldsrc:
+        monkeypatch.setenv('GAME_SERVERS', f'a={source.address},b={goldsrc.address},c={dead}')
+        response = index.handler({'httpMethod': 'GET', 'queryStringParameters': {'action': 'stats_all'}}, None)
+
+    assert response['statusCode'] == 200
+    body = json.loads(response['body'])
+    servers = {server['name']: server for server in body['servers']}
+    assert servers['a']['online'] and servers['a']['current_map'] == 'de_inferno'
+    assert servers['b']['online'] and servers['b']['current_map'] == 'de_nuke'
+    assert not servers['c']['online']
+    assert body['total'] == {
+        'servers': 3,
+        'servers_online': 2,
+        'players_online': servers['a']['players_online'] + servers['b']['players_online'],
+        'max_players': servers['a']['max_players'] + servers['b']['max_players']
+    }
@@ -0,0 +1,50 @@
+import server_stats_index as index
+
+
+def test_fast_refreshes_record_and_read_mysql_once_per_ttl(monkeypatch):
+    mysql_reads, recorded = [], []
+
+    def read_mysql_stats(live):
+        mysql_reads.append(live)
+        return {'ct_score': 1, 't_score': 0, 'mysql_connected': True}
+
+    live = {'current_map': 'de_dust2', 'players_online': 3, 'max_players': 32}
+    monkeypatch.setenv('MYSQL_HOST', 'mysql')
+    monkeypatch.setenv('GAME_SERVER_IP', '127.0.0.1:27015')
+    monkeypatch.setattr(index, 'query_game_server', lambda address: dict(live))
+    monkeypatch.setattr(index, 'read_mysql_stats', read_mysql_stats)
+    monkeypatch.setattr(index, 'record_snapshot', recorded.append)
+    monkeypatch.setattr(index, 'STATS_CACHE_TTL', 60.0)
+    monkeypatch.setitem(index._mysql_stats_cache, 'expires_at', 0.0)
+    monkeypatch.setitem(index._last_record, 'at', 0.0)
+
+    for _ in range(5):
+        snapshot = index.refresh_stats()
+
+    assert len(mysql_reads) == 1
+    assert len(recorded) == 1
+    assert snapshot['source'] == 'a2s'
+    assert snapshot['ct_score'] == 1
+
+
+def test_wait_for_stats_ignores_ticking_fields(monkeypatch):
+    snapshot = {
+        'current_map': 'de_dust2', 'players_online': 1, 'max_players': 32, 'ct_score': 0, 't_score': 0,
+        'time_left': '11:40', 'players': [{'name': 'alice', 'score': 3, 'duration': 60.0}]
+    }
+    cache = index.SnapshotCache(lambda: dict(snapshot), 60.0, fingerprint=index.stats_fingerprint)
+    monkeypatch.setattr(index, 'stats_cache', cache)
+    monkeypatch.setattr(index, 'STATS_WAIT_POLL', 0.01)
+    version = cache.snapshot()[0]
+
+    snapshot['time_left'] = '11:39'
+    snapshot['players'] = [{'name': 'alice', 'score': 3, 'duration': 61.0}]
+    snapshot['available_tables'] = ['players']
+    assert index.wait_for_stats(version, 0.1) == {'version': version, 'changed': {}, 'full': False}
+
+    snapshot['players_online'] = 2
+    snapshot['players'] = snapshot['players'] + [{'name': 'bob', 'score': 0, 'duration': 1.0}]
+    result = index.wait_for_stats(version, 0.1)
+    assert result['version'] != version
+    assert result['changed']['players_online'] == 2
+    assert [player['name'] for player in result['changed']['players']] == ['alice', 'bob']
@@ -0,0 +1,47 @@
+import server_stats_index as index
+
+
+class FakeCursor:
+    def __init__(self, checksums: dict):
+        self.checksums = checksums
+        self.queries = []
+
+    def execute(self, sql, params=None):
+        self.queries.append(sql)
+
+    def fetchall(self):
+        return list(self.checksums.items())
+
+
+PLAYERS = [
+    {'steam_id': 'STEAM_0:0:1', 'username': 'a', 'checksum': 'same', 'updated_marker': None},
+    {'steam_id': 'STEAM_0:0:2', 'username': 'b', 'checksum': 'new', 'updated_marker': None},
+    {'steam_id': 'STEAM_0:0:3', 'username': 'c', 'checksum': 'new', 'updated_marker': '2026-01-01 00:00:00'},
+]
+
+
+class FakeExtras:
+    def __init__(self):
+        self.rows = []
+
+    def execute_values(self, cur, sql, rows, page_size=None):
+        self.rows.extend(rows)
+
+
+def written(monkeypatch, mode: str, full: bool) -> list:
+    extras = FakeExtras()
+    monkeypatch.setattr(index, 'lazy_import', lambda name: extras)
+    index.sync_chunk(FakeCursor({'STEAM_0:0:1': 'same', 'STEAM_0:0:2': 'old'}), PLAYERS, mode, full)
+    return [row[0] for row in extras.rows]
+
+
+def test_incremental_runs_read_rows_without_updated_at():
+    assert 'IS NULL' in index.watermark_filter('updated_at')
+
+
+def test_timestamp_mode_skips_unchanged_rows(monkeypatch):
+    assert written(monkeypatch, 'timestamp', full=False) == ['STEAM_0:0:2', 'STEAM_0:0:3']
+
+
+def test_full_run_writes_every_row(monkeypatch):
+    assert written(monkeypatch, 'timestamp', full=True) == ['STEAM_0:0:1', 'STEAM_0:0:2', 'STEAM_0:0:3']
@@ -0,0 +1,12 @@
+-- Per-source watermark for incremental MySQL -> Postgres player sync
+CREATE TABLE IF NOT EXISTS sync_state (
+    source VARCHAR(200) PRIMARY KEY,
+    mode VARCHAR(20) NOT NULL,
+    watermark VARCHAR(64),
+    rows_synced INTEGER DEFAULT 0,
+    last_run_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_full_at TIMESTAMP
+);
+
+-- Checksum of the last synced MySQL row, used when players has no updated timestamp
+ALTER TABLE users ADD COLUMN IF NOT EXISTS sync_checksum VARCHAR(32);
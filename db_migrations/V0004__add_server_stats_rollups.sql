@@ -0,0 +1,22 @@
+-- server_stats keeps raw snapshots for 24 hours; rollups keep the long tail
+CREATE INDEX IF NOT EXISTS idx_server_stats_updated_at ON server_stats(updated_at);
+
+-- 1-minute and 1-hour aggregates of players online
+CREATE TABLE IF NOT EXISTS server_stats_rollups (
+    resolution VARCHAR(4) NOT NULL CHECK (resolution IN ('1m', '1h')),
+    bucket TIMESTAMP NOT NULL,
+    samples INTEGER NOT NULL DEFAULT 0,
+    players_sum INTEGER NOT NULL DEFAULT 0,
+    players_min INTEGER NOT NULL DEFAULT 0,
+    players_max INTEGER NOT NULL DEFAULT 0,
+    current_map VARCHAR(100),
+    PRIMARY KEY (resolution, bucket)
+);
+
+-- Minutes spent on each map per hour
+CREATE TABLE IF NOT EXISTS server_map_time (
+    bucket TIMESTAMP NOT NULL,
+    map_name VARCHAR(100) NOT NULL,
+    minutes INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, map_name)
+);
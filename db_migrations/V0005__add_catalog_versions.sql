@@ -0,0 +1,9 @@
+-- Catalog versions, bumped on every admin edit; used as ETag for catalog endpoints
+CREATE TABLE IF NOT EXISTS catalog_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO catalog_versions (name) VALUES ('case_items'), ('privileges_shop')
+ON CONFLICT DO NOTHING;
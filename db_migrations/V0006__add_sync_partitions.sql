@@ -0,0 +1,26 @@
+-- Partitioned player sync: one active run per source, resumable per key range
+CREATE TABLE IF NOT EXISTS sync_runs (
+    source VARCHAR(200) PRIMARY KEY,
+    run_id VARCHAR(32) NOT NULL,
+    mode VARCHAR(20) NOT NULL,
+    is_full BOOLEAN NOT NULL DEFAULT false,
+    watermark_from VARCHAR(64),
+    watermark_to VARCHAR(64),
+    partitions INTEGER NOT NULL,
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS sync_partitions (
+    source VARCHAR(200) NOT NULL,
+    partition_no INTEGER NOT NULL,
+    run_id VARCHAR(32) NOT NULL,
+    lower_key VARCHAR(64),
+    upper_key VARCHAR(64),
+    last_key VARCHAR(64),
+    rows_synced INTEGER DEFAULT 0,
+    done BOOLEAN DEFAULT false,
+    leased_until TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (source, partition_no)
+);
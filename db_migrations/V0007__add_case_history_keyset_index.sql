@@ -0,0 +1,6 @@
+-- Covering index for keyset-paginated case history: (won_at, id) order per user
+CREATE INDEX IF NOT EXISTS idx_case_history_user_won_at
+    ON case_history (user_id, won_at DESC, id DESC) INCLUDE (case_item_id);
+
+-- The new index starts with user_id, so the single-column one is redundant
+DROP INDEX IF EXISTS idx_case_history_user;
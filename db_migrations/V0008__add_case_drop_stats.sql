@@ -0,0 +1,16 @@
+-- Per-item, per-day drop counters, maintained by every spin/open so drop stats never scan case_history
+CREATE TABLE IF NOT EXISTS case_drop_stats (
+    day DATE NOT NULL,
+    case_item_id INTEGER NOT NULL REFERENCES case_items(id),
+    drops BIGINT NOT NULL DEFAULT 0,
+    value_total BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, case_item_id)
+);
+
+-- One-time backfill from the existing history
+INSERT INTO case_drop_stats (day, case_item_id, drops, value_total)
+SELECT ch.won_at::date, ch.case_item_id, COUNT(*), SUM(ci.value)
+FROM case_history ch
+JOIN case_items ci ON ci.id = ch.case_item_id
+GROUP BY ch.won_at::date, ch.case_item_id
+ON CONFLICT DO NOTHING;
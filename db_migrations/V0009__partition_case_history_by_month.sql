@@ -0,0 +1,65 @@
+-- Monthly range partitioning of case_history on won_at.
+-- The partition key must be part of the primary key, so it becomes (id, won_at).
+ALTER TABLE case_history RENAME TO case_history_legacy;
+ALTER TABLE case_history_legacy RENAME CONSTRAINT case_history_pkey TO case_history_legacy_pkey;
+
+CREATE TABLE case_history (
+    id INTEGER NOT NULL DEFAULT nextval('case_history_id_seq'),
+    user_id INTEGER REFERENCES users(id),
+    case_item_id INTEGER REFERENCES case_items(id),
+    won_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, won_at)
+) PARTITION BY RANGE (won_at);
+
+-- Catches rows for months nobody created a partition for yet
+CREATE TABLE case_history_default PARTITION OF case_history DEFAULT;
+
+-- Creates the partition for the month containing the given date, moving any of its
+-- rows out of the default partition first. Safe to call concurrently and repeatedly.
+CREATE OR REPLACE FUNCTION ensure_case_history_partition(month DATE) RETURNS TEXT AS $$
+DECLARE
+    start_at DATE := date_trunc('month', month)::date;
+    end_at DATE := (date_trunc('month', month) + INTERVAL '1 month')::date;
+    part TEXT := 'case_history_' || to_char(month, 'YYYY_MM');
+BEGIN
+    IF to_regclass(part) IS NOT NULL THEN
+        RETURN part;
+    END IF;
+
+    PERFORM pg_advisory_xact_lock(hashtext('case_history_partitions'));
+    IF to_regclass(part) IS NOT NULL THEN
+        RETURN part;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I (LIKE case_history INCLUDING DEFAULTS)', part);
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM case_history_default WHERE won_at >= %L AND won_at < %L RETURNING *) '
+        'INSERT INTO %I SELECT * FROM moved',
+        start_at, end_at, part
+    );
+    EXECUTE format(
+        'ALTER TABLE case_history ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        part, start_at, end_at
+    );
+    RETURN part;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Partitions for every month that has history, plus the current and next month
+SELECT ensure_case_history_partition(month::date)
+FROM generate_series(
+    date_trunc('month', COALESCE((SELECT MIN(won_at) FROM case_history_legacy), CURRENT_DATE)),
+    date_trunc('month', CURRENT_DATE + INTERVAL '1 month'),
+    INTERVAL '1 month'
+) AS month;
+
+INSERT INTO case_history (id, user_id, case_item_id, won_at)
+SELECT id, user_id, case_item_id, COALESCE(won_at, CURRENT_TIMESTAMP)
+FROM case_history_legacy;
+
+ALTER SEQUENCE case_history_id_seq OWNED BY case_history.id;
+DROP TABLE case_history_legacy;
+
+-- Same covering index as V0007, now per partition
+CREATE INDEX IF NOT EXISTS idx_case_history_user_won_at
+    ON case_history (user_id, won_at DESC, id DESC) INCLUDE (case_item_id);
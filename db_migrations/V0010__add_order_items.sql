@@ -0,0 +1,12 @@
+-- Cart lines of a YooKassa order; the payment function writes them in one multi-row insert
+CREATE TABLE IF NOT EXISTS order_items (
+    id SERIAL PRIMARY KEY,
+    order_id INTEGER REFERENCES orders(id),
+    product_id VARCHAR(100),
+    product_name VARCHAR(255),
+    product_price DECIMAL(10,2),
+    quantity INTEGER DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items(order_id);
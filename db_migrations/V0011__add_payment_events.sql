@@ -0,0 +1,9 @@
+-- YooKassa notifications already applied to an order. The webhook acknowledges
+-- repeat deliveries of the same (payment, event) from this primary key lookup.
+CREATE TABLE IF NOT EXISTS payment_events (
+    payment_id VARCHAR(100) NOT NULL,
+    event_type VARCHAR(50) NOT NULL,
+    order_id INTEGER REFERENCES orders(id),
+    processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (payment_id, event_type)
+);
@@ -0,0 +1,16 @@
+-- Outbox of paid orders whose product still has to be granted. The payment webhook
+-- enqueues in the transaction that marks the order paid; fulfill.py workers claim
+-- pending rows with FOR UPDATE SKIP LOCKED and apply the grants.
+CREATE TABLE IF NOT EXISTS order_fulfillments (
+    order_id INTEGER PRIMARY KEY REFERENCES orders(id),
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    fulfilled_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_order_fulfillments_pending
+    ON order_fulfillments (created_at) WHERE status = 'pending';
+
+-- Purchased privileges run for privileges_shop.duration_days
+ALTER TABLE users ADD COLUMN IF NOT EXISTS privilege_expires_at TIMESTAMP;
@@ -0,0 +1,4 @@
+-- Balance the last player sync read from MySQL. The sync applies the change since
+-- then instead of overwriting users.balance, so credits made on the web side
+-- (purchases, case wins and costs) survive the next sync.
+ALTER TABLE users ADD COLUMN IF NOT EXISTS synced_balance INTEGER;
@@ -0,0 +1,8 @@
+-- Daily spins and bought cases draw from different prize pools (bought cases have no
+-- privilege prizes), so their drop counters are kept apart and each is compared with
+-- its own pool. Counters written before this split cannot be attributed to either
+-- source; they are kept as 'legacy' and left out of the rate comparison.
+ALTER TABLE case_drop_stats ADD COLUMN IF NOT EXISTS source VARCHAR(10) NOT NULL DEFAULT 'legacy';
+ALTER TABLE case_drop_stats ALTER COLUMN source DROP DEFAULT;
+ALTER TABLE case_drop_stats DROP CONSTRAINT IF EXISTS case_drop_stats_pkey;
+ALTER TABLE case_drop_stats ADD PRIMARY KEY (day, source, case_item_id);
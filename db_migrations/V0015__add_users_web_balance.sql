@@ -0,0 +1,14 @@
+-- Net balance credited and charged on the web side (case prizes and costs, paid
+-- orders), which MySQL never sees. The player sync sets balance to the MySQL balance
+-- plus this, so a full sync run reconciles balances without losing web-side grants.
+ALTER TABLE users ADD COLUMN IF NOT EXISTS web_balance INTEGER NOT NULL DEFAULT 0;
+
+-- Synced users: what the balance gained since the last sync. Never synced users: all of it.
+UPDATE users SET web_balance = COALESCE(balance, 0) - synced_balance WHERE synced_balance IS NOT NULL;
+UPDATE users SET web_balance = COALESCE(balance, 0) WHERE sync_checksum IS NULL;
+
+ALTER TABLE users DROP COLUMN IF EXISTS synced_balance;
+
+-- fulfill.py sweeps purchased privileges that ran out
+CREATE INDEX IF NOT EXISTS idx_users_privilege_expires_at
+    ON users (privilege_expires_at) WHERE privilege_expires_at IS NOT NULL;
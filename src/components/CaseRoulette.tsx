@@ -3,6 +3,7 @@ import { Button } from '@/components/ui/button';
 import { Card } from '@/components/ui/card';
 import Icon from '@/components/ui/icon';
 import { useAuth } from '@/contexts/AuthContext';
+import { sessionHeaders, updateSessionToken } from '@/lib/session';
 import BACKEND_URLS from '../../backend/func2url.json';
 
 interface CaseItem {
@@ -94,10 +95,11 @@ export default function CaseRoulette() {
     try {
       const response = await fetch(`${BACKEND_URLS['cases']}/?action=spin`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', ...sessionHeaders() },
         body: JSON.stringify({ user_id: user.id })
       });
 
+      updateSessionToken(response);
       const data = await response.json();
 
       if (response.status === 429) {
@@ -122,6 +122,9 @@ export default function PrivilegesShop() {
                     price: item.price,
                     quantity: 1
                   }]}
+                  userId={user.id}
+                  productType="privilege"
+                  productId={item.id}
                   onSuccess={handleSuccess}
                   buttonText="Купить"
                 />
@@ -5,7 +5,7 @@
  */
 import React from "react";
 import { Button } from "@/components/ui/button";
-import { useYookassa, openPaymentPage, CartItem } from "./useYookassa";
+import { useYookassa, openPaymentPage, CartItem, ProductType } from "./useYookassa";
 
 // =============================================================================
 // TYPES
@@ -28,6 +28,12 @@ interface PaymentButtonProps {
   returnUrl: string;
   /** Cart items */
   cartItems?: CartItem[];
+  /** Buyer the product is granted to */
+  userId?: number;
+  /** Product granted once the order is paid */
+  productType?: ProductType;
+  /** Product id (privileges_shop id for a privilege) */
+  productId?: number;
   /** Success callback */
   onSuccess?: (orderNumber: string) => void;
   /** Error callback */
@@ -53,6 +59,9 @@ export function PaymentButton({
   description,
   returnUrl,
   cartItems = [],
+  userId,
+  productType,
+  productId,
   onSuccess,
   onError,
   buttonText = "Оплатить",
@@ -76,6 +85,9 @@ export function PaymentButton({
       description,
       returnUrl,
       cartItems,
+      userId,
+      productType,
+      productId,
     });
 
     if (response?.payment_url) {
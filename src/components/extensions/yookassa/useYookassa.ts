@@ -16,6 +16,8 @@ export interface CartItem {
   quantity: number;
 }
 
+export type ProductType = "privilege" | "balance";
+
 export interface PaymentPayload {
   amount: number;
   userEmail: string;
@@ -24,6 +26,11 @@ export interface PaymentPayload {
   description?: string;
   returnUrl: string;
   cartItems?: CartItem[];
+  /** Buyer the product is granted to once the order is paid */
+  userId?: number;
+  productType?: ProductType;
+  /** privileges_shop id for a privilege */
+  productId?: number;
 }
 
 export interface PaymentResponse {
@@ -121,6 +128,9 @@ export function useYookassa(options: UseYookassaOptions): UseYookassaReturn {
           description: payload.description || "Оплата заказа",
           return_url: payload.returnUrl,
           cart_items: payload.cartItems || [],
+          user_id: payload.userId,
+          product_type: payload.productType,
+          product_id: payload.productId,
         };
 
         const response = await fetch(apiUrl, {
@@ -1,4 +1,5 @@
 import { createContext, useContext, useState, useEffect, ReactNode } from 'react';
+import { setSessionToken } from '@/lib/session';
 
 interface User {
   id: number;
@@ -40,6 +41,7 @@ export function AuthProvider({ children }: { children: ReactNode }) {
   const logout = () => {
     setUser(null);
     localStorage.removeItem('cs16_user');
+    setSessionToken(null);
   };
 
   const isAdmin = user?.privilege === 'admin' || user?.privilege === 'moderator';
@@ -0,0 +1,26 @@
+const TOKEN_KEY = 'cs16_token';
+const TOKEN_HEADER = 'X-Steam-Token';
+
+export function setSessionToken(token: string | null | undefined) {
+  if (token) {
+    localStorage.setItem(TOKEN_KEY, token);
+  } else {
+    localStorage.removeItem(TOKEN_KEY);
+  }
+}
+
+export function sessionHeaders(): Record<string, string> {
+  const token = localStorage.getItem(TOKEN_KEY);
+  return token ? { [TOKEN_HEADER]: token } : {};
+}
+
+export function updateSessionToken(response: Response) {
+  if (response.status === 401) {
+    setSessionToken(null);
+    return;
+  }
+  const token = response.headers.get(TOKEN_HEADER);
+  if (token) {
+    setSessionToken(token);
+  }
+}
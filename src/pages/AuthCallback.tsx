@@ -2,6 +2,7 @@ import { useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import Icon from '@/components/ui/icon';
 import BACKEND_URLS from '../../backend/func2url.json';
+import { setSessionToken } from '@/lib/session';
 
 export default function AuthCallback() {
   const navigate = useNavigate();
@@ -27,6 +28,7 @@ export default function AuthCallback() {
 
         if (data.user) {
           localStorage.setItem('cs16_user', JSON.stringify(data.user));
+          setSessionToken(data.token);
           navigate('/');
           window.location.reload();
         } else {
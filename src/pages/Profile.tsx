@@ -5,6 +5,7 @@ import { Button } from '@/components/ui/button';
 import { Badge } from '@/components/ui/badge';
 import Icon from '@/components/ui/icon';
 import { useAuth } from '@/contexts/AuthContext';
+import { sessionHeaders, updateSessionToken } from '@/lib/session';
 import BACKEND_URLS from '../../backend/func2url.json';
 
 interface CaseHistoryItem {
@@ -35,7 +36,10 @@ export default function Profile() {
 
   const fetchCaseHistory = async () => {
     try {
-      const response = await fetch(`${BACKEND_URLS['cases']}/?action=history&user_id=${user!.id}`);
+      const response = await fetch(`${BACKEND_URLS['cases']}/?action=history&user_id=${user!.id}`, {
+        headers: sessionHeaders()
+      });
+      updateSessionToken(response);
       const data = await response.json();
       setCaseHistory(data.history || []);
     } catch (error) {
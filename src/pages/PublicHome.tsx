@@ -23,21 +23,45 @@ export default function PublicHome() {
   const [loadingStats, setLoadingStats] = useState(true);
 
   useEffect(() => {
-    const fetchServerStats = async () => {
-      try {
-        const response = await fetch(`${BACKEND_URLS['server-stats']}/?action=stats`);
-        const data = await response.json();
-        setServerStats(data);
-      } catch (error) {
-        console.error('Failed to fetch server stats:', error);
-      } finally {
-        setLoadingStats(false);
+    let cancelled = false;
+    let version = '';
+
+    const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+    const watchServerStats = async () => {
+      while (!cancelled) {
+        try {
+          const url = version
+            ? `${BACKEND_URLS['server-stats']}/?action=stats_wait&since=${version}`
+            : `${BACKEND_URLS['server-stats']}/?action=stats`;
+          const response = await fetch(url);
+          const data = await response.json();
+          if (cancelled) break;
+
+          if (version) {
+            setServerStats((prev) => (data.full ? data.changed : { ...prev, ...data.changed }));
+          } else {
+            setServerStats(data);
+          }
+          setLoadingStats(false);
+
+          if (!data.version) {
+            await sleep(10000);
+          }
+          version = data.version || '';
+        } catch (error) {
+          console.error('Failed to fetch server stats:', error);
+          setLoadingStats(false);
+          version = '';
+          await sleep(10000);
+        }
       }
     };
 
-    fetchServerStats();
-    const interval = setInterval(fetchServerStats, 10000);
-    return () => clearInterval(interval);
+    watchServerStats();
+    return () => {
+      cancelled = true;
+    };
   }, []);
 
   const handleSteamLogin = () => {